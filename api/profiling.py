@@ -0,0 +1,257 @@
+"""
+Профилирование запросов к REST API.
+
+Middleware включается на отдельные запросы — по заголовку X-Profile: 1
+от админа (is_staff) или случайной выборкой с долей
+API_PROFILING_SAMPLE_RATE. Для каждого
+такого запроса считаем количество и время SQL, время сериализации и общее
+время, ищем повторяющиеся запросы одной формы (N+1). Запросы считаются
+во всех базах из DATABASES, у каждого записывается алиас — видно, что
+ушло на реплику (core.replicas), а что в основную базу. Итоги копятся
+по эндпоинтам (ViewSet.action) в памяти процесса и доступны админам
+через /api/profiling/, для выборочных запросов сохраняется дамп cProfile.
+
+Кто прислал заголовок, известно только после ответа: DRF аутентифицирует
+внутри view. Поэтому запрос с заголовком профилируется заранее, а профиль
+не от админа выбрасывается. cProfile для таких запросов не включается —
+иначе любой клиент с заголовком мог бы замедлять сервер; дамп есть только
+у выборочных.
+"""
+import cProfile
+import itertools
+import marshal
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, Http404
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+MAX_CPROFILE_DUMPS = 20
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_current_profile: ContextVar = ContextVar('api_request_profile', default=None)
+_profile_ids = itertools.count(1)
+
+
+def sql_shape(sql):
+    """Форма запроса: параметры уже вынесены в %s, схлопываем списки IN (...)"""
+    return _IN_LIST_RE.sub('(...)', sql)
+
+
+class RequestProfile:
+    __slots__ = ('id', 'endpoint', 'queries', 'sql_time', 'serializer_time',
+                 'serializer_depth', 'shapes', 'aliases', 'total_time')
+
+    def __init__(self):
+        self.id = next(_profile_ids)
+        self.endpoint = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.shapes = Counter()   # (алиас базы, форма запроса) -> сколько раз
+        self.aliases = Counter()  # алиас базы -> запросов
+        self.total_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            alias = context['connection'].alias
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+            self.shapes[alias, sql_shape(sql)] += 1
+            self.aliases[alias] += 1
+
+    def repeated_queries(self):
+        threshold = settings.API_PROFILING_N_PLUS_ONE_THRESHOLD
+        return [
+            {'sql': shape, 'database': alias, 'count': count}
+            for (alias, shape), count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+class ProfileStore:
+    """Агрегаты по эндпоинтам и последние дампы cProfile"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._dumps = deque(maxlen=MAX_CPROFILE_DUMPS)
+
+    def add(self, profile, profiler=None):
+        repeated = profile.repeated_queries()
+        with self._lock:
+            stats = self._endpoints.setdefault(profile.endpoint, {
+                'endpoint': profile.endpoint,
+                'requests': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'sql_time': 0.0,
+                'queries': 0,
+                'queries_by_database': Counter(),
+                'serializer_time': 0.0,
+                'n_plus_one_requests': 0,
+                'n_plus_one_samples': [],
+            })
+            stats['requests'] += 1
+            stats['total_time'] += profile.total_time
+            stats['max_time'] = max(stats['max_time'], profile.total_time)
+            stats['sql_time'] += profile.sql_time
+            stats['queries'] += profile.queries
+            stats['queries_by_database'].update(profile.aliases)
+            stats['serializer_time'] += profile.serializer_time
+            if repeated:
+                stats['n_plus_one_requests'] += 1
+                stats['n_plus_one_samples'] = repeated[:3]
+            if profiler is not None:
+                profiler.create_stats()
+                self._dumps.append({
+                    'id': profile.id,
+                    'endpoint': profile.endpoint,
+                    'created_at': timezone.now(),
+                    'stats': marshal.dumps(profiler.stats),
+                })
+
+    def summary(self):
+        with self._lock:
+            endpoints = []
+            for stats in self._endpoints.values():
+                requests = stats['requests']
+                endpoints.append({
+                    'endpoint': stats['endpoint'],
+                    'requests': requests,
+                    'avg_time_ms': stats['total_time'] / requests * 1000,
+                    'max_time_ms': stats['max_time'] * 1000,
+                    'avg_sql_time_ms': stats['sql_time'] / requests * 1000,
+                    'avg_queries': stats['queries'] / requests,
+                    'avg_queries_by_database': {
+                        alias: count / requests for alias, count in stats['queries_by_database'].items()
+                    },
+                    'avg_serializer_time_ms': stats['serializer_time'] / requests * 1000,
+                    'n_plus_one_requests': stats['n_plus_one_requests'],
+                    'n_plus_one_samples': stats['n_plus_one_samples'],
+                })
+            dumps = [
+                {'id': dump['id'], 'endpoint': dump['endpoint'], 'created_at': dump['created_at']}
+                for dump in self._dumps
+            ]
+        endpoints.sort(key=lambda item: item['avg_time_ms'] * item['requests'], reverse=True)
+        return {'endpoints': endpoints, 'cprofile_dumps': dumps}
+
+    def get_dump(self, profile_id):
+        with self._lock:
+            for dump in self._dumps:
+                if dump['id'] == profile_id:
+                    return dump
+        return None
+
+
+store = ProfileStore()
+
+
+def _endpoint_name(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', request.path)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.API_PROFILING_ENABLED:
+            return self.get_response(request)
+
+        forced = request.META.get(PROFILE_HEADER) == '1'
+        sampled = random.random() < settings.API_PROFILING_SAMPLE_RATE
+        if not (forced or sampled):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        profile.endpoint = request.path
+        token = _current_profile.set(profile)
+        profiler = cProfile.Profile() if sampled and settings.API_PROFILING_CPROFILE else None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as wrappers:
+                for alias in settings.DATABASES:
+                    wrappers.enter_context(connections[alias].execute_wrapper(profile.record_query))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            profile.total_time = time.perf_counter() - start
+            _current_profile.reset(token)
+
+        # DRF выставляет request.user после аутентификации во view
+        user = getattr(request, 'user', None)
+        if not sampled and not (user is not None and user.is_staff):
+            return response
+        store.add(profile, profiler)
+        response['X-Profile-Id'] = str(profile.id)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.endpoint = _endpoint_name(request, view_func)
+        return None
+
+
+class ProfiledSerializerMixin:
+    """Учитывает время to_representation верхнего уровня в профиле запроса"""
+
+    def to_representation(self, instance):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().to_representation(instance)
+        profile.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializer_depth -= 1
+            if profile.serializer_depth == 0:
+                profile.serializer_time += time.perf_counter() - start
+
+
+class ProfilingSummaryView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(store.summary())
+
+
+class ProfilingDumpView(APIView):
+    """Дамп cProfile в формате .prof — открывается через pstats или snakeviz"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, profile_id):
+        dump = store.get_dump(profile_id)
+        if dump is None:
+            raise Http404
+        response = HttpResponse(dump['stats'], content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.prof"'
+        return response
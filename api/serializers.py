@@ -1,26 +1,96 @@
 from rest_framework import serializers
-from core.models import User, Quest, PromoCode, UserQuestProgress
+from core.models import User, Quest, PromoCode, PromoCodeStock, QuestRollup, UserQuestProgress
+from core.inventory import is_low_stock
+from core.rollups import histogram_quantile
+from .profiling import ProfiledSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'telegram_id', 'name', 'phone_number', 'is_verified', 'created_at']
 
 
-class QuestSerializer(serializers.ModelSerializer):
+def validate_window(active_from, active_until):
+    if active_from and active_until and active_until <= active_from:
+        raise serializers.ValidationError({'active_until': 'Окно показа должно заканчиваться позже, чем начинается'})
+
+
+class QuestSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Quest
-        fields = ['id', 'name', 'description', 'location', 'created_at', 'is_active']
+        fields = ['id', 'name', 'description', 'location', 'created_at', 'is_active', 'active_from', 'active_until']
+
+    def validate(self, attrs):
+        instance = self.instance
+        validate_window(
+            attrs.get('active_from', instance.active_from if instance else None),
+            attrs.get('active_until', instance.active_until if instance else None),
+        )
+        return attrs
+
+
+class QuestScheduleSerializer(serializers.Serializer):
+    """Тело /api/quests/schedule/: id квестов и поля, которые им выставить"""
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=10_000)
+    is_active = serializers.BooleanField(required=False)
+    active_from = serializers.DateTimeField(required=False, allow_null=True)
+    active_until = serializers.DateTimeField(required=False, allow_null=True)
 
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError('Укажите is_active, active_from или active_until')
+        validate_window(attrs.get('active_from'), attrs.get('active_until'))
+        return attrs
 
-class PromoCodeSerializer(serializers.ModelSerializer):
+
+class PromoCodeSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = PromoCode
         fields = ['id', 'code', 'quest', 'is_used', 'created_at']
 
 
-class UserQuestProgressSerializer(serializers.ModelSerializer):
+class PromoCodeStockSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    quest_name = serializers.CharField(source='quest.name', read_only=True)
+    is_low = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PromoCodeStock
+        fields = ['quest', 'quest_name', 'available', 'is_low', 'updated_at']
+
+    def get_is_low(self, obj):
+        return is_low_stock(obj.available)
+
+
+class QuestRollupSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    quest_name = serializers.CharField(source='quest.name', read_only=True)
+    pending = serializers.SerializerMethodField()
+    moderation_mean_seconds = serializers.SerializerMethodField()
+    moderation_median_seconds = serializers.SerializerMethodField()
+    moderation_p90_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuestRollup
+        fields = [
+            'quest', 'quest_name', 'period', 'bucket_start',
+            'submissions', 'approvals', 'rejections', 'pending',
+            'moderation_count', 'moderation_mean_seconds', 'moderation_median_seconds', 'moderation_p90_seconds',
+        ]
+
+    def get_pending(self, obj):
+        return max(0, obj.submissions - obj.approvals - obj.rejections)
+
+    def get_moderation_mean_seconds(self, obj):
+        return obj.moderation_seconds / obj.moderation_count if obj.moderation_count else None
+
+    def get_moderation_median_seconds(self, obj):
+        return histogram_quantile(obj.moderation_histogram, 0.5)
+
+    def get_moderation_p90_seconds(self, obj):
+        return histogram_quantile(obj.moderation_histogram, 0.9)
+
+
+class UserQuestProgressSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     quest = QuestSerializer(read_only=True)
     promo_code = PromoCodeSerializer(read_only=True)
@@ -28,6 +98,8 @@ class UserQuestProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserQuestProgress
         fields = [
-            'id', 'user', 'quest', 'photo', 'status',
-            'promo_code', 'completed_at', 'admin_comment'
-        ] 
\ No newline at end of file
+            'id', 'user', 'quest', 'photo', 'telegram_file_id', 'status',
+            'promo_code', 'completed_at', 'admin_comment',
+            'attempt', 'reviewed_at', 'reviewer', 'status_changed_at'
+        ]
+        read_only_fields = ['telegram_file_id', 'attempt', 'reviewed_at', 'reviewer', 'status_changed_at']
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""Профилирование запросов API (api.profiling)"""
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from api import profiling
+from api.profiling import ProfileStore, store
+from core.models import Quest
+from core.replicas import REPLICA
+
+pytestmark = pytest.mark.django_db(transaction=True, databases=['default', REPLICA])
+
+
+def test_queries_are_counted_per_database(settings):
+    settings.API_PROFILING_ENABLED = True
+    Quest.objects.create(name='Квест', description='Сфотографируйте', location='Чебоксары')
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    response = client.get('/api/quests/', HTTP_X_PROFILE='1')
+
+    assert response.status_code == 200
+    endpoint, = [item for item in store.summary()['endpoints'] if item['endpoint'] == 'QuestViewSet.list']
+    # list читает с реплики (core.replicas); запросы в обе базы попадают в профиль
+    assert endpoint['avg_queries_by_database'][REPLICA] >= 1
+    assert endpoint['avg_queries'] == sum(endpoint['avg_queries_by_database'].values())
+
+
+def test_header_from_non_staff_is_ignored(settings, monkeypatch):
+    settings.API_PROFILING_ENABLED = True
+    monkeypatch.setattr(profiling, 'store', ProfileStore())
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_user('player', 'player@example.com', 'password'))
+
+    for current in (client, APIClient()):
+        response = current.get('/api/quests/', HTTP_X_PROFILE='1')
+        assert 'X-Profile-Id' not in response
+    assert profiling.store.summary()['endpoints'] == []
@@ -4,15 +4,26 @@ from .views import (
     UserViewSet,
     QuestViewSet,
     PromoCodeViewSet,
-    UserQuestProgressViewSet
+    PromoCodeStockViewSet,
+    QuestRollupViewSet,
+    UserQuestProgressViewSet,
+    RouteExportView,
+    RouteImportView
 )
+from .profiling import ProfilingSummaryView, ProfilingDumpView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'quests', QuestViewSet)
 router.register(r'promocodes', PromoCodeViewSet)
+router.register(r'inventory', PromoCodeStockViewSet)
 router.register(r'progress', UserQuestProgressViewSet)
+router.register(r'rollups', QuestRollupViewSet)
 
 urlpatterns = [
+    path('profiling/', ProfilingSummaryView.as_view(), name='profiling-summary'),
+    path('profiling/<int:profile_id>/cprofile/', ProfilingDumpView.as_view(), name='profiling-dump'),
+    path('routes/export/', RouteExportView.as_view(), name='routes-export'),
+    path('routes/import/', RouteImportView.as_view(), name='routes-import'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -1,41 +1,171 @@
+import datetime
+import uuid
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from core.models import User, Quest, PromoCode, UserQuestProgress
+from rest_framework.views import APIView
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from core.models import User, Quest, PromoCode, PromoCodeStock, QuestRollup, Route, UserQuestProgress
+from core.route_exchange import EXPORTERS, READERS, detect_format, import_routes
+from core.route_import import RouteImportError
+from core.inventory import crossed_low_stock, notify_low_stock
+from core.archive import user_stats
+from core.moderation import approve_attempt, reviewer_name, sla_report
+from core.replicas import api_actor, db_scope
+from core.scheduling import schedule_quests
+from core.search import search_quests
 from .serializers import (
     UserSerializer,
     QuestSerializer,
+    QuestScheduleSerializer,
     PromoCodeSerializer,
+    PromoCodeStockSerializer,
+    QuestRollupSerializer,
     UserQuestProgressSerializer
 )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def parse_moment(value):
+    """Дата или дата-время из query-параметра; наивные — в часовом поясе проекта"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None and parse_date(value):
+        moment = datetime.datetime.combine(parse_date(value), datetime.time())
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class ReplicaReadMixin:
+    """
+    list и retrieve читают с реплики (см. core.replicas), остальные действия — из
+    основной базы. После записи тот же пользователь API какое-то время читает
+    только из основной базы. Аутентификация и проверка прав — до выбора базы.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._db_scope = db_scope(api_actor(request.user), read_only=self.action in self.replica_actions)
+        self._db_scope.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        scope = getattr(self, '_db_scope', None)
+        if scope is not None:
+            self._db_scope = None
+            scope.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Выполнения пользователя по статусам, включая перенесённые в архив"""
+        return Response(user_stats(self.get_object()))
 
-class QuestViewSet(viewsets.ModelViewSet):
+
+class QuestViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Quest.objects.all()
     serializer_class = QuestSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        active_only = request.query_params.get('active') in ('1', 'true', 'True')
+        results = search_quests(query, limit=limit, active_only=active_only)
+        return Response([
+            {
+                'id': result.id,
+                'name': result.name,
+                'location': result.location,
+                'is_active': result.is_active,
+                'score': result.score,
+                'match': result.match,
+            }
+            for result in results
+        ])
+
     @action(detail=True, methods=['post'])
     def toggle_active(self, request, pk=None):
         quest = self.get_object()
         quest.is_active = not quest.is_active
-        quest.save()
+        quest.save(update_fields=['is_active'])
         return Response({'status': 'success'})
 
+    @action(detail=False, methods=['post'])
+    def schedule(self, request):
+        """
+        Включение, выключение и окно показа для пачки квестов одним UPDATE:
+        {"ids": [...], "is_active": true, "active_from": "...", "active_until": null}
+        """
+        serializer = QuestScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = dict(serializer.validated_data)
+        ids = fields.pop('ids')
+        try:
+            updated = schedule_quests(ids, **fields)
+        except IntegrityError:
+            # задана одна граница окна, и она не сходится с другой, уже сохранённой у квеста
+            return Response(
+                {'error': 'У части квестов окно показа заканчивается раньше, чем начинается'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'status': 'success', 'updated': updated})
+
 
-class PromoCodeViewSet(viewsets.ModelViewSet):
+class PromoCodeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = PromoCode.objects.all()
     serializer_class = PromoCodeSerializer
     permission_classes = [permissions.IsAdminUser]
 
 
-class UserQuestProgressViewSet(viewsets.ModelViewSet):
+class PromoCodeStockViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = PromoCodeStock.objects.select_related('quest').order_by('available')
+    serializer_class = PromoCodeStockSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+
+class QuestRollupViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Агрегаты для дашбордов: ?period=hour|day (по умолчанию day), ?quest=<id>,
+    ?since= и ?until= (дата или дата-время, until не включительно).
+    Читается только таблица агрегатов — по индексу, без UserQuestProgress.
+    """
+    queryset = QuestRollup.objects.select_related('quest').order_by('bucket_start', 'quest__name')
+    serializer_class = QuestRollupSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        queryset = queryset.filter(period=params.get('period', QuestRollup.Period.DAY))
+        if params.get('quest'):
+            try:
+                queryset = queryset.filter(quest_id=uuid.UUID(params['quest']))
+            except ValueError:
+                return queryset.none()
+        for name, lookup in (('since', 'bucket_start__gte'), ('until', 'bucket_start__lt')):
+            value = parse_moment(params.get(name))
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+
+class UserQuestProgressViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = UserQuestProgress.objects.all()
     serializer_class = UserQuestProgressSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -50,25 +180,25 @@ class UserQuestProgressViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Находим неиспользованный промокод для этого квеста
-        promo_code = PromoCode.objects.filter(
-            quest=progress.quest,
-            is_used=False
-        ).first()
+        # Выдаём промокод и подтверждаем выполнение в одной транзакции
+        approved = approve_attempt(
+            progress, reviewer_name(api_user=request.user), comment=request.data.get('comment', ''),
+        )
+        if approved is None:
+            return Response(
+                {'error': 'Этот квест уже проверен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        promo_code, remaining = approved
         if not promo_code:
             return Response(
                 {'error': 'Нет доступных промокодов для этого квеста'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        progress.status = UserQuestProgress.Status.APPROVED
-        progress.promo_code = promo_code
-        progress.admin_comment = request.data.get('comment', '')
-        progress.save()
-
-        promo_code.is_used = True
-        promo_code.save()
+        if crossed_low_stock(remaining):
+            notify_low_stock(progress.quest.name, remaining)
 
         return Response({'status': 'success'})
 
@@ -84,6 +214,72 @@ class UserQuestProgressViewSet(viewsets.ModelViewSet):
 
         progress.status = UserQuestProgress.Status.REJECTED
         progress.admin_comment = request.data.get('comment', '')
+        progress.reviewer = reviewer_name(api_user=request.user)
         progress.save()
 
-        return Response({'status': 'success'}) 
\ No newline at end of file
+        return Response({'status': 'success'})
+
+    @action(detail=False, methods=['get'])
+    def sla(self, request):
+        """
+        Перцентили времени проверки и возраст очереди, в секундах:
+        ?since= и ?until= (по времени решения, по умолчанию — последние 7 дней), ?quest=<id>
+        """
+        params = request.query_params
+        try:
+            quest_id = uuid.UUID(params['quest']) if params.get('quest') else None
+        except ValueError:
+            return Response({'error': 'Неверный ID квеста'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sla_report(
+            since=parse_moment(params.get('since')),
+            until=parse_moment(params.get('until')),
+            quest_id=quest_id,
+        ))
+
+
+class RouteExportView(APIView):
+    """Выгрузка маршрутов потоком: ?as=jsonl|geojson, ?route=<название> (можно несколько)"""
+    permission_classes = [permissions.IsAdminUser]
+    content_types = {
+        'jsonl': 'application/x-ndjson',
+        'geojson': 'application/geo+json',
+    }
+
+    def get(self, request):
+        file_format = request.query_params.get('as', 'jsonl')
+        if file_format not in EXPORTERS:
+            return Response(
+                {'error': f"Неизвестный формат, доступны: {', '.join(EXPORTERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        routes = Route.objects.all()
+        names = request.query_params.getlist('route')
+        if names:
+            routes = routes.filter(name__in=names)
+
+        response = StreamingHttpResponse(EXPORTERS[file_format](routes), content_type=self.content_types[file_format])
+        response['Content-Disposition'] = f'attachment; filename="routes.{file_format}"'
+        return response
+
+
+class RouteImportView(APIView):
+    """Загрузка маршрутов файлом (поле file, .jsonl или .geojson); upsert по названиям"""
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Передайте файл в поле file'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('as') or detect_format(upload.name)
+        if file_format not in READERS:
+            return Response(
+                {'error': 'Не удалось определить формат файла, укажите as=jsonl или as=geojson'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            stats = import_routes(READERS[file_format](upload))
+        except RouteImportError as e:
+            return Response({'error': 'Импорт отменён', 'details': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats) 
\ No newline at end of file
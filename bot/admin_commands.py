@@ -1,7 +1,9 @@
 from aiogram import types
 from aiogram.filters import Command, CommandObject
-from asgiref.sync import sync_to_async
-from core.models import UserQuestProgress, PromoCode
+from .metrics import sync_to_async
+from core.models import UserQuestProgress
+from core.inventory import crossed_low_stock, low_stock_message
+from core.moderation import approve_attempt, reviewer_name
 from django.conf import settings
 
 async def check_admin_group(message: types.Message) -> bool:
@@ -34,27 +36,20 @@ async def handle_approve(message: types.Message, command: CommandObject):
         await message.reply("Этот квест уже проверен")
         return
 
-    # Находим свободный промокод
-    get_promo = sync_to_async(lambda: PromoCode.objects.filter(
-        quest=progress.quest,
-        is_used=False
-    ).first())
-    promo_code = await get_promo()
+    # Выдаём промокод и подтверждаем выполнение в одной транзакции
+    approved = await sync_to_async(approve_attempt)(progress, reviewer_name(telegram_user=message.from_user))
 
+    if approved is None:
+        await message.reply("Этот квест уже проверен")
+        return
+
+    promo_code, remaining = approved
     if not promo_code:
         await message.reply("Ошибка: нет доступных промокодов для этого квеста")
         return
 
-    # Обновляем статус и привязываем промокод
-    @sync_to_async
-    def update_progress():
-        progress.status = UserQuestProgress.Status.APPROVED
-        progress.promo_code = promo_code
-        progress.save()
-        promo_code.is_used = True
-        promo_code.save()
-
-    await update_progress()
+    if crossed_low_stock(remaining):
+        await message.answer(low_stock_message(progress.quest.name, remaining))
 
     # Отправляем уведомление пользователю
     await message.bot.send_message(
@@ -98,6 +93,7 @@ async def handle_reject(message: types.Message, command: CommandObject):
     def update_progress():
         progress.status = UserQuestProgress.Status.REJECTED
         progress.admin_comment = reason
+        progress.reviewer = reviewer_name(telegram_user=message.from_user)
         progress.save()
 
     await update_progress()
@@ -0,0 +1,69 @@
+"""
+Фабрика приложения бота.
+
+Bot и Dispatcher создаются по требованию, а не при импорте модуля:
+импорт bot.app дешёвый, тяжёлые модули (обработчики, модели, middleware)
+подтягиваются только при сборке диспетчера.
+"""
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.memory import MemoryStorage
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_bot(token=None, session=None):
+    if session is None and settings.TELEGRAM_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_SERVER))
+    return Bot(
+        token=token or settings.TELEGRAM_BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode="HTML"),
+    )
+
+
+def create_dispatcher(storage=None):
+    from .bot import register_handlers
+    from .idempotency import setup_idempotency
+    from .metrics import setup_metrics
+    from .replicas import setup_replicas
+    from .throttling import setup_throttling
+
+    dp = Dispatcher(storage=storage or MemoryStorage())
+    setup_metrics(dp)
+    setup_idempotency(dp)
+    setup_throttling(dp)
+    setup_replicas(dp)
+    register_handlers(dp)
+    return dp
+
+
+async def start_bot():
+    from core.quest_cache import quest_cache
+    from core.search import quest_index
+    from .media import start_media_downloader
+    from .metrics import init_sentry, start_metrics_server, sync_to_async
+
+    logging.basicConfig(level=logging.INFO)
+    bot = create_bot()
+    dp = create_dispatcher()
+    await sync_to_async(quest_cache.warm)()
+    await sync_to_async(quest_index.warm)()
+    init_sentry()
+    start_metrics_server()
+    downloader = start_media_downloader(bot)
+
+    try:
+        # Запускаем бота
+        await dp.start_polling(bot, skip_updates=True)
+    except Exception as e:
+        logger.error(f"Ошибка при запуске бота: {e}")
+        raise
+    finally:
+        if downloader is not None:
+            downloader.cancel()
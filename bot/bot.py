@@ -1,15 +1,23 @@
+import html
 import logging
-import os
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters.command import Command
+import re
+import tempfile
+from aiogram import F, Router, types
+from aiogram.filters import StateFilter
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from aiogram.client.default import DefaultBotProperties
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
 from django.conf import settings
-from core.models import User, Quest, UserQuestProgress
-from core.models import Route, RouteQuest
-from dotenv import load_dotenv
-from asgiref.sync import sync_to_async
-from aiogram.fsm.storage.memory import MemoryStorage
+from core.models import User, Quest
+from core.models import Route
+from core.moderation import submit_attempt
+from core.promo_messages import promo_messages
+from core.quest_cache import next_quest_card
+from core.route_import import RouteImportError, detect_format, parse_points, save_route
+from core.search import search_quests
+from .catalog import QuestPage, QuestPick, catalog_keyboard, fetch_catalog_page
+from .metrics import sync_to_async
+from .routing import TextDispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
@@ -31,56 +39,46 @@ class RouteBuilderStates(StatesGroup):
     finish_or_add_next          = State()  # после добавления — жду «Готово» или «Добавить»
 
 
-# Явно загружаем переменные окружения
-load_dotenv(override=True)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Получаем токен напрямую из переменных окружения
-token = os.getenv('TELEGRAM_BOT_TOKEN')
-print(f"Используемый токен из переменных окружения: {token}")
+COORDINATES_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?)\s*[,;\s]\s*(-?\d+(?:\.\d+)?)')
 
-# Инициализируем бота и диспетчер с новым синтаксисом
-bot = Bot(
-    token=token,
-    default=DefaultBotProperties(parse_mode="HTML")
-)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+@sync_to_async
+def _sync_save_route(data):
+    """
+    Синхронная часть сохранения: Route, новые квесты и RouteQuest одной транзакцией.
+    """
+    return save_route(data['route_name'], data['route_description'], data['points'])
 
-# Регистрируем административные команды
-dp.message.register(admin_commands.handle_approve, Command("approve"))
-dp.message.register(admin_commands.handle_reject, Command("reject"))
 
 @sync_to_async
-def _sync_save_route(data):
+def _sync_import_route(data, stream, file_format):
     """
-    Синхронная часть сохранения: создаёт Route и связанные RouteQuest.
+    Разбирает файл с точками и сохраняет маршрут вместе с уже добавленными
+    вручную точками. Возвращает (маршрут, число точек из файла).
     """
-    # 1) создаём маршрут
-    route = Route.objects.create(
-        name=data['route_name'],
-        description=data['route_description']
-    )
-    # 2) для каждой точки создаём RouteQuest
-    for idx, pt in enumerate(data['points'], start=1):
-        RouteQuest.objects.create(
-            route=route,
-            quest_id=pt['quest_id'],
-            order=idx,
-            hint_text=pt.get('hint_text', ''),
-            photo=pt.get('photo_file'),
-            audio=pt.get('audio_file'),
-            latitude=pt.get('latitude'),
-            longitude=pt.get('longitude'),
-        )
+    chosen = [point['quest_id'] for point in data['points'] if point.get('quest_id')]
+    points = parse_points(stream, file_format, existing_quest_ids=chosen)
+    return save_route(data['route_name'], data['route_description'], data['points'] + points), len(points)
 
 async def save_route_to_db(data):
     """
     Асинхронная обёртка для FSM: принимает data из state и сохраняет маршрут.
     """
-    await _sync_save_route(data)
+    return await _sync_save_route(data)
+
+
+def get_add_point_keyboard():
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="➕ Добавить точку"), KeyboardButton(text="✅ Готово")],
+        ],
+        resize_keyboard=True
+    )
+
+
+def quest_in_route(data, quest_id):
+    return any(point.get('quest_id') == quest_id for point in data.get('points', []))
 
 def get_main_keyboard(user):
     buttons = [
@@ -92,7 +90,6 @@ def get_main_keyboard(user):
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
 
-@dp.message(Command("start"))
 async def cmd_start(message: types.Message):
     user, created = await sync_to_async(User.objects.get_or_create)(
         telegram_id=message.from_user.id,
@@ -115,7 +112,6 @@ async def cmd_start(message: types.Message):
         )
 
 
-@dp.message(lambda message: message.text == "🛠️ Создать маршрут")
 async def cmd_start_route_builder(message: types.Message, state: FSMContext):
     # 1) Получаем или создаём пользователя
     user, _ = await sync_to_async(User.objects.get_or_create)(
@@ -131,8 +127,11 @@ async def cmd_start_route_builder(message: types.Message, state: FSMContext):
     await state.set_state(RouteBuilderStates.waiting_for_name)
 
 
-@dp.message(RouteBuilderStates.waiting_for_name)
 async def process_route_name(message: types.Message, state: FSMContext):
+    if not message.text:
+        return await message.answer("Введите название маршрута текстом:")
+    if await sync_to_async(Route.objects.filter(name=message.text).exists)():
+        return await message.answer("⚠️ Маршрут с таким названием уже есть. Введите другое название:")
     # Сохраняем название в хранилище FSM
     await state.update_data(route_name=message.text)
     # Спрашиваем описание
@@ -141,7 +140,6 @@ async def process_route_name(message: types.Message, state: FSMContext):
     await state.set_state(RouteBuilderStates.waiting_for_description)
 
 
-@dp.message(RouteBuilderStates.waiting_for_description)
 async def process_route_description(message: types.Message, state: FSMContext):
     # Сохраняем описание и инициализируем список точек
     await state.update_data(
@@ -149,19 +147,13 @@ async def process_route_description(message: types.Message, state: FSMContext):
         points=[]
     )
     # Предлагаем добавить первую точку или завершить
-    kb = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="➕ Добавить точку"), KeyboardButton(text="✅ Готово")],
-        ],
-        resize_keyboard=True
-    )
     await message.answer(
-        "Описание принято. Что дальше?",
-        reply_markup=kb
+        "Описание принято. Что дальше?\n\n"
+        "Много точек можно загрузить сразу: пришлите файл .csv, .gpx или .geojson.",
+        reply_markup=get_add_point_keyboard()
     )
     await state.set_state(RouteBuilderStates.waiting_for_add_point)
 
-@dp.message(RouteBuilderStates.waiting_for_add_point)
 async def process_add_point(message: types.Message, state: FSMContext):
     data = await state.get_data()
     text = message.text
@@ -175,7 +167,7 @@ async def process_add_point(message: types.Message, state: FSMContext):
         # Сохраняем маршрут в БД
         await save_route_to_db(data)
         await message.answer(
-            f"✅ Маршрут «{data['route_name']}» успешно создан! Точек в маршруте: {len(data['points'])}."
+            f"✅ Маршрут «{html.escape(data['route_name'])}» успешно создан! Точек в маршруте: {len(data['points'])}."
         )
         await state.clear()  # очищаем FSM
         return
@@ -199,23 +191,41 @@ async def process_add_point(message: types.Message, state: FSMContext):
     await message.answer("Пожалуйста, используйте кнопки на экране: ➕ Добавить точку или ✅ Готово.")
 
 
-@dp.message(RouteBuilderStates.waiting_for_quest_choice)
 async def process_quest_choice(message: types.Message, state: FSMContext):
-    text = message.text.strip()
+    text = (message.text or '').strip()
 
     # 1) Если пользователь хочет создать новый квест
     if text.lower() == '/new':
         await message.answer("Введите название нового квеста:")
         return await state.set_state(RouteBuilderStates.waiting_for_new_quest_name)
 
-    # 2) Иначе пытаемся найти существующий квест по полному названию
+    # 2) Кнопка выбора — показываем первую страницу каталога
+    if text == "Выбрать существующий":
+        page = await sync_to_async(fetch_catalog_page)()
+        if not page.quests:
+            return await message.answer("В каталоге пока нет активных квестов. Отправьте /new, чтобы создать квест.")
+        return await message.answer(
+            "Выберите квест из каталога или найдите его поиском:",
+            reply_markup=catalog_keyboard(page)
+        )
+
+    # 3) Иначе пытаемся найти существующий квест по полному названию
     quest = await sync_to_async(Quest.objects.filter(name=text).first)()
     if not quest:
+        suggestions = await sync_to_async(search_quests)(text, limit=5)
+        if suggestions:
+            names = "\n".join(f"• {html.escape(result.name)}" for result in suggestions)
+            return await message.answer(
+                f"❌ Квест с таким названием не найден. Возможно, вы имели в виду:\n{names}",
+                reply_markup=get_quest_search_keyboard()
+            )
         return await message.answer(
             "❌ Квест с таким названием не найден. Пожалуйста, введите корректное название из списка или отправьте /new."
         )
 
-    # 3) Сохраняем выбранный quest в «текущей точке» и переходим к подсказке
+    # 4) Сохраняем выбранный quest в «текущей точке» и переходим к подсказке
+    if quest_in_route(await state.get_data(), str(quest.id)):
+        return await message.answer("⚠️ Этот квест уже есть в маршруте, выберите другой.")
     await state.update_data(
         current_point={'quest_id': str(quest.id)}
     )
@@ -223,20 +233,203 @@ async def process_quest_choice(message: types.Message, state: FSMContext):
     await state.set_state(RouteBuilderStates.waiting_for_hint_text)
 
 
-@dp.message(RouteBuilderStates.waiting_for_new_quest_name)
+async def browse_quests(callback: types.CallbackQuery, callback_data: QuestPage):
+    """Перелистывание каталога: один запрос по индексу и правка клавиатуры на месте"""
+    page = await sync_to_async(fetch_catalog_page)(callback_data.cursor, back=callback_data.back)
+    if not page.quests:
+        return await callback.answer("Дальше квестов нет")
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=catalog_keyboard(page))
+
+
+async def pick_quest(callback: types.CallbackQuery, callback_data: QuestPick, state: FSMContext):
+    name = await sync_to_async(
+        Quest.objects.filter(id=callback_data.quest_id, is_active=True).values_list('name', flat=True).first
+    )()
+    if name is None:
+        return await callback.answer("Квест больше недоступен, выберите другой", show_alert=True)
+    if quest_in_route(await state.get_data(), str(callback_data.quest_id)):
+        return await callback.answer("Этот квест уже есть в маршруте", show_alert=True)
+
+    await state.update_data(
+        current_point={'quest_id': str(callback_data.quest_id)}
+    )
+    await callback.answer()
+    await callback.message.edit_text(f"Выбран квест: {html.escape(name)}")
+    await callback.message.answer("Введите текст подсказки для этой точки или отправьте /skip, чтобы пропустить:")
+    await state.set_state(RouteBuilderStates.waiting_for_hint_text)
+
+
+async def pick_quest_outdated(callback: types.CallbackQuery):
+    await callback.answer("Этот выбор уже неактуален")
+
+
+def get_quest_search_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🔍 Найти квест", switch_inline_query_current_chat="")
+    ]])
+
+
+async def inline_quest_search(inline_query: types.InlineQuery):
+    """Автодополнение квестов в inline-режиме — только для билдеров маршрутов"""
+    user = await sync_to_async(User.objects.filter(telegram_id=inline_query.from_user.id).first)()
+    if not user or not user.is_route_builder:
+        return await inline_query.answer([], cache_time=60, is_personal=True)
+
+    results = await sync_to_async(search_quests)(inline_query.query, limit=20)
+    await inline_query.answer(
+        [
+            InlineQueryResultArticle(
+                id=result.id,
+                title=result.name,
+                description=result.location,
+                input_message_content=InputTextMessageContent(message_text=result.name, parse_mode=None),
+            )
+            for result in results
+        ],
+        cache_time=5,
+        is_personal=True,
+    )
+
+
 async def process_set_quest_name(message: types.Message, state: FSMContext):
+    if not message.text:
+        return await message.answer("Введите название квеста текстом:")
     await state.update_data(quest_name=message.text)
     await message.answer("Введите описание квеста")
     await state.set_state(RouteBuilderStates.waiting_for_new_quest_desc)
 
 
-@dp.message(RouteBuilderStates.waiting_for_new_quest_desc)
 async def process_set_quest_desc(message: types.Message, state: FSMContext):
+    if not message.text:
+        return await message.answer("Введите описание квеста текстом:")
     await state.update_data(quest_desc=message.text)
-    await message.answer("")
+    await message.answer(
+        "Отправьте геопозицию квеста (📎 → Геопозиция) или координаты текстом в виде «56.1366, 47.2511»:"
+    )
+    await state.set_state(RouteBuilderStates.waiting_for_new_quest_loc)
+
+
+async def process_set_quest_location(message: types.Message, state: FSMContext):
+    if message.location:
+        latitude, longitude = message.location.latitude, message.location.longitude
+    else:
+        match = COORDINATES_PATTERN.fullmatch((message.text or '').strip())
+        latitude, longitude = (float(match[1]), float(match[2])) if match else (None, None)
+    if latitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return await message.answer("Не удалось распознать координаты. Пример: 56.1366, 47.2511")
+
+    data = await state.get_data()
+    location = message.venue.address if message.venue else f"{latitude:.5f}, {longitude:.5f}"
+    await state.update_data(current_point={
+        'new_quest': {
+            'name': data['quest_name'],
+            'description': data['quest_desc'],
+            'location': location,
+            'latitude': latitude,
+            'longitude': longitude,
+        },
+        'latitude': latitude,
+        'longitude': longitude,
+    })
+    await message.answer("Введите текст подсказки для этой точки или отправьте /skip, чтобы пропустить:")
+    await state.set_state(RouteBuilderStates.waiting_for_hint_text)
+
+
+async def update_current_point(state, **fields):
+    data = await state.get_data()
+    await state.update_data(current_point={**data['current_point'], **fields})
+
+
+async def process_hint_text(message: types.Message, state: FSMContext):
+    if not message.text:
+        return await message.answer("Отправьте подсказку текстом или /skip:")
+    if message.text != "/skip":
+        await update_current_point(state, hint_text=message.text)
+    await message.answer("Пришлите фото для этой точки или отправьте /skip:")
+    await state.set_state(RouteBuilderStates.waiting_for_photo)
+
+
+async def process_point_photo(message: types.Message, state: FSMContext):
+    if message.photo:
+        await update_current_point(state, photo_file=message.photo[-1].file_id)
+    elif message.text != "/skip":
+        return await message.answer("Пришлите фото или отправьте /skip:")
+    await message.answer("Пришлите аудиогид (аудио или голосовое) для этой точки или отправьте /skip:")
+    await state.set_state(RouteBuilderStates.waiting_for_audio)
+
+
+async def process_point_audio(message: types.Message, state: FSMContext):
+    media = message.audio or message.voice
+    if media:
+        await update_current_point(state, audio_file=media.file_id)
+    elif message.text != "/skip":
+        return await message.answer("Пришлите аудио, голосовое сообщение или /skip:")
+
+    data = await state.get_data()
+    point = data['current_point']
+    if point.get('new_quest'):
+        quest_name = point['new_quest']['name']
+    else:
+        quest_name = await sync_to_async(
+            Quest.objects.filter(id=point['quest_id']).values_list('name', flat=True).first
+        )()
+    summary = (
+        f"Точка {len(data['points']) + 1}: {html.escape(quest_name or '—')}"
+        + (" (новый квест)" if point.get('new_quest') else "") + "\n"
+        f"💡 Подсказка: {html.escape(point.get('hint_text', '—'))}\n"
+        f"📷 Фото: {'есть' if point.get('photo_file') else 'нет'}\n"
+        f"🎧 Аудио: {'есть' if point.get('audio_file') else 'нет'}"
+    )
+    kb = ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text="✅ Подтвердить"), KeyboardButton(text="❌ Отменить точку")]],
+        resize_keyboard=True
+    )
+    await message.answer(f"{summary}\n\nДобавить точку в маршрут?", reply_markup=kb)
+    await state.set_state(RouteBuilderStates.confirm_point)
+
+
+async def process_confirm_point(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    if message.text == "✅ Подтвердить":
+        points = data['points'] + [data['current_point']]
+        await state.update_data(points=points, current_point=None)
+        text = f"Точка добавлена. Точек в маршруте: {len(points)}."
+    elif message.text == "❌ Отменить точку":
+        await state.update_data(current_point=None)
+        text = "Точка отменена."
+    else:
+        return await message.answer("Пожалуйста, используйте кнопки: ✅ Подтвердить или ❌ Отменить точку.")
+    await message.answer(f"{text} Что дальше?", reply_markup=get_add_point_keyboard())
+    await state.set_state(RouteBuilderStates.finish_or_add_next)
+
+
+async def process_route_document(message: types.Message, state: FSMContext):
+    """Пакетная загрузка точек из файла: маршрут сохраняется сразу, одной транзакцией"""
+    document = message.document
+    file_format = detect_format(document.file_name)
+    if not file_format:
+        return await message.answer("Поддерживаются файлы .csv, .gpx и .geojson.")
+    if document.file_size and document.file_size > settings.ROUTE_IMPORT_MAX_FILE_SIZE:
+        return await message.answer("Файл слишком большой для загрузки через бота.")
+
+    data = await state.get_data()
+    with tempfile.SpooledTemporaryFile(max_size=settings.ROUTE_IMPORT_SPOOL_SIZE) as buffer:
+        await message.bot.download(document, destination=buffer)
+        try:
+            route, imported = await _sync_import_route(data, buffer, file_format)
+        except RouteImportError as e:
+            errors = "\n".join(html.escape(error) for error in e.errors)
+            return await message.answer(f"❌ Файл не загружен, маршрут не сохранён:\n{errors}")
+
+    await message.answer(
+        f"✅ Маршрут «{html.escape(route.name)}» успешно создан! "
+        f"Точек из файла: {imported}, всего точек: {imported + len(data['points'])}.",
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+    await state.clear()
 
 
-@dp.message(lambda message: message.contact is not None)
 async def handle_contact(message: types.Message):
     get_user = sync_to_async(User.objects.get)
     user = await get_user(telegram_id=message.from_user.id)
@@ -250,7 +443,6 @@ async def handle_contact(message: types.Message):
         reply_markup=get_main_keyboard(user)
     )
 
-@dp.message(lambda message: message.text == "🎯 Получить квест")
 async def get_quest(message: types.Message):
     get_user = sync_to_async(User.objects.get)
     user = await get_user(telegram_id=message.from_user.id)
@@ -259,33 +451,24 @@ async def get_quest(message: types.Message):
         await message.answer("Пожалуйста, сначала подтвердите свой номер телефона.")
         return
     
-    get_quest = sync_to_async(lambda: Quest.objects.filter(
-        is_active=True
-    ).exclude(
-        userquestprogress__user=user
-    ).first())
-    available_quest = await get_quest()
+    # готовая карточка из памяти процесса, см. core.quest_cache
+    card = await sync_to_async(next_quest_card)(user)
     
-    if not available_quest:
+    if not card:
         await message.answer("К сожалению, сейчас нет доступных квестов.")
         return
     
     # Отправляем описание квеста
-    await message.answer(
-        f"🎯 Квест: {available_quest.name}\n\n"
-        f"📍 Локация: {available_quest.location}\n\n"
-        f"📝 Описание:\n{available_quest.description}\n\n"
-        "Для подтверждения выполнения квеста отправьте фото."
-    )
+    await message.answer(card.text)
     
     # Проверяем и отправляем локацию
-    logger.info(f"Координаты квеста: lat={available_quest.latitude}, lon={available_quest.longitude}")
+    logger.info(f"Координаты квеста: lat={card.latitude}, lon={card.longitude}")
     
     try:
-        if available_quest.latitude and available_quest.longitude:
+        if card.has_location:
             await message.answer_location(
-                latitude=float(available_quest.latitude),
-                longitude=float(available_quest.longitude)
+                latitude=card.latitude,
+                longitude=card.longitude
             )
             logger.info("Локация успешно отправлена")
         else:
@@ -294,40 +477,22 @@ async def get_quest(message: types.Message):
         logger.error(f"Ошибка при отправке локации: {e}")
         await message.answer("К сожалению, не удалось отправить карту местоположения.")
 
-@dp.message(lambda message: message.text == "🎁 Мои промокоды")
 async def my_promocodes(message: types.Message):
-    get_user = sync_to_async(User.objects.get)
-    user = await get_user(telegram_id=message.from_user.id)
+    # готовый текст из кэша, см. core.promo_messages
+    messages = await sync_to_async(promo_messages)(message.from_user.id)
     
-    get_completed_quests = sync_to_async(lambda: list(UserQuestProgress.objects.filter(
-        user=user,
-        status=UserQuestProgress.Status.APPROVED,
-        promo_code__isnull=False
-    ).select_related('quest', 'promo_code')))
-    
-    completed_quests = await get_completed_quests()
-    
-    if not completed_quests:
+    if not messages:
         await message.answer("У вас пока нет полученных промокодов.")
         return
     
-    promocodes_text = "Ваши промокоды:\n\n"
-    for progress in completed_quests:
-        promocodes_text += f"🎁 Квест: {progress.quest.name}\n"
-        promocodes_text += f"🎫 Промокод: {progress.promo_code.code}\n\n"
-    
-    await message.answer(promocodes_text)
+    for text in messages:
+        await message.answer(text)
 
-@dp.message(lambda message: message.photo is not None)
-async def handle_photo(message: types.Message):
+async def handle_photo(message: types.Message, claim_update=None):
     get_user = sync_to_async(User.objects.get)
     user = await get_user(telegram_id=message.from_user.id)
     
-    get_quest = sync_to_async(lambda: Quest.objects.filter(
-        is_active=True
-    ).exclude(
-        userquestprogress__user=user
-    ).first())
+    get_quest = sync_to_async(lambda: Quest.objects.available_for(user).first())
     active_quest = await get_quest()
     
     if not active_quest:
@@ -337,25 +502,28 @@ async def handle_photo(message: types.Message):
     photo = message.photo[-1]
     file_id = photo.file_id
     
-    create_progress = sync_to_async(UserQuestProgress.objects.create)
-    progress = await create_progress(
-        user=user,
-        quest=active_quest,
-        photo=file_id
-    )
+    progress = await sync_to_async(submit_attempt)(user, active_quest, file_id)
+    if progress is None:
+        await message.answer("Фото по этому квесту уже на проверке.")
+        return
+    # апдейт считается принятым только теперь, см. bot.idempotency
+    if claim_update is not None:
+        await claim_update()
+    attempt = f"🔁 Попытка: {progress.attempt}\n" if progress.attempt > 1 else ""
     
     await message.answer(
         "Фото получено! Администратор проверит выполнение квеста и вы получите уведомление."
     )
     
     # Отправляем фото в чат администраторов
-    await bot.send_photo(
+    await message.bot.send_photo(
         settings.ADMIN_GROUP_ID,
         photo=file_id,
         caption=(
             f"Новое выполнение квеста!\n\n"
             f"👤 Пользователь: {user.name}\n"
             f"🎯 Квест: {active_quest.name}\n"
+            f"{attempt}"
             f"🆔 ID прогресса: {progress.id}\n\n"
             "Для подтверждения используйте команду:\n"
             f"/approve {progress.id}\n\n"
@@ -364,34 +532,51 @@ async def handle_photo(message: types.Message):
         )
     )
 
-async def start_bot():
-    # Регистрируем хендлеры
-    dp.message.register(cmd_start_route_builder, lambda msg: msg.text == "🛠️ Создать маршрут")
-    dp.message.register(
-        process_route_name,
-        lambda msg: True,
-        RouteBuilderStates.waiting_for_name
-    )
-    dp.message.register(
-        process_route_description,
-        lambda msg: True,
-        RouteBuilderStates.waiting_for_description
+def register_handlers(dp):
+    """
+    Собирает роутеры и подключает их к диспетчеру ровно один раз.
+    Кнопки и команды разбираются через словарь TextDispatcher,
+    шаги конструктора маршрутов — в отдельном роутере, который
+    пропускает апдейт одной проверкой, если пользователь не в конструкторе.
+    """
+    menu = TextDispatcher(name='menu')
+    menu.command("approve", admin_commands.handle_approve)
+    menu.command("reject", admin_commands.handle_reject)
+    menu.command("start", cmd_start)
+    menu.text("🛠️ Создать маршрут", cmd_start_route_builder)
+    menu.text("🎯 Получить квест", get_quest)
+    menu.text("🎁 Мои промокоды", my_promocodes)
+
+    builder = Router(name='route_builder')
+    builder.message.filter(StateFilter(RouteBuilderStates))
+    builder.message.register(process_route_name, RouteBuilderStates.waiting_for_name)
+    builder.message.register(process_route_description, RouteBuilderStates.waiting_for_description)
+    builder.message.register(
+        process_route_document, F.document,
+        StateFilter(RouteBuilderStates.waiting_for_add_point, RouteBuilderStates.finish_or_add_next),
     )
-    dp.message.register(
-        process_quest_choice,
-        lambda msg: True,
-        RouteBuilderStates.waiting_for_quest_choice
+    builder.message.register(
+        process_add_point,
+        StateFilter(RouteBuilderStates.waiting_for_add_point, RouteBuilderStates.finish_or_add_next),
     )
-
-    dp.message.register(cmd_start, Command("start"))
-    dp.message.register(handle_contact, lambda message: message.contact is not None)
-    dp.message.register(get_quest, lambda message: message.text == "🎯 Получить квест")
-    dp.message.register(my_promocodes, lambda message: message.text == "🎁 Мои промокоды")
-    dp.message.register(handle_photo, lambda message: message.photo is not None)
-    
-    try:
-        # Запускаем бота
-        await dp.start_polling(bot, skip_updates=True)
-    except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
-        raise 
\ No newline at end of file
+    builder.message.register(process_quest_choice, RouteBuilderStates.waiting_for_quest_choice)
+    builder.message.register(process_set_quest_name, RouteBuilderStates.waiting_for_new_quest_name)
+    builder.message.register(process_set_quest_desc, RouteBuilderStates.waiting_for_new_quest_desc)
+    builder.message.register(process_set_quest_location, RouteBuilderStates.waiting_for_new_quest_loc)
+    builder.message.register(process_hint_text, RouteBuilderStates.waiting_for_hint_text)
+    builder.message.register(process_point_photo, RouteBuilderStates.waiting_for_photo)
+    builder.message.register(process_point_audio, RouteBuilderStates.waiting_for_audio)
+    builder.message.register(process_confirm_point, RouteBuilderStates.confirm_point)
+
+    builder.callback_query.register(browse_quests, QuestPage.filter())
+    builder.callback_query.register(pick_quest, QuestPick.filter(), RouteBuilderStates.waiting_for_quest_choice)
+    builder.callback_query.register(pick_quest_outdated, QuestPick.filter())
+
+    search = Router(name='quest_search')
+    search.inline_query.register(inline_quest_search)
+
+    media = Router(name='media')
+    media.message.register(handle_contact, F.contact)
+    media.message.register(handle_photo, F.photo)
+
+    dp.include_routers(menu.router, builder, search, media)
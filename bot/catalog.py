@@ -0,0 +1,103 @@
+"""
+Каталог активных квестов для конструктора маршрутов.
+
+Листание — keyset-пагинация по (created_at, id): курсор страницы хранится
+прямо в callback_data кнопки, поэтому перелистывание — один запрос по частичному
+индексу quest_catalog_idx без OFFSET и без чтения FSM, сколько бы квестов
+ни было в каталоге. Курсор упакован в base64 (8 байт времени + 16 байт UUID),
+так что callback_data укладывается в лимит Telegram в 64 байта с запасом.
+"""
+import base64
+import datetime
+import uuid
+from dataclasses import dataclass
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from django.conf import settings
+from django.db.models import Q
+
+from core.models import Quest
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class QuestPage(CallbackData, prefix='qp'):
+    back: bool
+    cursor: str
+
+
+class QuestPick(CallbackData, prefix='qs'):
+    quest_id: uuid.UUID
+
+
+def encode_cursor(created_at, quest_id):
+    raw = ((created_at - EPOCH) // MICROSECOND).to_bytes(8, 'big', signed=True) + quest_id.bytes
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor)
+    created_at = EPOCH + int.from_bytes(raw[:8], 'big', signed=True) * MICROSECOND
+    return created_at, uuid.UUID(bytes=raw[8:])
+
+
+@dataclass
+class CatalogPage:
+    quests: list  # [(id, name, created_at)]
+    has_prev: bool
+    has_next: bool
+
+
+def fetch_catalog_page(cursor=None, back=False, size=None):
+    """
+    Страница каталога после курсора (или перед ним, если back=True).
+    Берём на одну строку больше, чтобы понять, есть ли что листать дальше.
+    """
+    size = size or settings.QUEST_CATALOG_PAGE_SIZE
+    quests = Quest.objects.filter(is_active=True)
+    if cursor is not None:
+        created_at, quest_id = decode_cursor(cursor)
+        # (created_at, id) > курсора; отдельное условие по created_at даёт планировщику диапазон по индексу
+        if back:
+            quests = quests.filter(
+                Q(created_at__lt=created_at) | Q(id__lt=quest_id), created_at__lte=created_at
+            )
+        else:
+            quests = quests.filter(
+                Q(created_at__gt=created_at) | Q(id__gt=quest_id), created_at__gte=created_at
+            )
+    ordering = ('-created_at', '-id') if back else ('created_at', 'id')
+    rows = list(quests.order_by(*ordering).values_list('id', 'name', 'created_at')[:size + 1])
+
+    more = len(rows) > size
+    rows = rows[:size]
+    if back:
+        rows.reverse()
+        return CatalogPage(rows, has_prev=more, has_next=True)
+    return CatalogPage(rows, has_prev=cursor is not None, has_next=more)
+
+
+def catalog_keyboard(page):
+    buttons = [
+        [InlineKeyboardButton(text=name, callback_data=QuestPick(quest_id=quest_id).pack())]
+        for quest_id, name, _ in page.quests
+    ]
+    navigation = []
+    if page.has_prev:
+        first_id, _, first_created = page.quests[0]
+        navigation.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=QuestPage(back=True, cursor=encode_cursor(first_created, first_id)).pack(),
+        ))
+    if page.has_next:
+        last_id, _, last_created = page.quests[-1]
+        navigation.append(InlineKeyboardButton(
+            text="Вперёд ▶️",
+            callback_data=QuestPage(back=False, cursor=encode_cursor(last_created, last_id)).pack(),
+        ))
+    if navigation:
+        buttons.append(navigation)
+    buttons.append([InlineKeyboardButton(text="🔍 Найти квест", switch_inline_query_current_chat="")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
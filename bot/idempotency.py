@@ -0,0 +1,138 @@
+"""
+Идемпотентная обработка апдейтов.
+
+Telegram доставляет апдейт «хотя бы один раз»: после сетевой ошибки или
+перезапуска тот же апдейт (или то же фото, отправленное повторно клиентом)
+может прийти ещё раз. IdempotencyMiddleware стоит снаружи всех обработчиков
+и отбрасывает повтор до любой записи в базу и до любого вызова Bot API.
+
+Ключ апдейта — update:<update_id>; ключи помнятся в памяти процесса
+(ограниченное число, с TTL). Фото вне конструктора маршрутов — отправка на
+проверку, единственное действие с побочными эффектами для админов, и её
+повтор должен отсекаться и после перезапуска бота. Поэтому ключ такого
+апдейта дополнительно пишется в ProcessedUpdate — но только когда обработчик
+действительно завёл попытку (claim_update в данных обработчика). Фото без
+активного квеста или при попытке, которая уже на проверке, ничего не
+занимает: то же фото можно прислать снова, в том числе после отклонения.
+Повтор уже принятого фото отбрасывается с ответом пользователю.
+"""
+import datetime
+import logging
+import time
+from collections import OrderedDict
+from functools import partial
+
+from aiogram import BaseMiddleware
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import ProcessedUpdate
+from .metrics import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+PURGE_EVERY = 1000  # раз в столько записей в базу удаляются просроченные ключи
+
+
+class ExpiringKeySet:
+    """
+    Ключи в порядке добавления. Из начала вытесняются ключи старше ttl,
+    а при переполнении — самые старые, так что память ограничена max_entries.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+
+    def add_all(self, keys, now):
+        """Запоминает ключи; False — хотя бы один уже был, тогда ничего не меняется"""
+        self._evict(now)
+        if any(key in self._keys for key in keys):
+            return False
+        for key in keys:
+            self._keys[key] = now
+        return True
+
+    def _evict(self, now):
+        while self._keys:
+            key, added = next(iter(self._keys.items()))
+            if now - added < self.ttl and len(self._keys) < self.max_entries:
+                break
+            del self._keys[key]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class DurableKeyStore:
+    """Ключи в таблице ProcessedUpdate: первичный ключ не даёт принять апдейт дважды"""
+
+    def __init__(self, ttl):
+        self.ttl = datetime.timedelta(seconds=ttl)
+        self._claims = 0
+
+    def seen(self, keys):
+        """Есть ли непросроченная запись хотя бы одного из ключей"""
+        expired = timezone.now() - self.ttl
+        return ProcessedUpdate.objects.filter(key__in=keys, created_at__gte=expired).exists()
+
+    def claim(self, keys):
+        """True — ключи записаны впервые (или прежние записи просрочены)"""
+        now = timezone.now()
+        expired = now - self.ttl
+        self._claims += 1
+        try:
+            with transaction.atomic():
+                if self._claims % PURGE_EVERY == 0:
+                    ProcessedUpdate.objects.filter(created_at__lt=expired).delete()
+                else:
+                    ProcessedUpdate.objects.filter(key__in=keys, created_at__lt=expired).delete()
+                ProcessedUpdate.objects.bulk_create(ProcessedUpdate(key=key, created_at=now) for key in keys)
+        except IntegrityError:
+            return False
+        return True
+
+
+def update_key(update):
+    return f'update:{update.update_id}'
+
+
+def is_submission(update, raw_state=None):
+    """Фото на проверку; в конструкторе маршрутов фото — это фото точки"""
+    message = update.message
+    return message is not None and bool(message.photo) and message.from_user is not None and raw_state is None
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update. Стоит после FSM-middleware диспетчера,
+    поэтому видит состояние пользователя (raw_state).
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        ttl = ttl or settings.BOT_IDEMPOTENCY_TTL
+        self.recent = ExpiringKeySet(ttl, max_entries or settings.BOT_IDEMPOTENCY_MAX_KEYS)
+        self.durable = DurableKeyStore(ttl)
+
+    async def __call__(self, handler, event, data):
+        if not settings.BOT_IDEMPOTENCY_ENABLED:
+            return await handler(event, data)
+
+        keys = [update_key(event)]
+        if not self.recent.add_all(keys, time.monotonic()):
+            # первый экземпляр уже обработан или обрабатывается и сам ответит пользователю
+            logger.info(f"Повторный апдейт {event.update_id} отброшен")
+            return None
+        if is_submission(event, data.get('raw_state')):
+            if await sync_to_async(self.durable.seen)(keys):
+                logger.info(f"Апдейт {event.update_id} с уже принятым фото отброшен")
+                await event.message.answer("Это фото уже получено и отправлено на проверку.")
+                return None
+            data['claim_update'] = partial(sync_to_async(self.durable.claim), keys)
+        return await handler(event, data)
+
+
+def setup_idempotency(dp):
+    dp.update.outer_middleware(IdempotencyMiddleware())
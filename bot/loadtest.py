@@ -0,0 +1,366 @@
+"""
+Нагрузочный прогон бота на синтетическом трафике Telegram.
+
+Апдейты собираются как настоящие aiogram.types.Update и подаются прямо
+в dp.feed_update, а вместо HTTP-сессии к Bot API используется FakeSession,
+которая мгновенно (или с заданной задержкой) отвечает на любые методы.
+"""
+import asyncio
+import datetime
+import itertools
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Contact, File, Message, PhotoSize, Update
+from aiogram.types import User as TelegramUser
+from aiohttp import web
+
+from core.benchmarking import percentile
+from core.inventory import add_promo_codes
+from core.models import PromoCodeStock, Quest, User, UserQuestProgress
+
+BENCH_BOT_TOKEN = '42:BENCHMARK'
+
+DEFAULT_MIX = {
+    'start': 1,
+    'contact': 1,
+    'get_quest': 4,
+    'photo': 2,
+    'my_promocodes': 3,
+    'approve': 1,
+    'reject': 1,
+    'route_builder': 1,
+}
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: считает вызовы и возвращает правдоподобные ответы"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is Message:
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=getattr(method, 'chat_id', 0) or 0, type='private'),
+            )
+        if returning is TelegramUser:
+            return TelegramUser(id=42, is_bot=True, first_name='Benchmark', username='benchmark_bot')
+        if returning is File:
+            file_id = getattr(method, 'file_id', 'file')
+            return File(file_id=file_id, file_unique_id=file_id[-16:], file_path=f'photos/{file_id}.jpg')
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def create_fake_bot(latency=0.0):
+    from .app import create_bot
+    return create_bot(BENCH_BOT_TOKEN, session=FakeSession(latency))
+
+
+class FakeFileServer:
+    """
+    Локальный HTTP-сервер с getFile и раздачей файлов, как у Bot API — для
+    загрузчика фото (bot.media) вместо api.telegram.org. file_id имеет вид
+    fake-<содержимое>-<байт>-<что угодно>: одинаковые «содержимое» и размер
+    дают одинаковые байты, так что можно проверить запись без дублей.
+    Файлы генерируются и отдаются кусками, целиком в памяти не лежат.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=64 * 1024):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.expired = set()  # содержимое, которое отдаётся как 404 — истёкший файл
+        self.calls = Counter()
+        self._runner = None
+        self.url = None
+
+    @staticmethod
+    def file_id(content, size, unique):
+        return f'fake-{content}-{size}-{unique}'
+
+    @staticmethod
+    def parse(file_id):
+        prefix, content, size, _ = file_id.split('-', 3)
+        if prefix != 'fake':
+            raise ValueError(file_id)
+        return content, int(size)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/getFile', self.get_file)
+        app.router.add_get('/file/bot{token}/photos/{content:[^-/]+}-{size:\d+}.jpg', self.download)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}'
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def get_file(self, request):
+        self.calls['getFile'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        file_id = (await request.post()).get('file_id', '')
+        try:
+            content, size = self.parse(file_id)
+        except ValueError:
+            return web.json_response(
+                {'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid file_id'}, status=400,
+            )
+        return web.json_response({'ok': True, 'result': {
+            'file_id': file_id,
+            'file_unique_id': content,
+            'file_size': size,
+            'file_path': f'photos/{content}-{size}.jpg',
+        }})
+
+    async def download(self, request):
+        self.calls['download'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.match_info['content'] in self.expired:
+            raise web.HTTPNotFound()
+        size = int(request.match_info['size'])
+        response = web.StreamResponse(headers={'Content-Type': 'image/jpeg', 'Content-Length': str(size)})
+        await response.prepare(request)
+        rng = random.Random(request.match_info['content'])
+        left = size
+        while left:
+            chunk = min(self.chunk_size, left)
+            await response.write(rng.randbytes(chunk))
+            left -= chunk
+        await response.write_eof()
+        return response
+
+
+class UpdateFactory:
+    """Собирает Update'ы от имени пользователей и админского чата"""
+
+    def __init__(self, admin_chat_id):
+        self.admin_chat_id = admin_chat_id
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id, chat_id=None, **fields):
+        chat_id = user_id if chat_id is None else chat_id
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id, type='private' if chat_id == user_id else 'supergroup'),
+                from_user=TelegramUser(id=user_id, is_bot=False, first_name=f'User {user_id}'),
+                **fields,
+            ),
+        )
+
+    def text(self, user_id, text):
+        return self.message(user_id, text=text)
+
+    def contact(self, user_id):
+        return self.message(user_id, contact=Contact(
+            phone_number=f'+7900{user_id % 10_000_000:07d}',
+            first_name=f'User {user_id}',
+            user_id=user_id,
+        ))
+
+    def photo(self, user_id):
+        file_id = f'AgAC{user_id}x{next(self._message_ids)}'
+        return self.message(user_id, photo=[PhotoSize(
+            file_id=file_id, file_unique_id=file_id[-16:], width=1280, height=960,
+        )])
+
+    def admin_command(self, admin_id, text):
+        return self.message(admin_id, chat_id=self.admin_chat_id, text=text)
+
+
+@dataclass
+class LoadDataset:
+    quest_names: list
+    users: dict = field(default_factory=dict)  # сценарий -> telegram_id пользователей
+    progress_ids: list = field(default_factory=list)
+
+
+def prepare_quests(count=20, codes_per_quest=5000):
+    """Активные квесты с запасом промокодов, общие для всех прогонов"""
+    quests = Quest.objects.bulk_create(
+        Quest(
+            name=f'Нагрузочный квест {i}',
+            description='Сделайте фото на фоне достопримечательности',
+            location='Чебоксары',
+            latitude=56.1366 + i * 0.001,
+            longitude=47.2511 + i * 0.001,
+        )
+        for i in range(count)
+    )
+    PromoCodeStock.objects.bulk_create(PromoCodeStock(quest=quest) for quest in quests)
+    for quest in quests:
+        add_promo_codes(quest.id, (f'B{quest.id.hex[:8]}{n:06d}' for n in range(codes_per_quest)))
+    return [quest.name for quest in quests]
+
+
+def prepare_dataset(quest_names, sessions_per_scenario, id_offset):
+    """
+    Пользователи под каждый сценарий: неподтверждённые для /start и контакта,
+    подтверждённые для квестов, билдеры маршрутов и прогрессы на проверке.
+    """
+    dataset = LoadDataset(quest_names=quest_names)
+    telegram_ids = itertools.count(id_offset)
+    quests = list(Quest.objects.filter(name__in=quest_names))
+    users = []
+    for scenario, sessions in sessions_per_scenario.items():
+        ids = [next(telegram_ids) for _ in range(sessions)]
+        dataset.users[scenario] = ids
+        if scenario == 'start':
+            continue
+        users.extend(
+            User(
+                telegram_id=telegram_id,
+                name=f'User {telegram_id}',
+                is_verified=scenario != 'contact',
+                is_route_builder=scenario == 'route_builder',
+            )
+            for telegram_id in ids
+        )
+    User.objects.bulk_create(users)
+
+    by_telegram_id = {user.telegram_id: user for user in users}
+    progress = []
+    for scenario in ('approve', 'reject'):
+        for telegram_id in dataset.users.get(scenario, []):
+            progress.append(UserQuestProgress(
+                user=by_telegram_id[telegram_id],
+                quest=random.choice(quests),
+                telegram_file_id='bench-photo',
+            ))
+    for telegram_id in dataset.users.get('my_promocodes', []):
+        for quest in random.sample(quests, min(3, len(quests))):
+            progress.append(UserQuestProgress(
+                user=by_telegram_id[telegram_id],
+                quest=quest,
+                telegram_file_id='bench-photo',
+                status=UserQuestProgress.Status.APPROVED,
+            ))
+    UserQuestProgress.objects.bulk_create(progress)
+    dataset.progress_ids = [
+        str(item.id) for item in progress if item.status == UserQuestProgress.Status.PENDING
+    ]
+    return dataset
+
+
+def build_sessions(factory, dataset, admin_id):
+    """Последовательности апдейтов: внутри сессии порядок важен, сессии независимы"""
+    pending = iter(dataset.progress_ids)
+    sessions = []
+    for scenario, telegram_ids in dataset.users.items():
+        for telegram_id in telegram_ids:
+            if scenario == 'start':
+                session = [factory.text(telegram_id, '/start')]
+            elif scenario == 'contact':
+                session = [factory.contact(telegram_id)]
+            elif scenario == 'get_quest':
+                session = [factory.text(telegram_id, '🎯 Получить квест')]
+            elif scenario == 'photo':
+                session = [factory.photo(telegram_id)]
+            elif scenario == 'my_promocodes':
+                session = [factory.text(telegram_id, '🎁 Мои промокоды')]
+            elif scenario == 'approve':
+                session = [factory.admin_command(admin_id, f'/approve {next(pending)}')]
+            elif scenario == 'reject':
+                session = [factory.admin_command(admin_id, f'/reject {next(pending)} размытое фото')]
+            elif scenario == 'route_builder':
+                session = [
+                    factory.text(telegram_id, '🛠️ Создать маршрут'),
+                    factory.text(telegram_id, f'Маршрут {telegram_id}'),
+                    factory.text(telegram_id, 'Прогулка по центру'),
+                    factory.text(telegram_id, '➕ Добавить точку'),
+                    factory.text(telegram_id, random.choice(dataset.quest_names)),
+                ]
+            else:
+                raise ValueError(f'Неизвестный сценарий: {scenario}')
+            sessions.append(session)
+    random.shuffle(sessions)
+    return sessions
+
+
+def split_mix(mix, total_sessions):
+    """Раскладывает общее число сессий по сценариям пропорционально весам"""
+    weight = sum(mix.values())
+    counts = {name: int(total_sessions * w / weight) for name, w in mix.items()}
+    for name in itertools.islice(itertools.cycle(mix), total_sessions - sum(counts.values())):
+        counts[name] += 1
+    return counts
+
+
+@dataclass
+class LoadResult:
+    concurrency: int
+    updates: int
+    elapsed: float
+    latencies: list
+    errors: int
+    api_calls: int
+
+    @property
+    def throughput(self):
+        return self.updates / self.elapsed if self.elapsed else 0.0
+
+    def percentile_ms(self, q):
+        return percentile(self.latencies, q) * 1000
+
+
+async def run_load(dp, bot, sessions, concurrency):
+    """
+    Прогоняет сессии через dp.feed_update в concurrency параллельных
+    «клиентов» и собирает задержку каждого апдейта.
+    """
+    queue = list(reversed(sessions))
+    latencies = []
+    errors = 0
+    calls_before = sum(bot.session.calls.values())
+
+    async def client():
+        nonlocal errors
+        while queue:
+            for update in queue.pop():
+                start = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return LoadResult(
+        concurrency=concurrency,
+        updates=len(latencies),
+        elapsed=elapsed,
+        latencies=latencies,
+        errors=errors,
+        api_calls=sum(bot.session.calls.values()) - calls_before,
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarking import benchmark_database
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест бота: синтетические апдейты через dp.feed_update на временной базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=500,
+                            help='Сколько пользовательских сессий прогнать на каждом уровне параллельности')
+        parser.add_argument('--concurrency', default='1,4,16,64',
+                            help='Уровни параллельности через запятую')
+        parser.add_argument('--mix', default=None,
+                            help='Веса сценариев, например get_quest=4,photo=2,approve=1')
+        parser.add_argument('--api-latency', type=float, default=0.0,
+                            help='Имитация задержки Bot API, мс')
+        parser.add_argument('--journal-mode', default=None,
+                            help='Режим журнала SQLite: wal (ближе к конкурентному Postgres) или delete')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Не отключать защиту от флуда (по умолчанию она выключена, чтобы мерить сам бот)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        from bot.loadtest import (
+            DEFAULT_MIX, UpdateFactory, build_sessions, create_fake_bot,
+            prepare_dataset, prepare_quests, run_load, split_mix,
+        )
+        from bot.app import create_dispatcher
+
+        random.seed(options['seed'])
+        mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        if not settings.ADMIN_GROUP_ID:
+            settings.ADMIN_GROUP_ID = '-100'
+        admin_chat_id = int(settings.ADMIN_GROUP_ID)
+        settings.BOT_THROTTLE_ENABLED = options['throttle']
+        logging.disable(logging.WARNING)
+
+        dp = create_dispatcher()
+        with benchmark_database(options['journal_mode']) as vendor:
+            self.stdout.write(f"База: {vendor}, journal_mode={options['journal_mode'] or 'по умолчанию'}")
+            quest_names = prepare_quests()
+            counts = split_mix(mix, options['sessions'])
+            # update_id в Telegram только растут: одна фабрика на все прогоны,
+            # иначе повторные update_id отбросит защита от повторной доставки
+            factory = UpdateFactory(admin_chat_id)
+            self.stdout.write(
+                f"{'conc':>5} {'updates':>8} {'upd/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                f"{'p99 ms':>8} {'errors':>7} {'api calls':>10}"
+            )
+            for index, concurrency in enumerate(levels):
+                dataset = prepare_dataset(quest_names, counts, id_offset=(index + 1) * 1_000_000)
+                sessions = build_sessions(factory, dataset, admin_id=1)
+                bot = create_fake_bot(options['api_latency'] / 1000)
+                result = asyncio.run(run_load(dp, bot, sessions, concurrency))
+                self.stdout.write(
+                    f"{result.concurrency:>5} {result.updates:>8} {result.throughput:>9.1f} "
+                    f"{result.percentile_ms(50):>8.2f} {result.percentile_ms(95):>8.2f} "
+                    f"{result.percentile_ms(99):>8.2f} {result.errors:>7} {result.api_calls:>10}"
+                )
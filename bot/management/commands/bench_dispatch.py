@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+
+async def noop(message):
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк маршрутизации: цепочка lambda-фильтров против словаря TextDispatcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handlers', default='5,20,80,320',
+                            help='Количество обработчиков-кнопок через запятую')
+        parser.add_argument('--updates', type=int, default=5000, help='Апдейтов на один замер')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        from aiogram import Dispatcher
+        from bot.loadtest import UpdateFactory, create_fake_bot
+        from bot.routing import TextDispatcher
+
+        logging.disable(logging.INFO)
+        random.seed(options['seed'])
+        bot = create_fake_bot()
+        factory = UpdateFactory(admin_chat_id=0)
+
+        self.stdout.write(f"{'handlers':>9} {'lambda, мкс':>12} {'dict, мкс':>10} {'ускорение':>10}")
+        for count in (int(value) for value in options['handlers'].split(',')):
+            texts = [f'Кнопка {i}' for i in range(count)]
+            updates = [factory.text(1, random.choice(texts)) for _ in range(options['updates'])]
+
+            chain = Dispatcher()
+            for text in texts:
+                chain.message.register(noop, lambda message, text=text: message.text == text)
+
+            table = Dispatcher()
+            menu = TextDispatcher()
+            for text in texts:
+                menu.text(text, noop)
+            table.include_router(menu.router)
+
+            chain_us = asyncio.run(self.measure(chain, bot, updates))
+            table_us = asyncio.run(self.measure(table, bot, updates))
+            self.stdout.write(f"{count:>9} {chain_us:>12.1f} {table_us:>10.1f} {chain_us / table_us:>9.1f}x")
+
+    async def measure(self, dp, bot, updates):
+        """Среднее время dp.feed_update на апдейт, мкс (после прогрева)"""
+        for update in updates[:100]:
+            await dp.feed_update(bot, update)
+        start = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        return (time.perf_counter() - start) / len(updates) * 1_000_000
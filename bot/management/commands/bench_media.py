@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarking import benchmark_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет загрузчик фото выполнений на временной базе и локальном фейковом Bot API: '
+        'скорость при разной параллельности, пик памяти и запись без дублей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=200, help='Сколько фото выполнений скачать')
+        parser.add_argument('--duplicates', type=float, default=0.3,
+                            help='Доля фото, повторяющих уже присланные (те же байты, другой file_id)')
+        parser.add_argument('--size-kb', type=int, default=1024, help='Размер одного фото, КБ')
+        parser.add_argument('--concurrency', default='1,4,16', help='Уровни параллельности через запятую')
+        parser.add_argument('--latency', type=float, default=50.0,
+                            help='Задержка ответа фейкового сервера на каждый запрос, мс')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['files'] < 1 or options['size_kb'] < 1:
+            raise CommandError('--files и --size-kb должны быть положительными')
+        if not 0 <= options['duplicates'] < 1:
+            raise CommandError('--duplicates должен быть от 0 до 1')
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        logging.disable(logging.WARNING)
+        from core.models import UserQuestProgress
+
+        size = options['size_kb'] * 1024
+        self.stdout.write(
+            f"Фото: {options['files']} по {options['size_kb']} КБ, повторов {options['duplicates']:.0%}, "
+            f"задержка сервера {options['latency']:.0f} мс"
+        )
+        self.stdout.write(
+            f"{'conc':>5} {'секунд':>8} {'фото/с':>8} {'МБ/с':>7} {'записано':>9} {'дубли':>6} "
+            f"{'ошибок':>7} {'пик памяти, МБ':>15}"
+        )
+        # одна база на все уровни: поток sync_to_async держит соединение с ней между asyncio.run
+        with benchmark_database():
+            file_ids = self.prepare(options['files'], options['duplicates'], size, options['seed'])
+            for concurrency in levels:
+                UserQuestProgress.objects.update(photo='', media_attempts=0)
+                location = tempfile.mkdtemp(prefix='quest-media-')
+                try:
+                    storage = FileSystemStorage(location=location)
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    stats = asyncio.run(self.download(concurrency, options['latency'] / 1000, storage))
+                    elapsed = time.perf_counter() - started
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    self.verify(storage, location, file_ids, stats)
+                finally:
+                    shutil.rmtree(location, ignore_errors=True)
+                self.stdout.write(
+                    f"{concurrency:>5} {elapsed:>8.2f} {stats['downloaded'] / elapsed:>8.1f} "
+                    f"{stats['bytes'] / 1024 / 1024 / elapsed:>7.1f} {stats['written']:>9} "
+                    f"{stats['deduplicated']:>6} {stats['failed']:>7} {peak / 1024 / 1024:>15.1f}"
+                )
+
+    def prepare(self, count, duplicates, size, seed):
+        """Выполнения на проверке с file_id фейкового сервера; часть повторяет уже присланное фото"""
+        from bot.loadtest import FakeFileServer
+        from core.models import Quest, User, UserQuestProgress
+
+        rng = random.Random(seed)
+        quest = Quest.objects.create(name='Квест для замера', description='Сфотографируйте', location='Чебоксары')
+        users = User.objects.bulk_create(
+            User(telegram_id=500_000_000 + i, name=f'User {i}') for i in range(count)
+        )
+        contents, file_ids = [], []
+        for i in range(count):
+            if contents and rng.random() < duplicates:
+                content = rng.choice(contents)
+            else:
+                content = f'{rng.getrandbits(64):016x}'
+                contents.append(content)
+            file_ids.append(FakeFileServer.file_id(content, size, i))
+        UserQuestProgress.objects.bulk_create(
+            UserQuestProgress(user=user, quest=quest, telegram_file_id=file_id)
+            for user, file_id in zip(users, file_ids)
+        )
+        return file_ids
+
+    async def download(self, concurrency, latency, storage):
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+
+        from bot.app import create_bot
+        from bot.loadtest import BENCH_BOT_TOKEN, FakeFileServer
+        from bot.media import MediaDownloader
+
+        server = await FakeFileServer(latency=latency).start()
+        bot = create_bot(BENCH_BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(server.url)))
+        try:
+            downloader = MediaDownloader(bot, concurrency=concurrency, interval=0, storage=storage)
+            return await downloader.run(once=True)
+        finally:
+            await bot.session.close()
+            await server.stop()
+
+    def verify(self, storage, location, file_ids, stats):
+        """Все выполнения получили фото, файлов столько, сколько разных фото, имена совпадают с sha256"""
+        from bot.loadtest import FakeFileServer
+        from core.models import UserQuestProgress
+
+        names = set(UserQuestProgress.objects.values_list('photo', flat=True))
+        missing = UserQuestProgress.objects.filter(photo='').count()
+        distinct = len({FakeFileServer.parse(file_id) for file_id in file_ids})
+        stored = [os.path.join(root, name) for root, _, files in os.walk(location) for name in files]
+        if missing or stats['failed']:
+            raise CommandError(f"Не скачано {missing} фото, ошибок {stats['failed']}")
+        if len(stored) != distinct or len(names) != distinct or stats['written'] != distinct:
+            raise CommandError(f'Разных фото {distinct}, а файлов {len(stored)}, путей в базе {len(names)}')
+        for name in names:
+            digest = hashlib.sha256()
+            with storage.open(name) as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+            if digest.hexdigest() not in name:
+                raise CommandError(f'Содержимое {name} не совпадает с именем')
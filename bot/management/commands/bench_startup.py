@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse_importtime(stderr):
+    """
+    Разбирает вывод python -X importtime: суммирует собственное (self) время
+    импорта модулей по корневому пакету. Возвращает {пакет: мкс}.
+    """
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line.split(':', 1)[1].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return dict(totals)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет холодный старт бота: время импортов и время до обработки первого апдейта'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Сколько холодных запусков усреднять (медиана)')
+        parser.add_argument('--target-ms', type=float, default=4000.0,
+                            help='Цель по времени от запуска процесса до обработанного первого апдейта')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых тяжёлых пакетов показать')
+        parser.add_argument('--probe', action='store_true', help='Служебный режим дочернего процесса')
+
+    def handle(self, *args, **options):
+        if options['probe']:
+            return self.probe()
+
+        self.stdout.write('Импорты (python -X importtime):')
+        result = self.spawn(importtime=True)
+        totals = parse_importtime(result.stderr)
+        for name, cumulative in sorted(totals.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {name:<30} {cumulative / 1000:>8.1f} мс')
+
+        runs = [json.loads(self.spawn().stdout.strip().splitlines()[-1]) for _ in range(options['runs'])]
+        runs.sort(key=lambda run: run['total_ms'])
+        median = runs[len(runs) // 2]
+        self.stdout.write(
+            f"\nЗапуск интерпретатора и Django: {median['django_ms']:.0f} мс\n"
+            f"Сборка Bot и Dispatcher:        {median['bot_ms']:.0f} мс\n"
+            f"Первый апдейт:                  {median['first_update_ms']:.1f} мс\n"
+            f"Итого до первого апдейта:       {median['total_ms']:.0f} мс (цель {options['target_ms']:.0f} мс)"
+        )
+        if median['total_ms'] > options['target_ms']:
+            raise CommandError('Холодный старт медленнее цели')
+        self.stdout.write(self.style.SUCCESS('Холодный старт укладывается в цель'))
+
+    def spawn(self, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += [os.path.join(settings.BASE_DIR, 'manage.py'), 'bench_startup', '--probe']
+        env = {**os.environ, 'BENCH_LAUNCHED_AT': repr(time.time())}
+        result = subprocess.run(command, capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        if result.returncode != 0:
+            raise CommandError(f'Дочерний процесс упал:\n{result.stderr[-2000:]}')
+        return result
+
+    def probe(self):
+        """Дочерний процесс: собирает бота, как run_bot, и обрабатывает один /start"""
+        import asyncio
+        import logging
+
+        launched_at = float(os.environ['BENCH_LAUNCHED_AT'])
+        django_ready = time.time()
+
+        from bot.app import create_dispatcher
+        from bot.loadtest import UpdateFactory, create_fake_bot
+
+        bot = create_fake_bot()
+        dp = create_dispatcher()
+        bot_ready = time.time()
+
+        from core.benchmarking import benchmark_database
+
+        logging.disable(logging.WARNING)
+        with benchmark_database():
+            update = UpdateFactory(admin_chat_id=0).text(1, '/start')
+            start = time.perf_counter()
+            asyncio.run(dp.feed_update(bot, update))
+            first_update = time.perf_counter() - start
+
+        self.stdout.write(json.dumps({
+            'django_ms': (django_ready - launched_at) * 1000,
+            'bot_ms': (bot_ready - django_ready) * 1000,
+            'first_update_ms': first_update * 1000,
+            'total_ms': (bot_ready - launched_at + first_update) * 1000,
+        }))
@@ -0,0 +1,100 @@
+import logging
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarking import benchmark_database
+from .bench_bot import parse_mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Масштабирование бота по процессам: те же синтетические сессии, что в bench_bot, '
+        'раскладываются по воркерам по чату, как в run_bot --workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=2000,
+                            help='Сколько пользовательских сессий прогнать на каждом числе воркеров')
+        parser.add_argument('--workers', default='1,2,4',
+                            help='Числа воркеров через запятую')
+        parser.add_argument('--mix', default=None,
+                            help='Веса сценариев, например get_quest=4,photo=2,approve=1')
+        parser.add_argument('--api-latency', type=float, default=0.0,
+                            help='Имитация задержки Bot API, мс')
+        parser.add_argument('--journal-mode', default='wal',
+                            help='Режим журнала SQLite; по умолчанию wal — несколько процессов пишут в одну базу')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        from bot.loadtest import (
+            DEFAULT_MIX, UpdateFactory, build_sessions, prepare_dataset, prepare_quests, split_mix,
+        )
+
+        random.seed(options['seed'])
+        mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['workers'].split(',')]
+        if min(levels) < 1:
+            raise CommandError('Число воркеров должно быть не меньше 1')
+
+        admin_chat_id = int(settings.ADMIN_GROUP_ID or -100)
+        logging.disable(logging.WARNING)
+
+        with benchmark_database(options['journal_mode']) as vendor:
+            self.stdout.write(f"База: {vendor}, journal_mode={options['journal_mode']}")
+            quest_names = prepare_quests()
+            counts = split_mix(mix, options['sessions'])
+            factory = UpdateFactory(admin_chat_id)
+            self.stdout.write(
+                f"{'workers':>8} {'updates':>8} {'upd/s':>9} {'ускорение':>10} {'errors':>7} {'api calls':>10}"
+            )
+            baseline = None
+            for index, workers in enumerate(levels):
+                dataset = prepare_dataset(quest_names, counts, id_offset=(index + 1) * 1_000_000)
+                sessions = build_sessions(factory, dataset, admin_id=1)
+                # воркеры в своих процессах открывают ту же временную базу
+                connection.close()
+                updates, elapsed, errors, api_calls = self.run_level(
+                    workers, sessions, admin_chat_id, options['api_latency'] / 1000,
+                )
+                throughput = updates / elapsed if elapsed else 0.0
+                baseline = baseline or throughput
+                self.stdout.write(
+                    f"{workers:>8} {updates:>8} {throughput:>9.1f} {throughput / baseline:>9.2f}x "
+                    f"{errors:>7} {api_calls:>10}"
+                )
+
+    def run_level(self, workers, sessions, admin_chat_id, api_latency):
+        """Запускает воркеров, ждёт готовности и меряет время от первого апдейта до последнего обработанного"""
+        from bot.workers import WorkerPool
+
+        results = multiprocessing.get_context('spawn').Queue()
+        pool = WorkerPool(workers, bench={
+            'database': connection.settings_dict['NAME'],
+            'settings': {'ADMIN_GROUP_ID': str(admin_chat_id), 'BOT_THROTTLE_ENABLED': False},
+            'api_latency': api_latency,
+            'results': results,
+        })
+        pool.start()
+        for _ in range(workers):
+            results.get()  # ('ready', index)
+
+        started = time.time()
+        for session in sessions:
+            for update in session:
+                pool.dispatch(update)
+        pool.drain(timeout=600)
+
+        reports = [results.get() for _ in range(workers)]
+        updates = sum(report[2] for report in reports)
+        errors = sum(report[3] for report in reports)
+        api_calls = sum(report[4] for report in reports)
+        finished = max(report[5] for report in reports)
+        return updates, finished - started, errors, api_calls
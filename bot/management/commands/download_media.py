@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Скачивает из Telegram фото выполнений, которые ещё не сохранены в хранилище '
+        '(например, отправленные до загрузчика или пока бот был выключен)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.MEDIA_DOWNLOAD_CONCURRENCY,
+                            help='Сколько файлов качать одновременно')
+        parser.add_argument('--watch', action='store_true',
+                            help='Не выходить, а следить за очередью (если в боте MEDIA_DOWNLOAD_ENABLED=False)')
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            raise CommandError('TELEGRAM_BOT_TOKEN не найден в настройках')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть положительным')
+
+        started = time.perf_counter()
+        stats = asyncio.run(self.download(options['concurrency'], options['watch']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Скачано {stats['downloaded']} фото ({stats['bytes'] / 1024 / 1024:.1f} МБ, "
+            f"новых файлов {stats['written']}, совпали с сохранёнными {stats['deduplicated']}), "
+            f"ошибок {stats['failed']} — {time.perf_counter() - started:.1f} с"
+        ))
+
+    async def download(self, concurrency, watch):
+        # aiogram нужен только здесь
+        from bot.app import create_bot
+        from bot.media import MediaDownloader
+
+        bot = create_bot()
+        downloader = MediaDownloader(bot, concurrency=concurrency)
+        try:
+            await downloader.run(once=not watch)
+        finally:
+            await bot.session.close()
+        return downloader.stats
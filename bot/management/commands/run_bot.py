@@ -1,13 +1,15 @@
 import asyncio
-import os
-from django.core.management.base import BaseCommand
-from bot.bot import start_bot
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 
 class Command(BaseCommand):
     help = 'Запускает Telegram бота'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.BOT_WORKERS,
+                            help='Сколько процессов-обработчиков запустить (апдейты делятся по чатам)')
+
     def handle(self, *args, **options):
         # Проверяем наличие токена
         if not settings.TELEGRAM_BOT_TOKEN:
@@ -16,12 +18,19 @@ class Command(BaseCommand):
             )
             return
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Запускаю Telegram бота с токеном: {settings.TELEGRAM_BOT_TOKEN}')
-        )
-        
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers должен быть не меньше 1')
+        self.stdout.write(self.style.SUCCESS(
+            'Запускаю Telegram бота' + (f' ({workers} процессов-обработчиков)' if workers > 1 else '')
+        ))
+
+        # Бот импортируем только здесь: остальным командам aiogram не нужен
+        from bot.app import start_bot
+        from bot.workers import run_supervisor
+
         try:
-            asyncio.run(start_bot())
+            asyncio.run(run_supervisor(workers) if workers > 1 else start_bot())
         except Exception as e:
             self.stderr.write(
                 self.style.ERROR(f'Ошибка при запуске бота: {str(e)}')
@@ -0,0 +1,119 @@
+"""
+Фоновая загрузка фото выполнений из Telegram в хранилище (см. core.media).
+
+MediaDownloader раз в MEDIA_DOWNLOAD_INTERVAL секунд забирает из базы
+очередь нескачанных фото и раздаёт её MEDIA_DOWNLOAD_CONCURRENCY
+корутинам: одновременно скачивается не больше стольких файлов, а очередь
+между сканированием и загрузкой ограничена, так что база не читается впрок.
+Файл идёт через getFile и поток кусками по MEDIA_DOWNLOAD_CHUNK_SIZE байт
+прямо во временный файл.
+
+Загрузчик работает в том же процессе, что и polling (start_bot или
+supervisor при --workers), либо отдельно командой download_media.
+Адрес Bot API берётся у сессии бота, поэтому для замеров и проверок
+достаточно TELEGRAM_API_SERVER с локальным фейковым сервером
+(bot.loadtest.FakeFileServer).
+"""
+import asyncio
+import logging
+from collections import Counter
+
+from aiohttp import ClientResponseError
+from django.conf import settings
+
+from core.media import IncomingMedia, MediaError, attach_media, pending_downloads, record_failure
+from .metrics import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class MediaDownloader:
+    def __init__(self, bot, concurrency=None, chunk_size=None, interval=None, storage=None):
+        self.bot = bot
+        self.concurrency = concurrency or settings.MEDIA_DOWNLOAD_CONCURRENCY
+        self.chunk_size = chunk_size or settings.MEDIA_DOWNLOAD_CHUNK_SIZE
+        self.interval = settings.MEDIA_DOWNLOAD_INTERVAL if interval is None else interval
+        self.storage = storage
+        self.batch_size = self.concurrency * 4
+        self.stats = Counter()
+        self._in_flight = set()
+
+    async def run(self, once=False):
+        """
+        Скачивает очередь; без once работает, пока задачу не отменят.
+        С once возвращается, когда очередь пуста (неудачные попытки повторяются
+        до MEDIA_DOWNLOAD_MAX_ATTEMPTS).
+        """
+        queue = asyncio.Queue(maxsize=self.concurrency)
+        workers = [asyncio.create_task(self._work(queue)) for _ in range(self.concurrency)]
+        try:
+            while True:
+                try:
+                    batch = await sync_to_async(pending_downloads)(self.batch_size, frozenset(self._in_flight))
+                except Exception as e:
+                    if once:
+                        raise
+                    logger.error(f"Не удалось прочитать очередь фото: {e}")
+                    await asyncio.sleep(self.interval)
+                    continue
+                for item in batch:
+                    self._in_flight.add(item[0])
+                    await queue.put(item)
+                if once:
+                    await queue.join()
+                    if not batch:
+                        return self.stats
+                elif len(batch) < self.batch_size:
+                    await asyncio.sleep(self.interval)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _work(self, queue):
+        while True:
+            progress_id, file_id = await queue.get()
+            try:
+                written = await self.download(progress_id, file_id)
+                self.stats['downloaded'] += 1
+                self.stats['written' if written else 'deduplicated'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.warning(f"Не удалось скачать фото выполнения {progress_id}: {self.describe_error(e)}")
+                await sync_to_async(record_failure)(progress_id)
+            finally:
+                self._in_flight.discard(progress_id)
+                queue.task_done()
+
+    def describe_error(self, error):
+        """
+        Текст ошибки для лога без токена: адрес файла в Bot API —
+        .../file/bot<токен>/..., а aiohttp кладёт его в текст ClientResponseError
+        """
+        if isinstance(error, ClientResponseError):
+            return f"HTTP {error.status}"
+        return f"{type(error).__name__}: {error}".replace(self.bot.token, '<token>')
+
+    async def download(self, progress_id, file_id):
+        """Скачивает фото и привязывает к выполнению; True — файл записан, False — такой уже был"""
+        file = await self.bot.get_file(file_id)
+        if file.file_size and file.file_size > settings.MEDIA_MAX_BYTES:
+            raise MediaError(f'Файл {file.file_size} байт больше MEDIA_MAX_BYTES')
+        url = self.bot.session.api.file_url(self.bot.token, file.file_path)
+        with IncomingMedia(file.file_path) as media:
+            async for chunk in self.bot.session.stream_content(url, chunk_size=self.chunk_size):
+                media.write(chunk)
+            name, written = await sync_to_async(media.save)(self.storage)
+        await sync_to_async(attach_media)(progress_id, name)
+        self.stats['bytes'] += media.size
+        return written
+
+
+def start_media_downloader(bot):
+    """Фоновая задача загрузчика или None, если он выключен (MEDIA_DOWNLOAD_ENABLED)"""
+    if not settings.MEDIA_DOWNLOAD_ENABLED:
+        return None
+    logger.info("Загрузчик фото запущен")
+    return asyncio.create_task(MediaDownloader(bot).run())
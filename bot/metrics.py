@@ -0,0 +1,252 @@
+"""
+Метрики обработчиков бота.
+
+Для каждого апдейта считаем общее время обработки, время ожидания потока
+в sync_to_async, количество и длительность SQL-запросов. Значения копятся
+в гистограммах внутри процесса и отдаются в формате Prometheus по HTTP,
+при наличии SENTRY_DSN дублируются в Sentry как транзакции.
+"""
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from aiogram import BaseMiddleware
+from asgiref.sync import sync_to_async as asgiref_sync_to_async
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from .routing import handler_name
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class HandlerStats:
+    """Счётчики одного апдейта; живут в contextvar и видны из потоков sync_to_async"""
+    __slots__ = ('handler', 'queries', 'db_time', 'hop_time')
+
+    def __init__(self):
+        self.handler = 'unhandled'
+        self.queries = 0
+        self.db_time = 0.0
+        self.hop_time = 0.0
+
+
+_current_stats: ContextVar = ContextVar('bot_handler_stats', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы по (метрика, обработчик). Пишет event loop, читает HTTP-поток."""
+
+    METRICS = {
+        'bot_handler_duration_seconds': ('Время обработки апдейта', LATENCY_BUCKETS),
+        'bot_handler_sync_hop_seconds': ('Ожидание потока в sync_to_async', LATENCY_BUCKETS),
+        'bot_handler_db_queries': ('Количество SQL-запросов на апдейт', QUERY_COUNT_BUCKETS),
+        'bot_handler_db_seconds': ('Суммарное время SQL-запросов на апдейт', LATENCY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, handler, value):
+        with self._lock:
+            histogram = self._histograms.get((metric, handler))
+            if histogram is None:
+                histogram = Histogram(self.METRICS[metric][1])
+                self._histograms[(metric, handler)] = histogram
+            histogram.observe(value)
+
+    def record(self, duration, stats):
+        self.observe('bot_handler_duration_seconds', stats.handler, duration)
+        self.observe('bot_handler_sync_hop_seconds', stats.handler, stats.hop_time)
+        self.observe('bot_handler_db_queries', stats.handler, stats.queries)
+        self.observe('bot_handler_db_seconds', stats.handler, stats.db_time)
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines = []
+            for metric, (help_text, _) in self.METRICS.items():
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (name, handler), histogram in items:
+                    if name != metric:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{handler="{handler}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{handler="{handler}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{handler="{handler}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{handler="{handler}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    """Подключение к БД создаётся в своём потоке — вешаем на него счётчик запросов"""
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def sync_to_async(func=None, *, thread_sensitive=True):
+    """
+    asgiref.sync_to_async, который дополнительно учитывает время
+    от вызова до начала выполнения функции в потоке.
+    """
+    if func is None:
+        return lambda f: sync_to_async(f, thread_sensitive=thread_sensitive)
+
+    def run(queued_at, *args, **kwargs):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.hop_time += time.perf_counter() - queued_at
+        return func(*args, **kwargs)
+
+    run_async = asgiref_sync_to_async(run, thread_sensitive=thread_sensitive)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_async(time.perf_counter(), *args, **kwargs)
+
+    return wrapper
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: меряет апдейт целиком,
+    включая проверку фильтров всех обработчиков.
+    """
+
+    async def __call__(self, handler, event, data):
+        stats = HandlerStats()
+        token = _current_stats.set(stats)
+        transaction = _start_sentry_transaction()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.perf_counter() - start
+            _current_stats.reset(token)
+            registry.record(duration, stats)
+            if transaction is not None:
+                _finish_sentry_transaction(transaction, stats)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Внутренний middleware: подписывает метрики именем сработавшего обработчика"""
+
+    async def __call__(self, handler, event, data):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.handler = handler_name(data)
+        return await handler(event, data)
+
+
+def setup_metrics(dp):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerLabelMiddleware())
+    dp.callback_query.middleware(HandlerLabelMiddleware())
+    dp.inline_query.middleware(HandlerLabelMiddleware())
+    connection_created.connect(_install_query_wrapper, dispatch_uid='bot_metrics_query_wrapper')
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None, host='127.0.0.1'):
+    """Поднимает /metrics в фоновом потоке. Порт 0 или не задан — экспорт выключен."""
+    port = settings.BOT_METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name='bot-metrics', daemon=True).start()
+    logger.info(f"Метрики бота доступны на http://{host}:{port}/metrics")
+    return server
+
+
+_sentry_enabled = False
+
+
+def init_sentry():
+    """Включает отправку транзакций в Sentry, если задан SENTRY_DSN и установлен sentry-sdk"""
+    global _sentry_enabled
+    if not settings.SENTRY_DSN:
+        return
+    try:
+        import sentry_sdk
+    except ImportError:
+        logger.warning("SENTRY_DSN задан, но sentry-sdk не установлен")
+        return
+    sentry_sdk.init(
+        dsn=settings.SENTRY_DSN,
+        traces_sample_rate=settings.SENTRY_TRACES_SAMPLE_RATE,
+    )
+    _sentry_enabled = True
+
+
+def _start_sentry_transaction():
+    if not _sentry_enabled:
+        return None
+    import sentry_sdk
+    transaction = sentry_sdk.start_transaction(op='bot.update', name='update')
+    transaction.__enter__()
+    return transaction
+
+
+def _finish_sentry_transaction(transaction, stats):
+    transaction.name = stats.handler
+    transaction.set_measurement('db_queries', stats.queries)
+    transaction.set_measurement('db_time', stats.db_time * 1000, 'millisecond')
+    transaction.set_measurement('sync_hop_time', stats.hop_time * 1000, 'millisecond')
+    transaction.__exit__(None, None, None)
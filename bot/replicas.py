@@ -0,0 +1,28 @@
+"""
+Чтение с реплики в обработчиках бота (см. core.replicas).
+"""
+from aiogram import BaseMiddleware
+from django.conf import settings
+
+from core.replicas import bot_actor, db_scope
+from .routing import handler_name
+
+
+class ReplicaMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: обработчик выполняется от имени пользователя Telegram,
+    обработчики из BOT_REPLICA_HANDLERS читают с реплики, пока пользователь
+    недавно ничего не записал.
+    """
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        actor = bot_actor(user.id) if user is not None else None
+        with db_scope(actor, read_only=handler_name(data) in settings.BOT_REPLICA_HANDLERS):
+            return await handler(event, data)
+
+
+def setup_replicas(dp):
+    dp.message.middleware(ReplicaMiddleware())
+    dp.callback_query.middleware(ReplicaMiddleware())
+    dp.inline_query.middleware(ReplicaMiddleware())
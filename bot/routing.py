@@ -0,0 +1,60 @@
+"""
+Маршрутизация сообщений по точному тексту кнопки или команде.
+
+Вместо цепочки фильтров вида lambda message: message.text == "..." все
+кнопки и команды лежат в словарях TextDispatcher, и апдейт находит свой
+обработчик одним поиском в dict. В роутере это выглядит как один обработчик
+с одним фильтром, сколько бы кнопок ни было.
+"""
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import CommandObject
+
+
+class TextDispatcher:
+    def __init__(self, name='text_dispatch'):
+        self._texts = {}
+        self._commands = {}
+        self.router = Router(name=name)
+        self.router.message.register(self._handle, self._match)
+
+    def text(self, text, callback):
+        """Обработчик нажатия кнопки с точным текстом"""
+        self._texts[text] = CallableObject(callback)
+
+    def command(self, name, callback):
+        """Обработчик команды /name; получает command: CommandObject, как с фильтром Command"""
+        self._commands[name] = CallableObject(callback)
+
+    async def _match(self, message, bot):
+        text = message.text
+        if not text:
+            return False
+
+        route = self._texts.get(text)
+        if route is not None:
+            return {'text_route': route}
+
+        if text[0] != '/' or not self._commands:
+            return False
+        head, _, args = text.partition(' ')
+        name, _, mention = head[1:].partition('@')
+        route = self._commands.get(name)
+        if route is None:
+            return False
+        if mention and mention.lower() != (await bot.me()).username.lower():
+            return False
+        command = CommandObject(prefix='/', command=name, mention=mention or None, args=args.strip() or None)
+        return {'text_route': route, 'command': command}
+
+    async def _handle(self, message, text_route, **kwargs):
+        return await text_route.call(message, **kwargs)
+
+
+def handler_name(data):
+    """Имя обработчика, которым будет обработан апдейт (для метрик и лимитов)"""
+    route = data.get('text_route')
+    if route is not None:
+        return route.callback.__name__
+    handler_object = data.get('handler')
+    return handler_object.callback.__name__ if handler_object is not None else 'default'
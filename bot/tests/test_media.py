@@ -0,0 +1,130 @@
+"""Загрузчик фото выполнений (bot.media) против локального фейкового Bot API"""
+import asyncio
+import hashlib
+import logging
+import os
+
+import pytest
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from django.core.files.storage import FileSystemStorage
+
+from bot.app import create_bot
+from bot.loadtest import BENCH_BOT_TOKEN, FakeFileServer
+from bot.media import MediaDownloader
+from core.media import IncomingMedia, pending_downloads
+from core.models import Quest, User, UserQuestProgress
+
+# загрузчик ходит в базу из потока sync_to_async, поэтому нужны настоящие коммиты
+pytestmark = pytest.mark.django_db(transaction=True)
+
+SIZE = 300 * 1024
+CHUNK_SIZE = 16 * 1024
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return FileSystemStorage(location=tmp_path)
+
+
+@pytest.fixture
+def quest():
+    return Quest.objects.create(name='Квест', description='Сфотографируйте', location='Чебоксары')
+
+
+def submit(quest, *file_ids):
+    users = User.objects.bulk_create(
+        User(telegram_id=1000 + i, name=f'User {i}') for i in range(len(file_ids))
+    )
+    return UserQuestProgress.objects.bulk_create(
+        UserQuestProgress(user=user, quest=quest, telegram_file_id=file_id)
+        for user, file_id in zip(users, file_ids)
+    )
+
+
+def download(storage, expired=(), **options):
+    async def run():
+        server = await FakeFileServer().start()
+        server.expired.update(expired)
+        bot = create_bot(BENCH_BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(server.url)))
+        try:
+            downloader = MediaDownloader(bot, interval=0, storage=storage, **options)
+            await downloader.run(once=True)
+            return downloader.stats
+        finally:
+            await bot.session.close()
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def stored_files(storage):
+    return [os.path.join(root, name) for root, _, files in os.walk(storage.location) for name in files]
+
+
+def test_download_streams_chunks_to_temporary_file(storage, quest, monkeypatch):
+    chunks = []
+    write = IncomingMedia.write
+
+    def spy(self, chunk):
+        chunks.append((len(chunk), os.path.exists(self.file.temporary_file_path())))
+        write(self, chunk)
+
+    monkeypatch.setattr(IncomingMedia, 'write', spy)
+    progress, = submit(quest, FakeFileServer.file_id('a1', SIZE, 0))
+
+    stats = download(storage, chunk_size=CHUNK_SIZE)
+
+    assert stats['downloaded'] == 1 and stats['bytes'] == SIZE
+    assert sum(size for size, _ in chunks) == SIZE
+    assert len(chunks) >= SIZE // CHUNK_SIZE
+    assert all(size <= CHUNK_SIZE and on_disk for size, on_disk in chunks)
+    progress.refresh_from_db()
+    with storage.open(progress.photo.name) as f:
+        content = f.read()
+    assert len(content) == SIZE
+    assert hashlib.sha256(content).hexdigest() in progress.photo.name
+
+
+def test_identical_photos_are_stored_once(storage, quest):
+    submit(
+        quest,
+        FakeFileServer.file_id('same', SIZE, 0),
+        FakeFileServer.file_id('same', SIZE, 1),
+        FakeFileServer.file_id('other', SIZE, 2),
+    )
+
+    stats = download(storage, concurrency=3)
+
+    assert stats['written'] == 2 and stats['deduplicated'] == 1
+    assert len(stored_files(storage)) == 2
+    photos = list(UserQuestProgress.objects.order_by('telegram_file_id').values_list('photo', flat=True))
+    assert photos[0] != photos[1] == photos[2]  # other, same, same
+    assert not pending_downloads(10)
+
+
+def test_failed_download_leaves_queue_after_max_attempts(storage, quest, settings):
+    settings.MEDIA_DOWNLOAD_MAX_ATTEMPTS = 3
+    broken, good = submit(quest, 'not-a-telegram-file', FakeFileServer.file_id('b2', SIZE, 0))
+
+    stats = download(storage)
+
+    assert stats['failed'] == 3 and stats['downloaded'] == 1
+    broken.refresh_from_db()
+    assert broken.media_attempts == 3 and broken.photo == ''
+    good.refresh_from_db()
+    assert good.media_attempts == 0 and good.photo
+    assert not pending_downloads(10)
+
+
+def test_failure_log_does_not_contain_bot_token(storage, quest, settings, caplog):
+    settings.MEDIA_DOWNLOAD_MAX_ATTEMPTS = 1
+    progress, = submit(quest, FakeFileServer.file_id('gone', SIZE, 0))
+
+    with caplog.at_level(logging.WARNING, logger='bot.media'):
+        stats = download(storage, expired={'gone'})
+
+    assert stats['failed'] == 1
+    assert 'HTTP 404' in caplog.text and str(progress.pk) in caplog.text
+    assert BENCH_BOT_TOKEN not in caplog.text
+    assert BENCH_BOT_TOKEN.split(':')[1] not in caplog.text
@@ -0,0 +1,168 @@
+"""
+Защита от флуда.
+
+ThrottlingMiddleware ограничивает частоту вызова обработчиков маркерной
+корзиной (token bucket) на пользователя и общей корзиной на весь бот.
+Лимиты задаются по имени обработчика в BOT_THROTTLE_RATES. На активного
+пользователя хранится одна маленькая корзина на обработчик, простаивающие
+корзины вытесняются при следующих обращениях.
+
+MediaGroupMiddleware склеивает альбом в одно сообщение: дальше по цепочке
+проходит только первое фото альбома, так что альбом даёт одну заявку.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+from django.conf import settings
+
+from .routing import handler_name
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'warned')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.warned = False
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.warned = False
+            return True
+        return False
+
+    def reserve(self, now, max_wait):
+        """
+        Занимает маркер в долг и возвращает, сколько секунд ждать до него.
+        Если ждать дольше max_wait — маркер не занимается, возвращается None.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait > max_wait:
+            self.tokens += 1
+            return None
+        return wait
+
+
+class BucketStore:
+    """
+    Корзины по ключу в порядке последнего обращения. Каждое обращение
+    переносит корзину в конец, а из начала вытесняются простаивающие дольше
+    idle_ttl — так память пропорциональна числу активных пользователей.
+    """
+
+    def __init__(self, idle_ttl, max_entries):
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+
+    def get(self, key, rate, capacity, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity, now)
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        return bucket
+
+    def _evict(self, now):
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < self.idle_ttl and len(self._buckets) <= self.max_entries:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware на dp.message и dp.callback_query. Превышение личного лимита —
+    апдейт отбрасывается (пользователь один раз получает предупреждение),
+    превышение общего — апдейт ждёт маркер не дольше BOT_THROTTLE_GLOBAL_MAX_WAIT.
+    """
+
+    def __init__(self, rates=None, global_rate=None, idle_ttl=None, max_entries=None):
+        self.rates = rates or settings.BOT_THROTTLE_RATES
+        rate, capacity = global_rate or settings.BOT_THROTTLE_GLOBAL_RATE
+        self.global_bucket = TokenBucket(rate, capacity, time.monotonic())
+        self.buckets = BucketStore(
+            idle_ttl or settings.BOT_THROTTLE_IDLE_TTL,
+            max_entries or settings.BOT_THROTTLE_MAX_USERS,
+        )
+
+    async def __call__(self, handler, event, data):
+        if not settings.BOT_THROTTLE_ENABLED:
+            return await handler(event, data)
+
+        name = handler_name(data)
+        rate, capacity = self.rates.get(name, self.rates['default'])
+        now = time.monotonic()
+
+        if event.from_user is not None:
+            bucket = self.buckets.get((event.from_user.id, name), rate, capacity, now)
+            if not bucket.consume(now):
+                if not bucket.warned:
+                    bucket.warned = True
+                    await event.answer("⏳ Слишком много сообщений. Подождите немного и попробуйте снова.")
+                logger.info(f"Флуд от {event.from_user.id} в {name}: апдейт отброшен")
+                return None
+
+        wait = self.global_bucket.reserve(now, settings.BOT_THROTTLE_GLOBAL_MAX_WAIT)
+        if wait is None:
+            logger.warning(f"Общий лимит бота превышен, апдейт для {name} отброшен")
+            return None
+        if wait:
+            await asyncio.sleep(wait)
+        return await handler(event, data)
+
+
+class MediaGroupMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.message: пропускает только первое сообщение альбома"""
+
+    def __init__(self, ttl=60.0, max_groups=10_000):
+        self.ttl = ttl
+        self.max_groups = max_groups
+        self._seen = OrderedDict()
+
+    async def __call__(self, handler, event, data):
+        group_id = event.media_group_id
+        if group_id is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl and len(self._seen) < self.max_groups:
+                break
+            del self._seen[oldest]
+
+        if group_id in self._seen:
+            return None
+        self._seen[group_id] = now
+        return await handler(event, data)
+
+
+def setup_throttling(dp):
+    dp.message.outer_middleware(MediaGroupMiddleware())
+    # один экземпляр на оба типа апдейтов: общая корзина бота и корзины пользователей не делятся пополам
+    throttling = ThrottlingMiddleware()
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
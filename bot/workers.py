@@ -0,0 +1,255 @@
+"""
+Несколько процессов-обработчиков бота (run_bot --workers N).
+
+Апдейты из getUpdates забирает один процесс — supervisor — и раскладывает их
+по воркерам по номеру чата: все апдейты одного чата всегда попадают в один
+и тот же процесс и обрабатываются там строго по очереди. Поэтому FSM в памяти
+воркера, защита от повторной доставки и личные лимиты работают так же, как
+в одном процессе, а обработчики разных чатов выполняются на всех ядрах.
+
+Остановка (SIGINT/SIGTERM): supervisor перестаёт забирать апдейты,
+подтверждает offset, кладёт каждому воркеру маркер конца очереди и ждёт,
+пока воркеры доделают уже принятые апдейты (не дольше BOT_WORKER_DRAIN_TIMEOUT).
+Неподтверждённые апдейты Telegram доставит заново при следующем запуске.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import signal
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+POLLING_TIMEOUT = 10
+
+
+def shard_key(update):
+    """Чат апдейта, а для апдейтов без чата (inline-запросы) — пользователь"""
+    from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+
+    chat, user, _ = UserContextMiddleware.resolve_event_context(update)
+    if chat is not None:
+        return chat.id
+    if user is not None:
+        # личный чат пользователя имеет тот же id — inline-запросы попадут к его FSM
+        return user.id
+    return update.update_id
+
+
+def shard_for(key, workers):
+    return key % workers
+
+
+class ChatSequencer:
+    """Апдейты одного чата выполняются по очереди, разных чатов — параллельно"""
+
+    def __init__(self):
+        self._tails = {}
+
+    def submit(self, key, run):
+        task = asyncio.create_task(self._run(key, self._tails.get(key), run))
+        self._tails[key] = task
+        return task
+
+    async def _run(self, key, previous, run):
+        if previous is not None:
+            # ошибка предыдущего апдейта не должна останавливать очередь чата
+            await asyncio.wait([previous])
+        try:
+            return await run()
+        finally:
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+
+    def __len__(self):
+        return len(self._tails)
+
+
+# --- воркер ---
+
+def worker_main(index, workers, queue, bench=None):
+    """
+    Точка входа процесса-воркера. bench — служебный режим bench_workers:
+    {'database': имя базы, 'settings': {имя: значение}, 'api_latency': секунды,
+    'results': очередь отчётов}.
+    """
+    import django
+
+    # Ctrl+C приходит всей группе процессов, а останавливает воркеров supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+    logging.basicConfig(level=logging.INFO if bench is None else logging.ERROR)
+    if bench is not None:
+        settings.DATABASES['default']['NAME'] = bench['database']
+        for name, value in bench['settings'].items():
+            setattr(settings, name, value)
+    # общий лимит бота делится между воркерами
+    rate, capacity = settings.BOT_THROTTLE_GLOBAL_RATE
+    settings.BOT_THROTTLE_GLOBAL_RATE = (rate / workers, max(1, capacity // workers))
+    asyncio.run(_serve(index, workers, queue, bench))
+
+
+async def _serve(index, workers, queue, bench):
+    from core.quest_cache import quest_cache
+    from core.search import quest_index
+    from .app import create_bot, create_dispatcher
+    from .metrics import init_sentry, start_metrics_server, sync_to_async
+
+    dp = create_dispatcher()
+    await sync_to_async(quest_cache.warm)()
+    await sync_to_async(quest_index.warm)()
+    if bench is None:
+        bot = create_bot()
+        init_sentry()
+        if settings.BOT_METRICS_PORT:
+            start_metrics_server(settings.BOT_METRICS_PORT + index)
+    else:
+        from .loadtest import create_fake_bot
+        bot = create_fake_bot(bench['api_latency'])
+        bench['results'].put(('ready', index))
+
+    sequencer = ChatSequencer()
+    in_flight = set()
+    stats = Counter()
+    loop = asyncio.get_running_loop()
+    logger.info(f"Воркер {index + 1}/{workers} запущен")
+    while True:
+        raw = await loop.run_in_executor(None, queue.get)
+        if raw is None:
+            break
+        task = sequencer.submit(raw['key'], functools.partial(_process, dp, bot, raw['update'], stats))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        logger.info(f"Воркер {index + 1}: дорабатываем {len(in_flight)} апдейтов")
+        await asyncio.wait(in_flight)
+    if bench is not None:
+        bench['results'].put(('done', index, stats['updates'], stats['errors'],
+                              sum(bot.session.calls.values()), time.time()))
+    await bot.session.close()
+    logger.info(f"Воркер {index + 1}/{workers} остановлен")
+
+
+async def _process(dp, bot, update, stats):
+    stats['updates'] += 1
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception:
+        stats['errors'] += 1
+        logger.exception("Ошибка при обработке апдейта")
+
+
+# --- supervisor ---
+
+class WorkerPool:
+    """Процессы-воркеры и их очереди; процессы запускаются через spawn"""
+
+    def __init__(self, workers, bench=None):
+        self.workers = workers
+        self.bench = bench
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue() for _ in range(workers)]
+        self.processes = [None] * workers
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.workers, self.queues[index], self.bench),
+            name=f'bot-worker-{index + 1}',
+        )
+        process.start()
+        self.processes[index] = process
+
+    def revive(self):
+        """Перезапускает упавших воркеров; их очередь с непрочитанными апдейтами сохраняется"""
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.error(f"Воркер {index + 1} завершился с кодом {process.exitcode}, перезапускаем")
+                self._spawn(index)
+
+    def dispatch(self, update):
+        key = shard_key(update)
+        self.queues[shard_for(key, self.workers)].put({
+            'key': key,
+            'update': update.model_dump(mode='json', exclude_unset=True),
+        })
+
+    def drain(self, timeout):
+        """Маркер конца очереди каждому воркеру и ожидание, пока они доработают"""
+        for queue in self.queues:
+            queue.put(None)
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"Воркер {index + 1} не успел доработать за {timeout} с, останавливаем")
+                process.terminate()
+                process.join()
+
+
+async def run_supervisor(workers):
+    from aiogram.utils.backoff import Backoff, BackoffConfig
+
+    from .app import create_bot, create_dispatcher
+    from .media import start_media_downloader
+
+    logging.basicConfig(level=logging.INFO)
+    bot = create_bot()
+    # диспетчер supervisor'у нужен только чтобы узнать, какие типы апдейтов запрашивать
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    pool = WorkerPool(workers)
+    pool.start()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    backoff = Backoff(config=BackoffConfig(min_delay=1.0, max_delay=30.0, factor=1.5, jitter=0.1))
+    offset = None
+    logger.info(f"Запущено воркеров: {workers}")
+    # фото качает только supervisor: воркеры заняты апдейтами, а общая очередь — в базе
+    downloader = start_media_downloader(bot)
+    try:
+        while not stopping.is_set():
+            pool.revive()
+            request = asyncio.ensure_future(bot.get_updates(
+                offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates,
+            ))
+            stop = asyncio.ensure_future(stopping.wait())
+            await asyncio.wait([request, stop], return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if not request.done():
+                # апдейты из прерванного запроса не подтверждены — Telegram их не потеряет
+                request.cancel()
+                break
+            try:
+                updates = request.result()
+            except Exception as e:
+                logger.error(f"Ошибка getUpdates: {e}")
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                pool.dispatch(update)
+                offset = update.update_id + 1
+    finally:
+        logger.info("Останавливаем воркеров")
+        if downloader is not None:
+            downloader.cancel()
+        if offset is not None:
+            try:
+                await bot.get_updates(offset=offset, timeout=0, limit=1)
+            except Exception as e:
+                logger.error(f"Не удалось подтвердить offset {offset}: {e}")
+        await bot.session.close()
+        await loop.run_in_executor(None, pool.drain, settings.BOT_WORKER_DRAIN_TIMEOUT)
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import User, Quest, PromoCode, UserQuestProgress
+from .models import (
+    User, Quest, PromoCode, PromoCodeStock, ProgressTransition, QuestRollup, UserQuestProgress, ArchivedProgress,
+)
+from .scheduling import schedule_quests
 
 
 @admin.register(User)
@@ -11,9 +14,18 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(Quest)
 class QuestAdmin(admin.ModelAdmin):
-    list_display = ('name', 'location', 'is_active', 'created_at')
+    list_display = ('name', 'location', 'is_active', 'active_from', 'active_until', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description', 'location')
+    actions = ('activate', 'deactivate')
+
+    @admin.action(description="Включить выбранные квесты")
+    def activate(self, request, queryset):
+        schedule_quests(queryset.values_list('pk', flat=True), is_active=True)
+
+    @admin.action(description="Выключить выбранные квесты")
+    def deactivate(self, request, queryset):
+        schedule_quests(queryset.values_list('pk', flat=True), is_active=False)
 
 
 @admin.register(PromoCode)
@@ -23,9 +35,40 @@ class PromoCodeAdmin(admin.ModelAdmin):
     search_fields = ('code',)
 
 
+@admin.register(PromoCodeStock)
+class PromoCodeStockAdmin(admin.ModelAdmin):
+    list_display = ('quest', 'available', 'updated_at')
+    ordering = ('available',)
+    readonly_fields = ('quest', 'available', 'updated_at')
+
+
+@admin.register(QuestRollup)
+class QuestRollupAdmin(admin.ModelAdmin):
+    list_display = ('quest', 'period', 'bucket_start', 'submissions', 'approvals', 'rejections')
+    list_filter = ('period', 'bucket_start')
+    raw_id_fields = ('quest',)
+
+
 @admin.register(UserQuestProgress)
 class UserQuestProgressAdmin(admin.ModelAdmin):
-    list_display = ('user', 'quest', 'status', 'completed_at')
-    list_filter = ('status', 'completed_at')
-    search_fields = ('user__name', 'quest__name', 'admin_comment')
-    raw_id_fields = ('user', 'quest', 'promo_code') 
\ No newline at end of file
+    list_display = ('user', 'quest', 'attempt', 'status', 'completed_at', 'reviewed_at', 'reviewer')
+    list_filter = ('status', 'completed_at', 'reviewed_at')
+    search_fields = ('user__name', 'quest__name', 'admin_comment', 'reviewer')
+    raw_id_fields = ('user', 'quest', 'promo_code')
+    readonly_fields = ('status_changed_at', 'reviewed_at', 'telegram_file_id', 'media_attempts')
+
+
+@admin.register(ProgressTransition)
+class ProgressTransitionAdmin(admin.ModelAdmin):
+    list_display = ('progress', 'from_status', 'to_status', 'actor', 'changed_at')
+    list_filter = ('to_status', 'changed_at')
+    search_fields = ('actor',)
+    raw_id_fields = ('progress',)
+
+
+@admin.register(ArchivedProgress)
+class ArchivedProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'quest', 'status', 'attempt', 'promo_code', 'finished_at')
+    list_filter = ('status', 'finished_at')
+    search_fields = ('user__name', 'quest__name', 'promo_code')
+    raw_id_fields = ('user', 'quest') 
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Архивация завершённых выполнений квестов.
+
+UserQuestProgress и выданные промокоды растут без ограничений, а по ним
+работают проверка доступности квестов, очередь модерации и поиск в админке.
+Подтверждённые и отклонённые записи, решение по которым старше
+PROGRESS_ARCHIVE_AFTER_DAYS, переносятся в компактную таблицу
+ArchivedProgress: выданный код копируется туда текстом, строка PromoCode
+удаляется, журнал переходов удаляется вместе с записью (агрегаты по ним
+уже лежат в QuestRollup). Фото переносится вместе с записью; запись, фото
+которой загрузчик ещё не скачал (core.media), ждёт загрузки или исчерпания
+попыток — иначе фото выпало бы из очереди.
+
+Перенос идёт пачками по PROGRESS_ARCHIVE_BATCH_SIZE записей. Каждая пачка —
+своя короткая транзакция, которая начинается с записи (в SQLite такая
+транзакция не падает из-за бота, пишущего из другого процесса); между
+пачками — пауза PROGRESS_ARCHIVE_PAUSE, чтобы живой трафик не ждал
+блокировку.
+
+Архив остаётся частью истории: доступность квестов, «Мои промокоды», номера
+попыток, проверка загружаемых кодов, пересчёт агрегатов (core.rollups.rebuild_window)
+и статистика пользователя (user_stats) учитывают обе таблицы.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import MEDIA_PENDING, ArchivedProgress, PromoCode, UserQuestProgress
+
+
+ARCHIVED_FIELDS = [
+    'user', 'quest', 'status', 'attempt', 'promo_code', 'completed_at', 'finished_at', 'photo', 'telegram_file_id',
+]
+
+
+def archive_cutoff(days=None):
+    days = settings.PROGRESS_ARCHIVE_AFTER_DAYS if days is None else days
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def archivable(cutoff):
+    """
+    Завершённые записи с решением раньше cutoff, кроме стоящих в очереди на
+    скачивание фото; читаются по частичному индексу progress_finished_idx
+    """
+    return (
+        UserQuestProgress.objects
+        .exclude(status=UserQuestProgress.Status.PENDING)
+        .exclude(MEDIA_PENDING, media_attempts__lt=settings.MEDIA_DOWNLOAD_MAX_ATTEMPTS)
+        .filter(status_changed_at__lt=cutoff)
+    )
+
+
+def archive_batch(cutoff, batch_size):
+    """Переносит в архив до batch_size самых старых записей, возвращает число перенесённых"""
+    candidates = list(
+        archivable(cutoff).order_by('status_changed_at').values_list('id', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return 0
+
+    with transaction.atomic():
+        # первой идёт запись: холостой UPDATE берёт блокировку (в SQLite — на всю базу,
+        # в PostgreSQL — на строки кандидатов), данные и сигналы он не трогает
+        UserQuestProgress.objects.filter(pk__in=candidates).update(status_changed_at=F('status_changed_at'))
+        # статус мог смениться после выборки — такие записи остаются до следующего запуска;
+        # переносятся и удаляются только перечитанные под блокировкой строки
+        rows = list(
+            archivable(cutoff).filter(pk__in=candidates).values_list(
+                'id', 'user_id', 'quest_id', 'status', 'attempt',
+                'promo_code_id', 'promo_code__code', 'completed_at', 'status_changed_at',
+                'photo', 'telegram_file_id',
+            )
+        )
+        if not rows:
+            return 0
+        archived = [
+            ArchivedProgress(
+                id=progress_id, user_id=user_id, quest_id=quest_id, status=status, attempt=attempt,
+                promo_code=code or '', completed_at=completed_at, finished_at=finished_at,
+                photo=photo, telegram_file_id=file_id,
+            )
+            for (
+                progress_id, user_id, quest_id, status, attempt, _, code, completed_at, finished_at, photo, file_id,
+            ) in rows
+        ]
+        # копия, оставшаяся от прерванного прошлого запуска, перезаписывается текущим состоянием
+        ArchivedProgress.objects.bulk_create(
+            archived,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=ARCHIVED_FIELDS,
+        )
+        UserQuestProgress.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        PromoCode.objects.filter(pk__in=[row[5] for row in rows if row[5]]).delete()
+    return len(rows)
+
+
+def archive_progress(cutoff, batch_size=None, pause=None, on_batch=None):
+    """
+    Переносит в архив все записи старше cutoff пачками с паузами.
+    on_batch(всего перенесено) вызывается после каждой пачки. Возвращает итог.
+    """
+    batch_size = batch_size or settings.PROGRESS_ARCHIVE_BATCH_SIZE
+    pause = settings.PROGRESS_ARCHIVE_PAUSE if pause is None else pause
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if on_batch is not None and moved:
+            on_batch(total)
+        if moved < batch_size:
+            return total
+        time.sleep(pause)
+
+
+def user_stats(user):
+    """Число выполнений пользователя по статусам — вместе с архивом"""
+    stats = dict.fromkeys(UserQuestProgress.Status.values, 0)
+    for source in (UserQuestProgress.objects, ArchivedProgress.objects):
+        counts = source.filter(user=user).values('status').annotate(count=Count('id')).values_list('status', 'count')
+        for status, count in counts:
+            stats[status] += count
+    stats['archived'] = ArchivedProgress.objects.filter(user=user).count()
+    return stats
@@ -0,0 +1,42 @@
+"""
+Общие помощники для бенчмарков: временная база и перцентили.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(journal_mode=None):
+    """
+    Создаёт временную базу с применёнными миграциями, рабочая база не трогается.
+    Для SQLite база создаётся файлом (а не в памяти), чтобы к ней могли
+    подключаться потоки sync_to_async; journal_mode задаёт режим журнала (wal, delete).
+    """
+    old_name = connection.settings_dict['NAME']
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='quest-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    if journal_mode and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+    try:
+        yield connection.vendor
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            connection.settings_dict['TEST']['NAME'] = None
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def percentile(sorted_values, q):
+    """Перцентиль q (0..100) по уже отсортированному списку, метод ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
@@ -0,0 +1,54 @@
+"""
+Поля моделей.
+
+CompactUUIDField — UUID, который в SQLite хранится 16 байтами (BLOB), а не
+32-символьной hex-строкой, как models.UUIDField. Первичные ключи и все
+внешние ключи на них (тип FK берётся у целевого поля) вдвое короче, индексы
+по ним меньше и быстрее. В Python, в API и в callback_data это тот же
+uuid.UUID / строка с дефисами. На PostgreSQL используется родной тип uuid,
+на остальных базах — то же хранение, что у UUIDField.
+
+Порядок BLOB совпадает с порядком hex-строк в нижнем регистре, поэтому
+сортировка и keyset-пагинация по id не меняются.
+"""
+import uuid
+
+from django.db import models
+
+
+class CompactUUIDField(models.UUIDField):
+    description = "UUID, в SQLite — 16 байт"
+
+    def get_internal_type(self):
+        # не 'UUIDField': штатный конвертер SQLite разбирает значение как hex-строку
+        return 'CompactUUIDField'
+
+    def db_type(self, connection):
+        if connection.vendor == 'sqlite':
+            return 'BLOB'
+        return connection.data_types['UUIDField']
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if connection.vendor == 'sqlite':
+            return self.to_python(value).bytes
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)) and len(value) == 16:
+            return uuid.UUID(bytes=bytes(value))
+        return super().to_python(value)
+
+
+def compact_uuid_columns(apps, app_label):
+    """(таблица, колонка) всех CompactUUIDField приложения и внешних ключей на них"""
+    for model in apps.get_app_config(app_label).get_models():
+        for field in model._meta.local_fields:
+            # ForeignKey и OneToOneField (PromoCodeStock.quest) хранят ключ в формате целевого поля
+            target = field.target_field if field.many_to_one or field.one_to_one else field
+            if isinstance(target, CompactUUIDField):
+                yield model._meta.db_table, field.column
@@ -0,0 +1,157 @@
+"""
+Учёт остатков промокодов.
+
+Количество свободных промокодов по каждому квесту хранится в PromoCodeStock
+и меняется в той же транзакции, что и выдача или загрузка кодов, поэтому
+узнать остаток можно одним чтением по первичному ключу, без COUNT(*).
+"""
+import json
+import logging
+import threading
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedProgress, PromoCode, PromoCodeStock
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def recount_stock(quest_id):
+    """Пересчитывает остаток по квесту из таблицы промокодов"""
+    available = PromoCode.objects.filter(quest_id=quest_id, is_used=False).count()
+    PromoCodeStock.objects.filter(quest_id=quest_id).update(
+        available=available,
+        updated_at=timezone.now(),
+    )
+    return available
+
+
+def allocate_promo_code(quest_id):
+    """
+    Выдаёт свободный промокод квеста и уменьшает счётчик.
+    Возвращает пару (промокод, остаток) или (None, 0), если коды закончились.
+    Вызывать внутри transaction.atomic() вместе с обновлением прогресса.
+    """
+    # сначала UPDATE счётчика: транзакция сразу берёт блокировку записи, и в SQLite
+    # при записи из другого процесса (run_bot --workers) ждёт её, а не падает
+    # с database is locked при попытке повысить блокировку чтения
+    reserved = PromoCodeStock.objects.filter(quest_id=quest_id, available__gt=0).update(
+        available=F('available') - 1,
+        updated_at=timezone.now(),
+    )
+    if not reserved:
+        return None, 0
+
+    promo_code = (
+        PromoCode.objects
+        .select_for_update(skip_locked=True)
+        .filter(quest_id=quest_id, is_used=False)
+        .order_by('created_at')
+        .first()
+    )
+    if not promo_code:
+        # счётчик разошёлся с таблицей промокодов
+        recount_stock(quest_id)
+        return None, 0
+
+    PromoCode.objects.filter(pk=promo_code.pk).update(is_used=True)
+    promo_code.is_used = True
+
+    remaining = (
+        PromoCodeStock.objects
+        .filter(quest_id=quest_id)
+        .values_list('available', flat=True)
+        .first()
+    ) or 0
+    return promo_code, remaining
+
+
+def add_promo_codes(quest_id, codes):
+    """
+    Загружает промокоды для квеста пачками через bulk_create.
+    Уже существующие коды пропускаются. Возвращает число добавленных.
+    """
+    added = 0
+    batch = []
+    for code in codes:
+        code = code.strip()
+        if code:
+            batch.append(code)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            added += _add_batch(quest_id, batch)
+            batch = []
+    if batch:
+        added += _add_batch(quest_id, batch)
+    return added
+
+
+@transaction.atomic
+def _add_batch(quest_id, codes):
+    codes = list(dict.fromkeys(codes))
+    existing = set(PromoCode.objects.filter(code__in=codes).values_list('code', flat=True))
+    # выданные коды, перенесённые в архив, тоже считаются существующими
+    existing.update(ArchivedProgress.objects.filter(promo_code__in=codes).values_list('promo_code', flat=True))
+    new_codes = [
+        PromoCode(quest_id=quest_id, code=code)
+        for code in codes
+        if code not in existing
+    ]
+    PromoCode.objects.bulk_create(new_codes)
+    PromoCodeStock.objects.filter(quest_id=quest_id).update(
+        available=F('available') + len(new_codes),
+        updated_at=timezone.now(),
+    )
+    return len(new_codes)
+
+
+def is_low_stock(available):
+    return available <= settings.PROMO_LOW_STOCK_THRESHOLD
+
+
+def crossed_low_stock(remaining):
+    """
+    Остаток только что достиг порога или нуля после выдачи одного кода.
+    Так оповещение уходит один раз, а не на каждое подтверждение.
+    """
+    return remaining == settings.PROMO_LOW_STOCK_THRESHOLD or remaining == 0
+
+
+def low_stock_message(quest_name, remaining):
+    if remaining == 0:
+        return f"⚠️ Промокоды для квеста \"{quest_name}\" закончились! Загрузите новые."
+    return f"⚠️ Для квеста \"{quest_name}\" осталось промокодов: {remaining}."
+
+
+def notify_low_stock(quest_name, remaining):
+    """
+    Отправляет оповещение в группу администраторов через Bot API в фоновом
+    потоке, чтобы запрос не ждал Telegram. Используется там, где нет
+    экземпляра aiogram.Bot (REST API, команды).
+    """
+    if not settings.TELEGRAM_BOT_TOKEN or not settings.ADMIN_GROUP_ID:
+        return
+    threading.Thread(
+        target=_send_low_stock, args=(quest_name, remaining), name='low-stock-alert', daemon=True,
+    ).start()
+
+
+def _send_low_stock(quest_name, remaining):
+    payload = json.dumps({
+        'chat_id': settings.ADMIN_GROUP_ID,
+        'text': low_stock_message(quest_name, remaining),
+    }).encode()
+    request = urllib.request.Request(
+        f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
+        data=payload,
+        headers={'Content-Type': 'application/json'},
+    )
+    try:
+        urllib.request.urlopen(request, timeout=5).close()
+    except Exception as e:
+        logger.error(f"Не удалось отправить оповещение об остатке промокодов: {e}")
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.archive import archivable, archive_cutoff, archive_progress
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит подтверждённые и отклонённые выполнения квестов старше заданного возраста '
+        'в архив пачками по отдельным транзакциям'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PROGRESS_ARCHIVE_AFTER_DAYS,
+                            help='Архивировать записи, решение по которым старше стольких дней')
+        parser.add_argument('--batch-size', type=int, default=settings.PROGRESS_ARCHIVE_BATCH_SIZE,
+                            help='Сколько записей переносить за одну транзакцию')
+        parser.add_argument('--pause', type=float, default=settings.PROGRESS_ARCHIVE_PAUSE,
+                            help='Пауза между пачками, с')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, сколько записей попадёт в архив')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days должен быть положительным')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        cutoff = archive_cutoff(options['days'])
+        pending = archivable(cutoff).count()
+        self.stdout.write(f'Решение раньше {timezone.localtime(cutoff):%Y-%m-%d %H:%M}: {pending} записей')
+        if options['dry_run'] or not pending:
+            return
+
+        started = time.perf_counter()
+        total = archive_progress(
+            cutoff,
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            on_batch=lambda moved: self.stdout.write(f'  перенесено {moved}/{pending}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'В архиве: {total} записей за {time.perf_counter() - started:.1f} с'
+        ))
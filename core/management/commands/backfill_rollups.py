@@ -0,0 +1,64 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from core.models import ArchivedProgress, UserQuestProgress
+from core.rollups import bucket_start, rebuild_window
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает часовые и дневные агрегаты по квестам из истории UserQuestProgress и архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Первый день (ГГГГ-ММ-ДД); по умолчанию — с самой ранней отправки')
+        parser.add_argument('--until', type=datetime.date.fromisoformat,
+                            help='Последний день включительно; по умолчанию — сегодня')
+        parser.add_argument('--window-days', type=int, default=7,
+                            help='Сколько дней пересчитывать за один проход (одна транзакция)')
+
+    def handle(self, *args, **options):
+        # архив старше живых записей, поэтому границы истории — по обеим таблицам
+        bounds = [
+            source.aggregate(first=Min('completed_at'), last=Max('completed_at'))
+            for source in (UserQuestProgress.objects, ArchivedProgress.objects)
+        ]
+        bounds = {
+            'first': min((b['first'] for b in bounds if b['first']), default=None),
+            'last': max((b['last'] for b in bounds if b['last']), default=None),
+        }
+        if bounds['first'] is None:
+            self.stdout.write('История пуста, пересчитывать нечего')
+            return
+
+        tz = timezone.get_current_timezone()
+        if options['since']:
+            start = timezone.make_aware(datetime.datetime.combine(options['since'], datetime.time()), tz)
+        else:
+            start = bucket_start(bounds['first'], 'day')
+        until = options['until'] or timezone.localdate(max(bounds['last'], timezone.now()))
+        end = timezone.make_aware(datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time()), tz)
+        if start >= end:
+            raise CommandError('--since позже --until')
+        if options['window_days'] < 1:
+            raise CommandError('--window-days должен быть положительным')
+
+        started = time.perf_counter()
+        written = 0
+        window_start = start
+        while window_start < end:
+            # шагаем по календарным дням, а не по 24 часам: корзины в местном времени
+            window_end = min(end, timezone.make_aware(datetime.datetime.combine(
+                timezone.localtime(window_start).date() + datetime.timedelta(days=options['window_days']),
+                datetime.time(),
+            ), tz))
+            written += rebuild_window(window_start, window_end)
+            self.stdout.write(f'  {timezone.localtime(window_start):%Y-%m-%d} … {timezone.localtime(window_end):%Y-%m-%d}: готово')
+            window_start = window_end
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано корзин: {written} за {time.perf_counter() - started:.1f} с'
+        ))
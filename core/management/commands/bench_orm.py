@@ -0,0 +1,298 @@
+import json
+import math
+import platform
+import random
+import time
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import UserQuestProgressViewSet
+from bot.bot import _sync_save_route
+from core.benchmarking import benchmark_database, percentile
+from core.models import PromoCodeStock, Quest, User, UserQuestProgress
+from core.promo_messages import build_messages
+from core.quest_cache import next_quest_card, quest_cache
+from core.seeding import Seeder, SeedVolumes
+
+SAMPLE_SIZE = 200
+WARMUP = 5
+ROUTE_POINTS = 8
+NEW_ROUTE_QUESTS = 2
+# разница p50 меньше этой считается шумом, даже если в процентах она большая
+NOISE_MS = 0.1
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def parse_sizes(value):
+    try:
+        sizes = [float(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise CommandError(f'Неверный список размеров: {value}')
+    if not sizes or min(sizes) <= 0:
+        raise CommandError('Размеры должны быть положительными, например 0.001,0.01')
+    return sizes
+
+
+class QueryCounter:
+    """execute_wrapper: считает запросы без логирования SQL, как в CaptureQueriesContext"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # точки сохранения появляются только от отката сценария, в боевом коде их нет
+        if not sql.startswith(SAVEPOINT_PREFIXES):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable
+    prepare: Callable
+    writes: bool = False  # каждый прогон откатывается, данные остаются одними и теми же
+
+
+@dataclass
+class Sample:
+    users: list
+    telegram_ids: list
+    quest_ids: list
+    stocked_quest_ids: list
+    pages: int
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет горячие запросы ORM (следующий квест, подтверждение с выдачей промокода, '
+        '«Мои промокоды», сохранение маршрута, список выполнений в API) на синтетических базах '
+        'разного размера; сохраняет результат в JSON и сравнивает с сохранённым ранее'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0.001,0.01,0.05',
+                            help='Множители объёмов seed_load_data через запятую (1 — 5 млн выполнений)')
+        parser.add_argument('--repeat', type=int, default=100, help='Замеров каждого сценария')
+        parser.add_argument('--cases', default=None,
+                            help='Только эти сценарии через запятую, по умолчанию — все')
+        parser.add_argument('--save', metavar='FILE', help='Записать результат в JSON')
+        parser.add_argument('--compare', metavar='FILE', help='Сравнить с результатом из JSON')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Допустимый рост p50 в долях, 0.25 — на 25%%')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        sizes = parse_sizes(options['sizes'])
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        report = {
+            'created_at': timezone.now().isoformat(timespec='seconds'),
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+        # оповещения об остатке промокодов из approve не должны уходить в настоящий Telegram
+        with override_settings(TELEGRAM_BOT_TOKEN=''):
+            for scale in sizes:
+                report['sizes'][str(scale)] = self.run_size(scale, options)
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результат записан в {options['save']}")
+        if baseline is not None:
+            self.compare(baseline, report, options['tolerance'])
+
+    def run_size(self, scale, options):
+        volumes = SeedVolumes().scaled(scale)
+        with benchmark_database():
+            started = time.perf_counter()
+            for _ in Seeder(volumes, seed=options['seed']).run():
+                pass
+            self.stdout.write(
+                f'\nРазмер {scale}: {volumes.users} пользователей, {volumes.quests} квестов, '
+                f'{volumes.progress} выполнений, {volumes.promo_codes} промокодов — '
+                f'данные за {time.perf_counter() - started:.1f} с'
+            )
+            quest_cache.load()
+            cases = self.cases(self.sample(options['seed']))
+            if options['cases']:
+                wanted = set(options['cases'].split(','))
+                unknown = wanted - {case.name for case in cases}
+                if unknown:
+                    raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+                cases = [case for case in cases if case.name in wanted]
+
+            self.stdout.write(f"{'сценарий':<22} {'p50, мс':>9} {'p95, мс':>9} {'среднее':>9} {'запросов':>9}")
+            results = {}
+            for case in cases:
+                result = self.measure(case, random.Random(options['seed']), options['repeat'])
+                results[case.name] = result
+                self.stdout.write(
+                    f"{case.name:<22} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+                    f"{result['mean_ms']:>9.3f} {result['queries']:>9}"
+                )
+        return {'volumes': volumes.__dict__, 'cases': results}
+
+    def sample(self, seed):
+        """Пользователи и квесты для сценариев: чем активнее пользователь, тем чаще он попадает в выборку"""
+        rng = random.Random(seed)
+        # id случайные, поэтому первые строки по id — случайная выборка выполнений
+        user_ids = list(
+            UserQuestProgress.objects.order_by('id').values_list('user_id', flat=True)[:SAMPLE_SIZE]
+        )
+        users = list(User.objects.filter(id__in=user_ids)) or list(User.objects.all()[:SAMPLE_SIZE])
+        telegram_ids = list(
+            UserQuestProgress.objects
+            .filter(status=UserQuestProgress.Status.APPROVED)
+            .order_by('id')
+            .values_list('user__telegram_id', flat=True)[:SAMPLE_SIZE]
+        ) or [user.telegram_id for user in users]
+        quest_ids = list(Quest.objects.filter(is_active=True).values_list('id', flat=True)[:SAMPLE_SIZE * 5])
+        rng.shuffle(quest_ids)
+        # у популярных квестов больше кодов — и подтверждений на них тоже больше
+        stocked = list(
+            PromoCodeStock.objects.filter(available__gt=0)
+            .order_by('-available')
+            .values_list('quest_id', flat=True)[:SAMPLE_SIZE]
+        )
+        pages = math.ceil(UserQuestProgress.objects.count() / settings.REST_FRAMEWORK['PAGE_SIZE'])
+        return Sample(users, telegram_ids, quest_ids, stocked, pages)
+
+    def cases(self, sample):
+        factory = APIRequestFactory()
+        admin = get_user_model().objects.create_user('bench-admin', password='bench', is_staff=True)
+        approve_view = UserQuestProgressViewSet.as_view({'post': 'approve'})
+        list_view = UserQuestProgressViewSet.as_view({'get': 'list'})
+        serial = iter(range(900_000_000, 1_000_000_000))
+
+        def call_view(view, request, **kwargs):
+            force_authenticate(request, user=admin)
+            response = view(request, **kwargs)
+            response.render()
+            if response.status_code != 200:
+                raise CommandError(f'{request.path}: {response.status_code} {response.content[:200]!r}')
+
+        def prepare_approve(rng):
+            # новый пользователь: у него точно нет открытой попытки по этому квесту
+            user = User.objects.create(telegram_id=next(serial), name='Бенчмарк')
+            progress = UserQuestProgress.objects.create(
+                user=user, quest_id=rng.choice(sample.stocked_quest_ids), telegram_file_id='bench-photo',
+            )
+            return factory.post(f'/api/progress/{progress.pk}/approve/', {'comment': ''}, format='json'), progress.pk
+
+        def prepare_route(rng):
+            existing = rng.sample(sample.quest_ids, min(len(sample.quest_ids), ROUTE_POINTS - NEW_ROUTE_QUESTS))
+            points = [
+                {'quest_id': str(quest_id), 'hint_text': f'Подсказка {order}', 'latitude': 56.13, 'longitude': 47.25}
+                for order, quest_id in enumerate(existing, start=1)
+            ]
+            points += [
+                {
+                    'new_quest': {
+                        'name': f'Новый квест {rng.getrandbits(32)}', 'description': 'Сделайте фото',
+                        'location': 'ул. Бенчмарка, 1', 'latitude': 56.14, 'longitude': 47.26,
+                    },
+                    'latitude': 56.14, 'longitude': 47.26,
+                }
+                for _ in range(NEW_ROUTE_QUESTS)
+            ]
+            return {'route_name': f'Маршрут {rng.getrandbits(32)}', 'route_description': '', 'points': points}
+
+        def page_request(page):
+            return lambda rng: factory.get('/api/progress/', {'page': page})
+
+        cases = [
+            Case('next_quest', prepare=lambda rng: rng.choice(sample.users), run=next_quest_card),
+            Case('my_promocodes', prepare=lambda rng: rng.choice(sample.telegram_ids), run=build_messages),
+            Case('progress_list_first', prepare=page_request(1), run=lambda request: call_view(list_view, request)),
+            Case('progress_list_deep', prepare=page_request(max(1, sample.pages // 2)),
+                 run=lambda request: call_view(list_view, request)),
+            Case('save_route', prepare=prepare_route, run=async_to_sync(_sync_save_route), writes=True),
+        ]
+        if sample.stocked_quest_ids:
+            cases.insert(1, Case(
+                'approve', prepare=prepare_approve, writes=True,
+                run=lambda args: call_view(approve_view, args[0], pk=str(args[1])),
+            ))
+        return cases
+
+    def measure(self, case, rng, repeat):
+        timings, queries = [], Counter()
+        for run in range(WARMUP + repeat):
+            counter = QueryCounter()
+            with transaction.atomic() if case.writes else nullcontext():
+                args = case.prepare(rng)
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    case.run(args)
+                    elapsed = time.perf_counter() - start
+                if case.writes:
+                    transaction.set_rollback(True)
+            if run >= WARMUP:
+                timings.append(elapsed)
+                queries[counter.count] += 1
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            # самое частое число: редкая перезагрузка кэша не должна выглядеть регрессией
+            'queries': queries.most_common(1)[0][0],
+        }
+
+    def compare(self, baseline, report, tolerance):
+        if (baseline.get('vendor'), baseline.get('seed')) != (report['vendor'], report['seed']):
+            self.stdout.write(self.style.WARNING(
+                f"База или seed отличаются от сохранённых ({baseline.get('vendor')}, seed {baseline.get('seed')}) — "
+                'сравнение примерное'
+            ))
+        self.stdout.write(
+            f"\n{'размер':<8} {'сценарий':<22} {'p50 было':>9} {'p50 стало':>10} {'запросов':>12}"
+        )
+        regressions = []
+        for size, current in report['sizes'].items():
+            before = baseline.get('sizes', {}).get(size, {}).get('cases', {})
+            for name, result in current['cases'].items():
+                old = before.get(name)
+                if old is None:
+                    continue
+                problems = []
+                if result['queries'] > old['queries']:
+                    problems.append('запросов больше')
+                if (result['p50_ms'] > old['p50_ms'] * (1 + tolerance)
+                        and result['p50_ms'] - old['p50_ms'] > NOISE_MS):
+                    problems.append(f"p50 +{(result['p50_ms'] / old['p50_ms'] - 1) * 100:.0f}%")
+                line = (
+                    f"{size:<8} {name:<22} {old['p50_ms']:>9.3f} {result['p50_ms']:>10.3f} "
+                    f"{old['queries']:>5} → {result['queries']:<4}"
+                )
+                if problems:
+                    regressions.append(f'{size}/{name}')
+                    self.stdout.write(self.style.ERROR(f"{line} РЕГРЕССИЯ: {', '.join(problems)}"))
+                else:
+                    self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"Регрессии: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
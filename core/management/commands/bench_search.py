@@ -0,0 +1,66 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarking import percentile
+from core.search import QuestSearchIndex
+
+WORDS = [
+    'памятник', 'музей', 'парк', 'фонтан', 'собор', 'набережная', 'театр', 'мост', 'площадь', 'аллея',
+    'бульвар', 'галерея', 'башня', 'храм', 'сквер', 'улица', 'проспект', 'залив', 'остров', 'вокзал',
+]
+
+DEFAULT_QUERIES = [
+    'Памятник', 'памятник музей парк 123', 'пямятник', 'набережна', 'Фонтан сквер 99999', 'ул. Театр', 'мост',
+]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет поиск квестов на синтетическом каталоге (без базы данных)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quests', type=int, default=100_000, help='Размер каталога')
+        parser.add_argument('--repeat', type=int, default=100, help='Повторов каждого запроса')
+        parser.add_argument('--target-ms', type=float, default=5.0, help='Цель по p95 одного запроса, мс')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [
+            (
+                uuid.UUID(int=rng.getrandbits(128)),
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).capitalize() + f' {i}',
+                f'ул. {rng.choice(WORDS).capitalize()}, {rng.randint(1, 200)}',
+                rng.random() > 0.1,
+            )
+            for i in range(options['quests'])
+        ]
+
+        index = QuestSearchIndex()
+        start = time.perf_counter()
+        index.load(rows)
+        self.stdout.write(f"Индекс на {len(rows)} квестов построен за {time.perf_counter() - start:.1f} с")
+        # индекс синтетический — фоновая перестройка из базы ему не нужна
+        index._loaded_at = float('inf')
+
+        worst = 0.0
+        for query in DEFAULT_QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                results = index.search(query)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            p95 = percentile(timings, 95) * 1000
+            worst = max(worst, p95)
+            top = results[0] if results else None
+            self.stdout.write(
+                f"  {query!r:<28} p50 {percentile(timings, 50) * 1000:>6.2f} мс  p95 {p95:>6.2f} мс  "
+                + (f"{top.match}: {top.name}" if top else 'нет результатов')
+            )
+
+        if worst > options['target_ms']:
+            raise CommandError(f"Поиск медленнее цели: {worst:.1f} мс > {options['target_ms']:.0f} мс")
+        self.stdout.write(self.style.SUCCESS('Поиск укладывается в цель'))
@@ -0,0 +1,232 @@
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.benchmarking import benchmark_database, percentile
+
+# последняя миграция, где id ещё хранятся 32-символьными строками
+TEXT_UUID_STATE = ('core', '0012_progress_archive')
+COMPACT_UUID_STATE = ('core', '0013_compact_uuid')
+TABLES = ('core_user', 'core_quest', 'core_promocodestock', 'core_promocode', 'core_userquestprogress')
+CHUNK_SIZE = 20_000
+MB = 1024 * 1024
+
+
+@dataclass
+class Sample:
+    progress: list = field(default_factory=list)
+    users: list = field(default_factory=list)
+    telegram_ids: list = field(default_factory=list)
+    quests: list = field(default_factory=list)
+
+
+class Command(BaseCommand):
+    help = (
+        'Размер индексов и задержка join-запросов при UUID-ключах строкой (до 0013_compact_uuid) '
+        'и 16 байтами (после) на одной и той же синтетической базе SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200_000)
+        parser.add_argument('--quests', type=int, default=2_000)
+        parser.add_argument('--progress', type=int, default=2_000_000,
+                            help='Сколько выполнений квестов (UserQuestProgress) создать')
+        parser.add_argument('--repeat', type=int, default=1000, help='Повторов каждого запроса')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Компактное хранение UUID отличается от обычного только в SQLite')
+        if options['progress'] > options['users'] * options['quests']:
+            raise CommandError('--progress не может быть больше --users × --quests')
+
+        with benchmark_database():
+            call_command('migrate', *TEXT_UUID_STATE, verbosity=0)
+            started = time.perf_counter()
+            sample = self.fill(options)
+            self.stdout.write(
+                f"Данные: {options['users']} пользователей, {options['quests']} квестов, "
+                f"{options['progress']} выполнений — {time.perf_counter() - started:.1f} с"
+            )
+
+            before_sizes = self.storage()
+            before = self.measure(self.models(TEXT_UUID_STATE), sample, options)
+
+            started = time.perf_counter()
+            call_command('migrate', *COMPACT_UUID_STATE, verbosity=0)
+            self.stdout.write(f'Миграция на 16-байтные UUID: {time.perf_counter() - started:.1f} с')
+            self.check_foreign_keys()
+
+            after_sizes = self.storage()
+            after = self.measure(self.models(COMPACT_UUID_STATE), sample, options)
+
+        self.report_storage(before_sizes, after_sizes)
+        self.report_latency(before, after)
+
+    def models(self, state):
+        apps = MigrationExecutor(connection).loader.project_state(state).apps
+        return tuple(apps.get_model('core', name) for name in ('User', 'Quest', 'UserQuestProgress'))
+
+    def fill(self, options):
+        """
+        Пишет данные прямо в схему 0012 — id hex-строками, как их хранил UUIDField.
+        Через ORM миллионы строк вставлялись бы в десятки раз дольше.
+        """
+        rng = random.Random(options['seed'])
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        def new_id():
+            return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+        sample = Sample()
+        quests = [new_id() for _ in range(options['quests'])]
+        self.insert('core_quest', ('id', 'name', 'description', 'location', 'created_at', 'is_active'), (
+            (quest_id.hex, f'Квест {i}', '', '', now, rng.random() > 0.1) for i, quest_id in enumerate(quests)
+        ))
+        sample.quests = quests[:1000]
+        # OneToOneField на квест: его колонку миграция тоже должна перевести в байты
+        self.insert('core_promocodestock', ('id', 'quest_id', 'available', 'updated_at'), (
+            (new_id().hex, quest_id.hex, 0, now) for quest_id in quests
+        ))
+
+        users = [new_id() for _ in range(options['users'])]
+        self.insert('core_user', ('id', 'telegram_id', 'name', 'is_verified', 'created_at', 'is_route_builder'), (
+            (user_id.hex, 10_000_000 + i, f'User {i}', rng.random() > 0.2, now, False)
+            for i, user_id in enumerate(users)
+        ))
+        sample.users = rng.sample(users, min(1000, len(users)))
+        sample.telegram_ids = [10_000_000 + i for i in rng.sample(range(len(users)), len(sample.users))]
+
+        codes, progress = [], []
+        for i in range(options['progress']):
+            # у каждой пары пользователь–квест одна запись: уникальные индексы не мешают
+            user_index = i % len(users)
+            quest_id = quests[(i // len(users) + user_index * 7) % len(quests)].hex
+            roll = rng.random()
+            status = 'approved' if roll < 0.6 else 'rejected' if roll < 0.9 else 'pending'
+            code_id = None
+            if status == 'approved':
+                code_id = new_id().hex
+                codes.append((code_id, f'C{i:09d}', quest_id, True, now))
+            progress_id = new_id()
+            progress.append((progress_id.hex, users[user_index].hex, quest_id, 'bench-photo', status, code_id,
+                             now, '', '', now, 1))
+            if len(sample.progress) < 1000 and i % 100 == 0:
+                sample.progress.append(progress_id)
+            if len(progress) >= CHUNK_SIZE:
+                self.insert_progress(codes, progress)
+                codes, progress = [], []
+        self.insert_progress(codes, progress)
+        return sample
+
+    def insert_progress(self, codes, progress):
+        self.insert('core_promocode', ('id', 'code', 'quest_id', 'is_used', 'created_at'), codes)
+        self.insert('core_userquestprogress', (
+            'id', 'user_id', 'quest_id', 'photo', 'status', 'promo_code_id',
+            'completed_at', 'admin_comment', 'reviewer', 'status_changed_at', 'attempt',
+        ), progress)
+
+    def insert(self, table, columns, rows):
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        rows = iter(rows)
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, chunk)
+
+    def check_foreign_keys(self):
+        """Каждый внешний ключ после миграции указывает на существующую строку"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_key_check')
+            broken = cursor.fetchall()
+        if broken:
+            tables = sorted({row[0] for row in broken})
+            raise CommandError(f"После миграции {len(broken)} битых внешних ключей: {', '.join(tables)}")
+
+    def storage(self):
+        """Байты на каждую таблицу и индекс после VACUUM — без учёта фрагментации от вставок"""
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+            placeholders = ', '.join(['%s'] * len(TABLES))
+            cursor.execute(
+                f'SELECT name, tbl_name FROM sqlite_schema WHERE tbl_name IN ({placeholders})', TABLES,
+            )
+            objects = dict(cursor.fetchall())
+            cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')
+            sizes = {}
+            for name, size in cursor.fetchall():
+                if name not in objects:
+                    continue
+                table = objects[name]
+                if name == table:
+                    sizes[table, ''] = size
+                    continue
+                # автоиндексы SQLite после пересоздания таблицы нумеруются заново — сравниваем по колонкам
+                cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(name)})')
+                columns = ', '.join(row[2] for row in cursor.fetchall())
+                label = f'({columns})' if name.startswith('sqlite_autoindex') else f'{name} ({columns})'
+                sizes[table, label] = size
+            return sizes
+
+    def measure(self, models, sample, options):
+        User, Quest, Progress = models
+        queries = {
+            'запись по pk': lambda rng: Progress.objects.filter(
+                pk=rng.choice(sample.progress)
+            ).values_list('status', flat=True).first(),
+            'промокоды пользователя': lambda rng: list(Progress.objects.filter(
+                user__telegram_id=rng.choice(sample.telegram_ids), status='approved',
+            ).values_list('quest__name', 'promo_code__code')),
+            'доступный квест': lambda rng: Quest.objects.filter(is_active=True).exclude(Exists(
+                Progress.objects.filter(~Q(status='rejected'), user_id=rng.choice(sample.users), quest=OuterRef('pk'))
+            )).values_list('id', flat=True).first(),
+            'подтверждения квеста': lambda rng: Progress.objects.filter(
+                quest_id=rng.choice(sample.quests), status='approved', user__is_verified=True,
+            ).count(),
+        }
+        results = {}
+        for name, query in queries.items():
+            rng = random.Random(options['seed'])
+            for _ in range(min(50, options['repeat'])):  # прогрев кэша страниц
+                query(rng)
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                query(rng)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results[name] = timings
+        return results
+
+    def report_storage(self, before, after):
+        self.stdout.write('')
+        self.stdout.write(f"{'таблица / индекс':<64} {'строка, МБ':>11} {'16 байт, МБ':>12} {'доля':>6}")
+        totals = [0, 0]
+        for table, index in sorted(before):
+            size_before, size_after = before[table, index], after.get((table, index), 0)
+            totals[0] += size_before
+            totals[1] += size_after
+            label = f'  {index}' if index else table
+            self.stdout.write(
+                f'{label:<64} {size_before / MB:>11.1f} {size_after / MB:>12.1f} {size_after / size_before:>6.2f}'
+            )
+        self.stdout.write(f"{'всего':<64} {totals[0] / MB:>11.1f} {totals[1] / MB:>12.1f} {totals[1] / totals[0]:>6.2f}")
+
+    def report_latency(self, before, after):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'запрос':<24} {'p50 строка':>11} {'p50 16 байт':>12} {'p95 строка':>11} {'p95 16 байт':>12}   мс"
+        )
+        for name in before:
+            self.stdout.write(
+                f'{name:<24} {percentile(before[name], 50) * 1000:>11.3f} {percentile(after[name], 50) * 1000:>12.3f} '
+                f'{percentile(before[name], 95) * 1000:>11.3f} {percentile(after[name], 95) * 1000:>12.3f}'
+            )
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Route
+from core.route_exchange import EXPORTERS, FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Выгружает маршруты с точками и квестами в JSON Lines или GeoJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Файл для выгрузки, «-» — stdout')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Формат; по умолчанию определяется по расширению файла, иначе jsonl')
+        parser.add_argument('--route', action='append', default=[], help='Выгрузить только этот маршрут (можно несколько)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (detect_format(path) if path != '-' else None) or 'jsonl'
+        routes = Route.objects.all()
+        if options['route']:
+            routes = routes.filter(name__in=options['route'])
+            missing = set(options['route']) - set(routes.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f"Маршруты не найдены: {', '.join(sorted(missing))}")
+
+        output = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+        try:
+            for chunk in EXPORTERS[file_format](routes):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f'Маршруты выгружены в {path} ({file_format})'))
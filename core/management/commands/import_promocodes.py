@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Quest
+from core.inventory import add_promo_codes
+
+
+class Command(BaseCommand):
+    help = 'Загружает промокоды для квеста из текстового файла (по одному коду в строке)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quest_id', help='ID квеста')
+        parser.add_argument('path', help='Путь к файлу с промокодами')
+
+    def handle(self, *args, **options):
+        quest = Quest.objects.filter(id=options['quest_id']).first()
+        if not quest:
+            raise CommandError(f"Квест с ID {options['quest_id']} не найден")
+
+        with open(options['path'], encoding='utf-8') as f:
+            added = add_promo_codes(quest.id, f)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено промокодов: {added}. Доступно для квеста «{quest.name}»: {quest.promo_stock.available}'
+        ))
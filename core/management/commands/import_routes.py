@@ -0,0 +1,37 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.route_exchange import FORMATS, READERS, detect_format, import_routes
+from core.route_import import RouteImportError
+
+
+class Command(BaseCommand):
+    help = 'Загружает маршруты из JSON Lines или GeoJSON (upsert по названиям маршрутов и квестов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с маршрутами, «-» — stdin')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Формат; по умолчанию определяется по расширению файла, иначе jsonl')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (detect_format(path) if path != '-' else None) or 'jsonl'
+
+        start = time.perf_counter()
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            stats = import_routes(READERS[file_format](stream))
+        except RouteImportError as e:
+            raise CommandError(f'Импорт отменён, база не изменена:\n{e}')
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Маршрутов: создано {stats['routes_created']}, обновлено {stats['routes_updated']}, "
+            f"без изменений {stats['routes_unchanged']}; "
+            f"квестов: создано {stats['quests_created']}, обновлено {stats['quests_updated']}; "
+            f"точек: {stats['points']}. За {time.perf_counter() - start:.1f} с"
+        ))
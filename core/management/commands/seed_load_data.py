@@ -0,0 +1,68 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.models import Quest, User
+from core.seeding import Seeder, SeedVolumes
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет пустую базу синтетическими данными производственного объёма для замеров: '
+        'пользователи, квесты, выполнения, промокоды и маршруты с неравномерной популярностью'
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedVolumes()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--quests', type=int, default=defaults.quests)
+        parser.add_argument('--progress', type=int, default=defaults.progress,
+                            help='Сколько выполнений квестов (включая повторные попытки)')
+        parser.add_argument('--promo-codes', type=int, default=defaults.promo_codes,
+                            help='Всего промокодов, выданных и свободных')
+        parser.add_argument('--routes', type=int, default=defaults.routes)
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Множитель для всех объёмов, например 0.01 для быстрой проверки')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--end', type=datetime.date.fromisoformat,
+                            help='Дата, к которой «подведена» история (ГГГГ-ММ-ДД); по умолчанию — сегодня')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        volumes = SeedVolumes(
+            users=options['users'],
+            quests=options['quests'],
+            progress=options['progress'],
+            promo_codes=options['promo_codes'],
+            routes=options['routes'],
+        )
+        if options['scale'] != 1.0:
+            volumes = volumes.scaled(options['scale'])
+        if min(volumes.__dict__.values()) < 1:
+            raise CommandError('Все объёмы должны быть положительными')
+        using = options['database']
+        if User.objects.using(using).exists() or Quest.objects.using(using).exists():
+            raise CommandError('В базе уже есть пользователи или квесты — заполняется только пустая база')
+
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # случайные UUID в индексах: чем больше страниц в кэше, тем меньше чтений с диска
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        self.stdout.write(
+            f'Пользователей: {volumes.users}, квестов: {volumes.quests}, выполнений: {volumes.progress}, '
+            f'промокодов: {volumes.promo_codes}, маршрутов: {volumes.routes}'
+        )
+        self.stdout.write(f"{'таблица':<32} {'строк':>10} {'секунд':>8} {'строк/с':>10}")
+        started = time.perf_counter()
+        total = 0
+        for step in Seeder(volumes, seed=options['seed'], end=options['end'], using=using).run():
+            total += step.rows
+            self.stdout.write(f'{step.table:<32} {step.rows:>10} {step.seconds:>8.1f} {step.rate:>10.0f}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {total} строк за {elapsed:.1f} с, {total / elapsed:.0f} строк/с'
+        ))
@@ -0,0 +1,110 @@
+"""
+Хранение фото выполнений квестов.
+
+Бот при отправке фото записывает только telegram_file_id, а само фото
+скачивает фоновый загрузчик (bot.media.MediaDownloader): Telegram хранит
+файлы не вечно, а по file_id нельзя ни показать фото в API, ни сохранить
+доказательство выполнения.
+
+Файл адресуется содержимым: имя — sha256 байтов, quest_photos/ab/cd/<sha256>.jpg.
+Одно и то же фото, присланное повторно (или другим пользователем), на диск
+пишется один раз, а строки UserQuestProgress ссылаются на один файл.
+Скачивание идёт кусками во временный файл (IncomingMedia), в памяти
+держится только текущий кусок; FileSystemStorage потом переносит временный
+файл на место без копирования.
+
+Очередь — сами строки UserQuestProgress с пустым photo и непустым
+telegram_file_id (частичный индекс progress_media_pending_idx). После
+MEDIA_DOWNLOAD_MAX_ATTEMPTS неудач строка из очереди выпадает.
+"""
+import hashlib
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db.models import F
+
+from .models import MEDIA_PENDING, UserQuestProgress
+
+MEDIA_DIR = 'quest_photos'
+DEFAULT_EXTENSION = '.jpg'
+
+
+class MediaError(Exception):
+    pass
+
+
+def media_name(digest, extension=DEFAULT_EXTENSION):
+    return f'{MEDIA_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+class IncomingMedia:
+    """
+    Временный файл, в который дописываются куски скачиваемого фото;
+    заодно считаются sha256 и размер. Использовать через with.
+    """
+
+    def __init__(self, source_path='', max_bytes=None):
+        self.extension = posixpath.splitext(source_path)[1].lower() or DEFAULT_EXTENSION
+        self.max_bytes = settings.MEDIA_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self.file = TemporaryUploadedFile('media' + self.extension, 'application/octet-stream', 0, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # если файл уже перенесён в хранилище, close() это учитывает
+        self.file.close()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise MediaError(f'Файл больше {self.max_bytes} байт')
+        self._hash.update(chunk)
+        self.file.write(chunk)
+
+    @property
+    def name(self):
+        return media_name(self._hash.hexdigest(), self.extension)
+
+    def save(self, storage=None):
+        """
+        Кладёт файл в хранилище под именем по содержимому.
+        Возвращает (имя, записан ли файл); если такой файл уже есть, второй раз не пишется.
+        """
+        storage = storage or default_storage
+        name = self.name
+        if storage.exists(name):
+            return name, False
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = self.size
+        saved = storage.save(name, self.file)
+        if saved != name:
+            # тот же файл параллельно сохранил другой загрузчик — копия под другим именем не нужна
+            storage.delete(saved)
+            return name, False
+        return name, True
+
+
+def pending_downloads(limit, exclude=()):
+    """(id, telegram_file_id) фото, которые ещё нужно скачать, старые первыми; exclude — уже в работе"""
+    rows = (
+        UserQuestProgress.objects
+        .filter(MEDIA_PENDING, media_attempts__lt=settings.MEDIA_DOWNLOAD_MAX_ATTEMPTS)
+        .order_by('completed_at')
+        .values_list('id', 'telegram_file_id')[:limit + len(exclude)]
+    )
+    return [row for row in rows if row[0] not in exclude][:limit]
+
+
+def attach_media(progress_id, name):
+    """Записывает путь к скачанному фото; update без сигналов — статус не меняется"""
+    return UserQuestProgress.objects.filter(pk=progress_id, photo='').update(photo=name)
+
+
+def record_failure(progress_id):
+    UserQuestProgress.objects.filter(pk=progress_id).update(media_attempts=F('media_attempts') + 1)
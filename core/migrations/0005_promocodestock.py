@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_promo_stock(apps, schema_editor):
+    Quest = apps.get_model("core", "Quest")
+    PromoCodeStock = apps.get_model("core", "PromoCodeStock")
+    quests = Quest.objects.annotate(
+        free=Count("promocodes", filter=Q(promocodes__is_used=False))
+    )
+    PromoCodeStock.objects.bulk_create(
+        PromoCodeStock(quest=quest, available=quest.free) for quest in quests
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_route_routequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromoCodeStock",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "available",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Количество неиспользованных промокодов"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="promocode",
+            index=models.Index(
+                fields=["quest", "is_used"], name="core_promoc_quest_i_e11a2c_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="promocodestock",
+            name="quest",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="promo_stock",
+                to="core.quest",
+            ),
+        ),
+        migrations.RunPython(fill_promo_stock, migrations.RunPython.noop),
+    ]
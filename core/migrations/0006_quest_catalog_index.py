@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_promocodestock"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="quest",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["created_at", "id"],
+                name="quest_catalog_idx",
+            ),
+        ),
+    ]
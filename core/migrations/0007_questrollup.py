@@ -0,0 +1,79 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:26
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_quest_catalog_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Час"), ("day", "День")], max_length=4
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("submissions", models.PositiveIntegerField(default=0)),
+                ("approvals", models.PositiveIntegerField(default=0)),
+                ("rejections", models.PositiveIntegerField(default=0)),
+                (
+                    "moderation_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Сколько проверок попало в гистограмму"
+                    ),
+                ),
+                (
+                    "moderation_seconds",
+                    models.FloatField(
+                        default=0, help_text="Суммарное время проверки, с"
+                    ),
+                ),
+                (
+                    "moderation_histogram",
+                    models.JSONField(
+                        default=list, help_text="Число проверок по корзинам времени"
+                    ),
+                ),
+                (
+                    "quest",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="core.quest",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["period", "bucket_start"],
+                        name="core_questr_period_3d7180_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="questrollup",
+            constraint=models.UniqueConstraint(
+                fields=("quest", "period", "bucket_start"), name="quest_rollup_bucket"
+            ),
+        ),
+    ]
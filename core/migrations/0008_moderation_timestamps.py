@@ -0,0 +1,117 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:28
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_status_changed_at(apps, schema_editor):
+    # время решения по старым записям неизвестно — reviewed_at остаётся пустым
+    UserQuestProgress = apps.get_model("core", "UserQuestProgress")
+    UserQuestProgress.objects.update(status_changed_at=F("completed_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_questrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProgressTransition",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("pending", "На проверке"),
+                            ("approved", "Подтверждено"),
+                            ("rejected", "Отклонено"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "На проверке"),
+                            ("approved", "Подтверждено"),
+                            ("rejected", "Отклонено"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("actor", models.CharField(blank=True, max_length=255)),
+                ("changed_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="reviewed_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Когда вынесено решение", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="reviewer",
+            field=models.CharField(
+                blank=True,
+                help_text="Кто проверил: админ в Telegram или пользователь API",
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="status_changed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="userquestprogress",
+            index=models.Index(
+                fields=["status", "completed_at"], name="core_userqu_status_0156f5_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userquestprogress",
+            index=models.Index(
+                fields=["reviewed_at"], name="core_userqu_reviewe_6400bf_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="progresstransition",
+            name="progress",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transitions",
+                to="core.userquestprogress",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="progresstransition",
+            index=models.Index(
+                fields=["progress", "changed_at"], name="core_progre_progres_f342e5_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="progresstransition",
+            index=models.Index(
+                fields=["to_status", "changed_at"],
+                name="core_progre_to_stat_810529_idx",
+            ),
+        ),
+        migrations.RunPython(fill_status_changed_at, migrations.RunPython.noop),
+    ]
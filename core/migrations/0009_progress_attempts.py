@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_moderation_timestamps"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="userquestprogress",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="attempt",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Номер попытки: после отклонения можно отправить фото ещё раз",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userquestprogress",
+            constraint=models.UniqueConstraint(
+                fields=("user", "quest", "attempt"), name="progress_attempt_unique"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userquestprogress",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "rejected"), _negated=True),
+                fields=("user", "quest"),
+                name="progress_open_attempt",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_progress_attempts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessedUpdate",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=128, primary_key=True, serialize=False),
+                ),
+                ("created_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
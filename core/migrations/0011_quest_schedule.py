@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_processed_update"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quest",
+            name="active_from",
+            field=models.DateTimeField(
+                blank=True, help_text="Квест показывается с этого момента", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="quest",
+            name="active_until",
+            field=models.DateTimeField(
+                blank=True, help_text="Квест скрывается с этого момента", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="quest",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["active_until", "active_from"],
+                name="quest_window_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="quest",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    ("active_from__isnull", True),
+                    ("active_until__isnull", True),
+                    ("active_until__gt", models.F("active_from")),
+                    _connector="OR",
+                ),
+                name="quest_window_valid",
+            ),
+        ),
+    ]
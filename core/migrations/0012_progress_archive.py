@@ -0,0 +1,92 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_quest_schedule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedProgress",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "На проверке"),
+                            ("approved", "Подтверждено"),
+                            ("rejected", "Отклонено"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("attempt", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "promo_code",
+                    models.CharField(
+                        blank=True,
+                        help_text="Выданный код; сам PromoCode удаляется",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "completed_at",
+                    models.DateTimeField(help_text="Когда отправлено фото"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(help_text="Когда вынесено решение"),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="userquestprogress",
+            index=models.Index(
+                condition=models.Q(("status", "pending"), _negated=True),
+                fields=["status_changed_at"],
+                name="progress_finished_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedprogress",
+            name="quest",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_progress",
+                to="core.quest",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedprogress",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_progress",
+                to="core.user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedprogress",
+            index=models.Index(
+                fields=["user", "quest"], name="core_archiv_user_id_45bf37_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedprogress",
+            index=models.Index(
+                condition=models.Q(("promo_code", ""), _negated=True),
+                fields=["promo_code"],
+                name="archived_promo_code_idx",
+            ),
+        ),
+    ]
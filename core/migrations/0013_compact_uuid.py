@@ -0,0 +1,112 @@
+# Generated by Django 5.0.2 on 2026-10-19 04:56
+
+import core.fields
+import uuid
+from django.db import migrations
+
+from core.fields import compact_uuid_columns
+
+
+def _convert(apps, schema_editor, function, sql_type):
+    # AlterField пересоздал таблицы, но скопировал значения как есть; в SQLite
+    # до 3.41 нет unhex(), поэтому перевод hex -> байты — функцией на Python
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.connection.connection.create_function(
+        "compact_uuid", 1, function, deterministic=True
+    )
+    quote = schema_editor.quote_name
+    for table, column in compact_uuid_columns(apps, "core"):
+        schema_editor.execute(
+            f"UPDATE {quote(table)} SET {quote(column)} = compact_uuid({quote(column)}) "
+            f"WHERE typeof({quote(column)}) = '{sql_type}'"
+        )
+
+
+def hex_to_blob(apps, schema_editor):
+    _convert(apps, schema_editor, lambda value: bytes.fromhex(value), "text")
+
+
+def blob_to_hex(apps, schema_editor):
+    _convert(apps, schema_editor, lambda value: value.hex(), "blob")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_progress_archive"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedprogress",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="progresstransition",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="promocode",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="promocodestock",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="quest",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="questrollup",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="route",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="routequest",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userquestprogress",
+            name="id",
+            field=core.fields.CompactUUIDField(
+                default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.RunPython(hex_to_blob, blob_to_hex),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-19 05:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def move_file_ids(apps, schema_editor):
+    # до загрузчика в photo лежал file_id из Telegram, а не путь к файлу
+    UserQuestProgress = apps.get_model("core", "UserQuestProgress")
+    UserQuestProgress.objects.exclude(photo="").exclude(photo__contains="/").update(
+        telegram_file_id=F("photo"), photo=""
+    )
+
+
+def restore_file_ids(apps, schema_editor):
+    # старый код умеет только пересылать фото по file_id — скачанные файлы остаются на диске
+    UserQuestProgress = apps.get_model("core", "UserQuestProgress")
+    UserQuestProgress.objects.exclude(telegram_file_id="").update(photo=F("telegram_file_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_compact_uuid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedprogress",
+            name="photo",
+            field=models.ImageField(
+                blank=True,
+                help_text="Путь к сохранённому фото (см. core.media)",
+                upload_to="quest_photos/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedprogress",
+            name="telegram_file_id",
+            field=models.CharField(
+                blank=True, help_text="file_id фото в Telegram", max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="media_attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0, help_text="Неудачных попыток скачать фото"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userquestprogress",
+            name="telegram_file_id",
+            field=models.CharField(
+                blank=True, help_text="file_id фото в Telegram", max_length=255
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userquestprogress",
+            name="photo",
+            field=models.ImageField(
+                blank=True,
+                help_text="Сохранённое фото; пусто, пока загрузчик не скачал его из Telegram (см. core.media)",
+                upload_to="quest_photos/",
+            ),
+        ),
+        migrations.RunPython(move_file_ids, restore_file_ids),
+        migrations.AddIndex(
+            model_name="userquestprogress",
+            index=models.Index(
+                condition=models.Q(
+                    ("photo", ""), models.Q(("telegram_file_id", ""), _negated=True)
+                ),
+                fields=["completed_at"],
+                name="progress_media_pending_idx",
+            ),
+        ),
+    ]
@@ -1,9 +1,13 @@
 import uuid
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .fields import CompactUUIDField
 
 
 class User(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     telegram_id = models.BigIntegerField(unique=True)
     name = models.CharField(max_length=255)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
@@ -15,8 +19,35 @@ class User(models.Model):
         return f"{self.name} ({self.telegram_id})"
 
 
+class QuestQuerySet(models.QuerySet):
+    def live(self, now=None):
+        """
+        Включённые квесты, у которых сейчас открыто окно показа
+        [active_from, active_until); пустая граница окна не ограничивает.
+        """
+        now = now or timezone.now()
+        return self.filter(
+            Q(active_from__isnull=True) | Q(active_from__lte=now),
+            Q(active_until__isnull=True) | Q(active_until__gt=now),
+            is_active=True,
+        )
+
+    def available_for(self, user):
+        """
+        Активные квесты, которые пользователь может выполнять: без попытки
+        на проверке и без подтверждённой. После отклонения квест снова доступен.
+        Подзапрос читается только из частичного индекса progress_open_attempt.
+        """
+        return self.live().exclude(Exists(
+            UserQuestProgress.objects.filter(OPEN_ATTEMPT, user=user, quest=OuterRef('pk'))
+        )).exclude(Exists(
+            # подтверждённые выполнения, перенесённые в архив (см. core.archive)
+            ArchivedProgress.objects.filter(user=user, quest=OuterRef('pk'), status=UserQuestProgress.Status.APPROVED)
+        ))
+
+
 class Quest(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     description = models.TextField()
     location = models.CharField(max_length=255)
@@ -24,48 +55,217 @@ class Quest(models.Model):
     longitude = models.FloatField(null=True, blank=True, help_text="Долгота")
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    active_from = models.DateTimeField(null=True, blank=True, help_text="Квест показывается с этого момента")
+    active_until = models.DateTimeField(null=True, blank=True, help_text="Квест скрывается с этого момента")
+
+    objects = QuestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset-пагинация каталога активных квестов
+            models.Index(fields=['created_at', 'id'], condition=Q(is_active=True), name='quest_catalog_idx'),
+            # окна показа включённых квестов: «что откроется/закроется» и фильтр доступности
+            models.Index(fields=['active_until', 'active_from'], condition=Q(is_active=True), name='quest_window_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(active_from__isnull=True) | Q(active_until__isnull=True) | Q(active_until__gt=F('active_from')),
+                name='quest_window_valid',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
 class PromoCode(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     code = models.CharField(max_length=50, unique=True)
     quest = models.ForeignKey(Quest, on_delete=models.CASCADE, related_name='promocodes')
     is_used = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['quest', 'is_used']),
+        ]
+
     def __str__(self):
         return f"{self.code} ({self.quest.name})"
 
 
+class PromoCodeStock(models.Model):
+    """
+    Счётчик свободных промокодов квеста.
+    Меняется в одной транзакции с выдачей и загрузкой промокодов (см. core.inventory).
+    """
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    quest = models.OneToOneField(Quest, on_delete=models.CASCADE, related_name='promo_stock')
+    available = models.PositiveIntegerField(default=0, help_text="Количество неиспользованных промокодов")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.quest.name}: {self.available}"
+
+
+# Открытая попытка — на проверке или подтверждённая; отклонённые не мешают повторить квест
+OPEN_ATTEMPT = ~Q(status='rejected')
+# Фото ещё не скачано из Telegram
+MEDIA_PENDING = Q(photo='') & ~Q(telegram_file_id='')
+
+
 class UserQuestProgress(models.Model):
     class Status(models.TextChoices):
         PENDING = 'pending', 'На проверке'
         APPROVED = 'approved', 'Подтверждено'
         REJECTED = 'rejected', 'Отклонено'
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quest_progress')
     quest = models.ForeignKey(Quest, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to='quest_photos/')
+    photo = models.ImageField(
+        upload_to='quest_photos/',
+        blank=True,
+        help_text="Сохранённое фото; пусто, пока загрузчик не скачал его из Telegram (см. core.media)"
+    )
+    telegram_file_id = models.CharField(max_length=255, blank=True, help_text="file_id фото в Telegram")
+    media_attempts = models.PositiveSmallIntegerField(default=0, help_text="Неудачных попыток скачать фото")
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     promo_code = models.ForeignKey(PromoCode, on_delete=models.SET_NULL, null=True, blank=True)
     completed_at = models.DateTimeField(auto_now_add=True)
     admin_comment = models.TextField(blank=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True, help_text="Когда вынесено решение")
+    reviewer = models.CharField(max_length=255, blank=True, help_text="Кто проверил: админ в Telegram или пользователь API")
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+    attempt = models.PositiveSmallIntegerField(default=1, help_text="Номер попытки: после отклонения можно отправить фото ещё раз")
 
     class Meta:
-        unique_together = ('user', 'quest')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quest', 'attempt'], name='progress_attempt_unique'),
+            # не больше одной открытой попытки (на проверке или подтверждённой) на квест
+            models.UniqueConstraint(fields=['user', 'quest'], condition=OPEN_ATTEMPT, name='progress_open_attempt'),
+        ]
+        indexes = [
+            # очередь на проверку и выборки для SLA (см. core.moderation)
+            models.Index(fields=['status', 'completed_at']),
+            models.Index(fields=['reviewed_at']),
+            # отбор завершённых записей для архивации (см. core.archive)
+            models.Index(fields=['status_changed_at'], condition=~Q(status='pending'), name='progress_finished_idx'),
+            # очередь загрузчика фото (см. core.media)
+            models.Index(fields=['completed_at'], condition=MEDIA_PENDING, name='progress_media_pending_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # статус на момент загрузки — по нему сигналы видят смену статуса
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     def __str__(self):
         return f"{self.user.name} - {self.quest.name} ({self.status})"
 
+
+class ProgressTransition(models.Model):
+    """
+    Журнал смен статуса выполнения квеста; пишется сигналом post_save.
+    """
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    progress = models.ForeignKey(UserQuestProgress, on_delete=models.CASCADE, related_name='transitions')
+    from_status = models.CharField(max_length=20, blank=True, choices=UserQuestProgress.Status.choices)
+    to_status = models.CharField(max_length=20, choices=UserQuestProgress.Status.choices)
+    actor = models.CharField(max_length=255, blank=True)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['progress', 'changed_at']),
+            models.Index(fields=['to_status', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.progress_id}: {self.from_status or '—'} → {self.to_status}"
+
+
+class ArchivedProgress(models.Model):
+    """
+    Завершённые выполнения квестов, перенесённые из UserQuestProgress
+    командой archive_progress (см. core.archive). Только то, что нужно для
+    истории и статистики, и фото как доказательство выполнения: без
+    комментариев и журнала переходов.
+    """
+    id = CompactUUIDField(primary_key=True, editable=False)  # id исходной записи
+    # отдельный индекс по user не нужен — его покрывает (user, quest)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_progress', db_index=False)
+    quest = models.ForeignKey(Quest, on_delete=models.CASCADE, related_name='archived_progress')
+    status = models.CharField(max_length=20, choices=UserQuestProgress.Status.choices)
+    attempt = models.PositiveSmallIntegerField(default=1)
+    promo_code = models.CharField(max_length=50, blank=True, help_text="Выданный код; сам PromoCode удаляется")
+    completed_at = models.DateTimeField(help_text="Когда отправлено фото")
+    finished_at = models.DateTimeField(help_text="Когда вынесено решение")
+    photo = models.ImageField(upload_to='quest_photos/', blank=True, help_text="Путь к сохранённому фото (см. core.media)")
+    telegram_file_id = models.CharField(max_length=255, blank=True, help_text="file_id фото в Telegram")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'quest']),
+            # выданные коды не загружаются повторно (см. core.inventory.add_promo_codes)
+            models.Index(fields=['promo_code'], condition=~Q(promo_code=''), name='archived_promo_code_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.quest_id} ({self.status})"
+
+
+class ProcessedUpdate(models.Model):
+    """
+    Ключи уже принятых апдейтов бота — защита от повторной доставки,
+    переживающая перезапуск (см. bot.idempotency).
+    """
+    key = models.CharField(max_length=128, primary_key=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class QuestRollup(models.Model):
+    """
+    Агрегаты по квесту за час или день (см. core.rollups).
+    Корзина — время отправки фото: approvals и rejections показывают,
+    чем закончились отправки этого часа/дня.
+    """
+    class Period(models.TextChoices):
+        HOUR = 'hour', 'Час'
+        DAY = 'day', 'День'
+
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    quest = models.ForeignKey(Quest, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=Period.choices)
+    bucket_start = models.DateTimeField()
+    submissions = models.PositiveIntegerField(default=0)
+    approvals = models.PositiveIntegerField(default=0)
+    rejections = models.PositiveIntegerField(default=0)
+    moderation_count = models.PositiveIntegerField(default=0, help_text="Сколько проверок попало в гистограмму")
+    moderation_seconds = models.FloatField(default=0, help_text="Суммарное время проверки, с")
+    moderation_histogram = models.JSONField(default=list, help_text="Число проверок по корзинам времени")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quest', 'period', 'bucket_start'], name='quest_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'bucket_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.quest.name}: {self.period} {self.bucket_start:%Y-%m-%d %H:%M}"
+
 class Route(models.Model):
     """
     Маршрут — упорядоченный набор квестов.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -78,7 +278,7 @@ class RouteQuest(models.Model):
     """
     Связь Route → Quest с порядком и дополнительными полями.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     route = models.ForeignKey(
         Route,
         on_delete=models.CASCADE,
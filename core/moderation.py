@@ -0,0 +1,163 @@
+"""
+Метки времени проверки и SLA модерации.
+
+При смене статуса UserQuestProgress сигнал pre_save проставляет
+status_changed_at и, для итоговых статусов, reviewed_at; post_save пишет
+строку в журнал ProgressTransition. Кто проверил (reviewer) задают сами
+пути подтверждения — команда в админском чате и API.
+
+Перцентили времени проверки считаются одним проходом по строкам через
+QuantileSketch — без сортировки и без хранения всех значений в памяти.
+
+После отклонения квест можно выполнить ещё раз: каждая отправка фото —
+новая попытка (UserQuestProgress.attempt), открытой (на проверке или
+подтверждённой) у пары пользователь–квест может быть только одна.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .inventory import allocate_promo_code
+from .models import ArchivedProgress, ProgressTransition, UserQuestProgress
+from .sketch import QuantileSketch
+
+FINAL_STATUSES = (UserQuestProgress.Status.APPROVED, UserQuestProgress.Status.REJECTED)
+SLA_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+SCAN_CHUNK_SIZE = 2000
+
+
+def submit_attempt(user, quest, file_id):
+    """
+    Заводит следующую попытку выполнения квеста с file_id фото из Telegram;
+    само фото потом скачает загрузчик (см. core.media).
+    None — у пользователя уже есть открытая попытка (например, два фото подряд).
+    """
+    # номер попытки читается вне транзакции: при гонке обе вставки получат
+    # один номер и вторую отсечёт уникальный индекс, а транзакция, которая
+    # начинается с INSERT, в SQLite не падает от записи из другого процесса
+    last = max(
+        source.filter(user=user, quest=quest).aggregate(last=Max('attempt'))['last'] or 0
+        for source in (UserQuestProgress.objects, ArchivedProgress.objects)
+    )
+    try:
+        with transaction.atomic():
+            return UserQuestProgress.objects.create(
+                user=user, quest=quest, telegram_file_id=file_id, attempt=last + 1,
+            )
+    except IntegrityError:
+        return None
+
+
+def approve_attempt(progress, reviewer, comment=None):
+    """
+    Подтверждает попытку и выдаёт промокод в одной транзакции.
+    Возвращает (промокод, остаток), (None, 0) — коды закончились,
+    None — попытку уже проверил другой админ.
+    """
+    with transaction.atomic():
+        promo_code, remaining = allocate_promo_code(progress.quest_id)
+        if not promo_code:
+            return None, 0
+        # статус перечитывается после первой записи: в SQLite транзакция уже держит
+        # блокировку, в PostgreSQL строку блокирует select_for_update — из двух
+        # одновременных подтверждений второе увидит решение первого
+        status = (
+            UserQuestProgress.objects.select_for_update()
+            .filter(pk=progress.pk).values_list('status', flat=True).first()
+        )
+        if status != UserQuestProgress.Status.PENDING:
+            # откат возвращает зарезервированный код и счётчик остатка
+            transaction.set_rollback(True)
+            return None
+        progress.status = UserQuestProgress.Status.APPROVED
+        progress.promo_code = promo_code
+        progress.reviewer = reviewer
+        if comment is not None:
+            progress.admin_comment = comment
+        progress.save()
+    return promo_code, remaining
+
+
+def stamp_status_change(progress):
+    """Вызывается из pre_save: ставит метки времени, если статус меняется"""
+    if not progress._state.adding:
+        previous = getattr(progress, '_loaded_status', progress.status)
+        if previous == progress.status:
+            return
+    now = timezone.now()
+    progress.status_changed_at = now
+    if progress.status in FINAL_STATUSES:
+        progress.reviewed_at = now
+    else:
+        progress.reviewed_at = None
+        progress.reviewer = ''
+
+
+def log_transition(progress, previous_status, created):
+    """Вызывается из post_save: пишет смену статуса в журнал"""
+    if not created and (previous_status is None or previous_status == progress.status):
+        return
+    ProgressTransition.objects.create(
+        progress=progress,
+        from_status='' if created else previous_status,
+        to_status=progress.status,
+        actor=progress.reviewer,
+        changed_at=progress.status_changed_at or timezone.now(),
+    )
+
+
+def reviewer_name(telegram_user=None, api_user=None):
+    if telegram_user is not None:
+        name = f"@{telegram_user.username}" if telegram_user.username else telegram_user.full_name
+        return f"tg:{telegram_user.id} {name}"[:255]
+    return f"api:{api_user.get_username()}"[:255]
+
+
+def _summary(sketch):
+    return {
+        'count': sketch.count,
+        'percentiles': {f'p{round(q * 100)}': sketch.quantile(q) for q in SLA_QUANTILES},
+        'max_seconds': sketch.max,
+    }
+
+
+def sla_report(since=None, until=None, quest_id=None):
+    """
+    Время проверки (reviewed_at - completed_at) для решений, вынесенных
+    в [since, until), и возраст текущей очереди на проверку, в секундах.
+    """
+    now = timezone.now()
+    since = since or now - datetime.timedelta(days=7)
+    reviewed = UserQuestProgress.objects.filter(reviewed_at__gte=since)
+    if until:
+        reviewed = reviewed.filter(reviewed_at__lt=until)
+    backlog = UserQuestProgress.objects.filter(status=UserQuestProgress.Status.PENDING)
+    if quest_id:
+        reviewed = reviewed.filter(quest_id=quest_id)
+        backlog = backlog.filter(quest_id=quest_id)
+
+    target = settings.MODERATION_SLA_SECONDS
+    review_time = QuantileSketch()
+    within_sla = 0
+    for completed_at, reviewed_at in reviewed.values_list('completed_at', 'reviewed_at').iterator(SCAN_CHUNK_SIZE):
+        seconds = max(0.0, (reviewed_at - completed_at).total_seconds())
+        review_time.add(seconds)
+        within_sla += seconds <= target
+
+    waiting = QuantileSketch()
+    for completed_at in backlog.values_list('completed_at', flat=True).iterator(SCAN_CHUNK_SIZE):
+        waiting.add(max(0.0, (now - completed_at).total_seconds()))
+
+    return {
+        'since': since,
+        'until': until,
+        'sla_seconds': target,
+        'reviewed': {
+            **_summary(review_time),
+            'within_sla_share': within_sla / review_time.count if review_time.count else None,
+        },
+        'backlog': _summary(waiting),
+    }
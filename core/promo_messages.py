@@ -0,0 +1,138 @@
+"""
+Готовый текст «Мои промокоды».
+
+Выданный промокод больше не меняется, поэтому список хранится в кэше уже
+отрендеренным и разбитым на сообщения не длиннее лимита Telegram; повторный
+показ не делает ни одного запроса к базе. Ключ — telegram_id пользователя.
+
+Коды из архива (core.archive) идут первыми: туда попадают только старые
+выдачи. Выдача кода (подтверждение в чате админов или через API) дописывает строку
+в конец последнего сообщения — список не пересобирается. Если подтверждение
+отозвано, кэш сбрасывается и список соберётся заново при следующем показе.
+
+Рядом со списком в кэше лежит номер версии пользователя: каждая выдача и
+отзыв кода увеличивают его атомарно (cache.incr), а список хранится вместе с
+версией, из которой собран. Дописать строку можно только к списку предыдущей
+версии; если два подтверждения разошлись или список собирался во время
+выдачи, версии не совпадут и список соберётся из базы заново. Пустой список
+не кэшируется — первый код появится сразу.
+
+Версия видна всем процессам, только если кэш общий (REDIS_URL). С кэшем в
+памяти процесса бот не узнает о коде, выданном через API, поэтому без
+REDIS_URL список хранится всего PROMO_MESSAGES_CACHE_TTL = 60 секунд.
+"""
+import html
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ArchivedProgress, UserQuestProgress
+
+HEADER = "Ваши промокоды:\n\n"
+MESSAGE_LIMIT = 4096
+CACHE_KEY = 'promo-messages:{}'
+VERSION_KEY = 'promo-messages-version:{}'
+
+
+def render_entry(quest_name, code):
+    return f"🎁 Квест: {html.escape(quest_name)}\n🎫 Промокод: {html.escape(code)}\n\n"
+
+
+def text_length(text):
+    """Длина так, как её считает Telegram, — в единицах UTF-16 (эмодзи занимают две)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def append_entry(messages, entry):
+    """Дописывает строку в последнее сообщение или начинает новое, если не влезает"""
+    if not messages:
+        messages.append(HEADER)
+    if text_length(messages[-1]) + text_length(entry) > MESSAGE_LIMIT:
+        messages.append(entry)
+    else:
+        messages[-1] += entry
+    return messages
+
+
+def build_messages(telegram_id):
+    archived = (
+        ArchivedProgress.objects
+        .filter(user__telegram_id=telegram_id, status=UserQuestProgress.Status.APPROVED)
+        .exclude(promo_code='')
+        .order_by('finished_at')
+        .values_list('quest__name', 'promo_code')
+    )
+    rows = (
+        UserQuestProgress.objects
+        .filter(
+            user__telegram_id=telegram_id,
+            status=UserQuestProgress.Status.APPROVED,
+            promo_code__isnull=False,
+        )
+        # в порядке выдачи — так же, как строки дописываются при подтверждении
+        .order_by('status_changed_at', 'completed_at')
+        .values_list('quest__name', 'promo_code__code')
+    )
+    messages = []
+    for quest_name, code in chain(archived, rows):
+        append_entry(messages, render_entry(quest_name, code))
+    return messages
+
+
+def promo_messages(telegram_id):
+    """Сообщения со списком промокодов; пустой список — кодов пока нет"""
+    key, version_key = CACHE_KEY.format(telegram_id), VERSION_KEY.format(telegram_id)
+    # версия читается до сборки: код, выданный во время сборки, сделает список устаревшим
+    cached = cache.get_many([key, version_key])
+    version = cached.get(version_key, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    messages = build_messages(telegram_id)
+    if messages:
+        cache.set(key, (version, messages), settings.PROMO_MESSAGES_CACHE_TTL)
+    return messages
+
+
+def bump_version(telegram_id):
+    """Новая версия списка пользователя или None, если ключ версии вытеснен из кэша"""
+    key = VERSION_KEY.format(telegram_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return None
+
+
+def add_issued_code(telegram_id, quest_name, code):
+    key = CACHE_KEY.format(telegram_id)
+    version = bump_version(telegram_id)
+    if version is None:
+        cache.delete(key)
+        return
+    entry = cache.get(key)
+    if entry is None or entry[0] != version - 1:
+        return  # соберётся целиком при следующем показе
+    messages = append_entry(entry[1], render_entry(quest_name, code))
+    cache.set(key, (version, messages), settings.PROMO_MESSAGES_CACHE_TTL)
+
+
+def invalidate(telegram_id):
+    bump_version(telegram_id)
+    cache.delete(CACHE_KEY.format(telegram_id))
+
+
+def record_status_change(progress, previous_status, created):
+    """Вызывается из post_save UserQuestProgress; кэш меняется после коммита транзакции"""
+    if not created and (previous_status is None or previous_status == progress.status):
+        return
+    if progress.status == UserQuestProgress.Status.APPROVED and progress.promo_code_id:
+        telegram_id = progress.user.telegram_id
+        quest_name = progress.quest.name
+        code = progress.promo_code.code
+        transaction.on_commit(lambda: add_issued_code(telegram_id, quest_name, code))
+    elif previous_status == UserQuestProgress.Status.APPROVED:
+        telegram_id = progress.user.telegram_id
+        transaction.on_commit(lambda: invalidate(telegram_id))
@@ -0,0 +1,128 @@
+"""
+Готовые карточки активных квестов для «🎯 Получить квест».
+
+Текст квеста (уже экранированный для parse_mode=HTML) и координаты всех
+активных квестов держатся в памяти процесса, так что выдача квеста стоит
+одного запроса по индексу — какой квест следующий у пользователя; сам Quest
+из базы не читается. Карточки загружаются при старте бота (warm) целиком
+одним запросом.
+
+Любое изменение квеста (сигналы сохранения и удаления, массовый импорт
+маршрутов) меняет метку версии в кэше Django. Процесс перед выдачей карточки
+сравнивает её со своей — один get из кэша — и при расхождении перечитывает
+квесты. Чтобы правки из API и админки сразу видели все процессы бота, кэш
+должен быть общим (REDIS_URL); иначе карточки всё равно перечитываются
+раз в QUEST_CACHE_MAX_AGE секунд.
+"""
+import html
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'quest-content-version'
+
+
+@dataclass(frozen=True)
+class QuestCard:
+    id: str
+    text: str
+    latitude: float | None
+    longitude: float | None
+
+    @property
+    def has_location(self):
+        return bool(self.latitude and self.longitude)
+
+
+def render_text(name, location, description):
+    return (
+        f"🎯 Квест: {html.escape(name)}\n\n"
+        f"📍 Локация: {html.escape(location)}\n\n"
+        f"📝 Описание:\n{html.escape(description)}\n\n"
+        "Для подтверждения выполнения квеста отправьте фото."
+    )
+
+
+def shared_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # ключ вытеснен или кэш только что поднят: add не перетрёт метку, которую успел записать другой процесс
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+class QuestContentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cards = {}  # id -> QuestCard
+        self._version = None
+        self._loaded_at = None
+
+    def load(self):
+        from .models import Quest
+
+        # метка читается до квестов: правка, пришедшая во время загрузки, вызовет ещё одну
+        version = shared_version()
+        rows = (
+            Quest.objects
+            .filter(is_active=True)
+            .values_list('id', 'name', 'location', 'description', 'latitude', 'longitude')
+        )
+        cards = {
+            str(quest_id): QuestCard(str(quest_id), render_text(name, location, description), latitude, longitude)
+            for quest_id, name, location, description, latitude, longitude in rows.iterator()
+        }
+        with self._lock:
+            self._cards = cards
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    warm = load
+
+    def is_stale(self):
+        if self._loaded_at is None:
+            return True
+        if time.monotonic() - self._loaded_at > settings.QUEST_CACHE_MAX_AGE:
+            return True
+        return cache.get(VERSION_KEY) != self._version
+
+    def get(self, quest_id):
+        """Карточка активного квеста или None, если квест неактивен или удалён"""
+        reloaded = self.is_stale()
+        if reloaded:
+            self.load()
+        card = self._cards.get(str(quest_id))
+        if card is None and not reloaded:
+            # квест включили в процессе, чья метка до нас не дошла (кэш не общий)
+            self.load()
+            card = self._cards.get(str(quest_id))
+        return card
+
+    def __len__(self):
+        return len(self._cards)
+
+    def invalidate(self):
+        """Сбрасывает карточки во всех процессах после коммита текущей транзакции"""
+        transaction.on_commit(self._reset)
+
+    def _reset(self):
+        with self._lock:
+            self._loaded_at = None
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+quest_cache = QuestContentCache()
+
+
+def next_quest_card(user):
+    """Карточка первого квеста, который пользователь ещё не начинал (или у которого отклонена попытка)"""
+    from .models import Quest
+
+    quest_id = Quest.objects.available_for(user).values_list('id', flat=True).first()
+    return None if quest_id is None else quest_cache.get(quest_id)
@@ -0,0 +1,93 @@
+"""
+Чтение с реплики.
+
+Реплика подключается алиасом 'replica' (DATABASE_REPLICA_NAME). ReplicaRouter
+отправляет на неё только чтения внутри db_scope(read_only=True): это явно
+перечисленные обработчики бота (BOT_REPLICA_HANDLERS) и list/retrieve в API.
+Все записи, чтения внутри транзакций и чтения вне таких блоков идут в default.
+
+Реплика отстаёт от основной базы, поэтому действует прилипание: после записи
+от имени пользователя (actor) или записи, затрагивающей его данные (сигналы
+core.signals), его чтения DATABASE_REPLICA_STICKY_SECONDS секунд обслуживает
+основная база — только что выданный промокод виден сразу. Отметки хранятся
+в кэше Django; чтобы их видели все процессы (бот, воркеры, API), кэш должен
+быть общим (REDIS_URL).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+STICKY_KEY = 'db-sticky:{}'
+
+
+class _Scope:
+    __slots__ = ('actor', 'read_only', 'wrote')
+
+    def __init__(self, actor, read_only):
+        self.actor = actor
+        self.read_only = read_only
+        self.wrote = False
+
+
+_current_scope: ContextVar = ContextVar('db_scope', default=None)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def bot_actor(telegram_id):
+    return f'tg:{telegram_id}'
+
+
+def api_actor(user):
+    return f'api:{user.pk}' if user is not None and user.is_authenticated else None
+
+
+def mark_written(actor):
+    if actor and replica_enabled():
+        cache.set(STICKY_KEY.format(actor), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def recently_written(actor):
+    return bool(actor) and cache.get(STICKY_KEY.format(actor)) is not None
+
+
+@contextmanager
+def db_scope(actor=None, read_only=False):
+    """
+    Запросы внутри блока выполняются от имени actor. read_only — чтения можно
+    обслуживать с реплики, если actor недавно ничего не писал.
+    """
+    scope = _Scope(actor, read_only and replica_enabled() and not recently_written(actor))
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _current_scope.get()
+        if scope is None or not scope.read_only or scope.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        scope = _current_scope.get()
+        if scope is not None and not scope.wrote:
+            # дальнейшие чтения этого блока и ближайшие чтения actor — из основной базы
+            scope.wrote = True
+            mark_written(scope.actor)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на реплике те же данные, что и в основной базе
+        return True
@@ -0,0 +1,172 @@
+"""
+Часовые и дневные агрегаты по квестам: отправки, подтверждения, отклонения
+и распределение времени проверки.
+
+Корзина агрегата — час/день отправки фото (completed_at) в часовом поясе
+проекта, поэтому живое обновление и пересчёт из истории дают одно и то же:
+approvals и rejections корзины — это итоги отправок этой корзины. Смена
+статуса (в том числе повторная проверка) переносит единицу между счётчиками.
+
+Время проверки копится гистограммой по MODERATION_BUCKETS: медиана и
+перцентили считаются по ней за постоянное время, без чтения UserQuestProgress.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedProgress, QuestRollup, UserQuestProgress
+
+# Верхние границы корзин гистограммы времени проверки, в секундах;
+# последняя корзина — всё, что дольше недели
+MODERATION_BUCKETS = (
+    60, 5 * 60, 15 * 60, 30 * 60, 3600, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 7 * 86400,
+)
+
+OUTCOME_FIELDS = {
+    UserQuestProgress.Status.APPROVED: 'approvals',
+    UserQuestProgress.Status.REJECTED: 'rejections',
+}
+
+COUNTER_FIELDS = ('submissions', 'approvals', 'rejections')
+ROLLUP_FIELDS = COUNTER_FIELDS + ('moderation_count', 'moderation_seconds')
+
+# По сколько строк истории читать при пересчёте
+SCAN_CHUNK_SIZE = 2000
+
+
+def bucket_start(moment, period):
+    local = timezone.localtime(moment)
+    if period == QuestRollup.Period.HOUR:
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def histogram_add(histogram, seconds):
+    histogram = list(histogram) + [0] * (len(MODERATION_BUCKETS) + 1 - len(histogram))
+    histogram[bisect_left(MODERATION_BUCKETS, seconds)] += 1
+    return histogram
+
+
+def histogram_quantile(histogram, q):
+    """Квантиль q (0..1) по гистограмме с линейной интерполяцией внутри корзины"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = MODERATION_BUCKETS[index - 1] if index else 0
+            if index >= len(MODERATION_BUCKETS):
+                return float(lower)
+            return lower + (MODERATION_BUCKETS[index] - lower) * (target - seen) / count
+        seen += count
+    return None
+
+
+def apply(quest_id, submitted_at, deltas, moderation_seconds=None):
+    """
+    Прибавляет deltas ({поле: приращение}) к часовой и дневной корзинам
+    отправки и, если передано, кладёт время проверки в гистограмму.
+    """
+    with transaction.atomic():
+        for period in QuestRollup.Period.values:
+            start = bucket_start(submitted_at, period)
+            QuestRollup.objects.bulk_create(
+                [QuestRollup(quest_id=quest_id, period=period, bucket_start=start)],
+                ignore_conflicts=True,
+            )
+            rollups = QuestRollup.objects.filter(quest_id=quest_id, period=period, bucket_start=start)
+            # сначала UPDATE: строка блокируется до конца транзакции и в SQLite,
+            # где select_for_update ничего не делает
+            rollups.update(**{field: F(field) + delta for field, delta in deltas.items()})
+            if moderation_seconds is None:
+                continue
+            rollup = rollups.select_for_update().get()
+            rollup.moderation_histogram = histogram_add(rollup.moderation_histogram, moderation_seconds)
+            rollup.moderation_count += 1
+            rollup.moderation_seconds += moderation_seconds
+            rollup.save(update_fields=['moderation_histogram', 'moderation_count', 'moderation_seconds'])
+
+
+def record_status_change(progress, previous_status, created):
+    """Вызывается из post_save UserQuestProgress"""
+    deltas = {}
+    if created:
+        deltas['submissions'] = 1
+    elif previous_status is None or previous_status == progress.status:
+        return
+    elif previous_status in OUTCOME_FIELDS:
+        deltas[OUTCOME_FIELDS[previous_status]] = -1
+    if progress.status in OUTCOME_FIELDS:
+        field = OUTCOME_FIELDS[progress.status]
+        deltas[field] = deltas.get(field, 0) + 1
+    if not deltas:
+        return
+
+    moderation_seconds = None
+    if previous_status == UserQuestProgress.Status.PENDING and progress.status in OUTCOME_FIELDS:
+        reviewed_at = progress.reviewed_at or timezone.now()
+        moderation_seconds = max(0.0, (reviewed_at - progress.completed_at).total_seconds())
+    apply(progress.quest_id, progress.completed_at, deltas, moderation_seconds)
+
+
+def rebuild_window(start, end):
+    """
+    Пересчитывает корзины [start, end) из UserQuestProgress и ArchivedProgress: счётчики и
+    гистограммы времени проверки (reviewed_at - completed_at) за один проход.
+    Для отправок, которые проверили повторно, время берётся до последнего
+    решения, а живой путь учитывает первое.
+    Границы должны совпадать с началом дня, чтобы дневные корзины не резались.
+    Возвращает число записанных корзин.
+    """
+    rollups = {}
+    seen = set()
+    with transaction.atomic():
+        # сначала обнуление: UPDATE берёт блокировку (в SQLite — на всю базу, в PostgreSQL —
+        # на корзины окна), и живой F()-инкремент, пришедший во время прохода по истории,
+        # дождётся конца пересчёта и прибавится к его результату, а не затрётся им
+        QuestRollup.objects.filter(
+            bucket_start__gte=start, bucket_start__lt=end,
+        ).update(**{field: 0 for field in ROLLUP_FIELDS}, moderation_histogram=[])
+
+        # архивные записи — тоже история этих корзин; finished_at у них — это reviewed_at.
+        # Живые записи читаются первыми: запись, которую перенесли в архив между
+        # чтениями, встретится дважды и второй раз будет пропущена по id
+        sources = (
+            UserQuestProgress.objects.values_list('id', 'quest_id', 'status', 'completed_at', 'reviewed_at'),
+            ArchivedProgress.objects.values_list('id', 'quest_id', 'status', 'completed_at', 'finished_at'),
+        )
+        for source in sources:
+            rows = source.filter(completed_at__gte=start, completed_at__lt=end).order_by()
+            for progress_id, quest_id, status, completed_at, reviewed_at in rows.iterator(SCAN_CHUNK_SIZE):
+                if progress_id in seen:
+                    continue
+                seen.add(progress_id)
+                seconds = None
+                if status in OUTCOME_FIELDS and reviewed_at is not None:
+                    seconds = max(0.0, (reviewed_at - completed_at).total_seconds())
+                for period in QuestRollup.Period.values:
+                    key = (quest_id, period, bucket_start(completed_at, period))
+                    rollup = rollups.get(key)
+                    if rollup is None:
+                        rollup = rollups[key] = QuestRollup(quest_id=quest_id, period=period, bucket_start=key[2])
+                    rollup.submissions += 1
+                    if status in OUTCOME_FIELDS:
+                        setattr(rollup, OUTCOME_FIELDS[status], getattr(rollup, OUTCOME_FIELDS[status]) + 1)
+                    if seconds is not None:
+                        rollup.moderation_histogram = histogram_add(rollup.moderation_histogram, seconds)
+                        rollup.moderation_count += 1
+                        rollup.moderation_seconds += seconds
+
+        QuestRollup.objects.bulk_create(
+            rollups.values(),
+            batch_size=SCAN_CHUNK_SIZE,
+            update_conflicts=True,
+            unique_fields=['quest', 'period', 'bucket_start'],
+            update_fields=[*ROLLUP_FIELDS, 'moderation_histogram'],
+        )
+    return len(rollups)
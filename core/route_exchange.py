@@ -0,0 +1,363 @@
+"""
+Перенос маршрутов между окружениями.
+
+Форматы:
+  jsonl   — одна строка на маршрут: название, описание и точки по порядку,
+            у каждой точки квест целиком, подсказка, ссылки на медиа и координаты;
+  geojson — FeatureCollection, точка маршрута — Feature с геометрией Point,
+            маршрут и квест лежат в properties; точки одного маршрута идут подряд.
+
+Экспорт отдаётся кусками (генератором) и читает базу пачками, импорт читает
+файл потоково. Импорт — идемпотентный upsert по естественным ключам
+Route.name и Quest.name (если в базе несколько квестов с одним названием,
+импорт отменяется): пачка маршрутов разрешается парой запросов name__in,
+дальше bulk_create/bulk_update. Точки существующего маршрута сравниваются
+с файлом и заменяются целиком, только если что-то поменялось, поэтому
+повторный импорт того же файла не пишет в базу ничего.
+"""
+import codecs
+import json
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import PromoCodeStock, Quest, Route, RouteQuest
+from .route_import import RouteImportError, iter_geojson_features
+from .quest_cache import quest_cache
+from .search import quest_index
+
+FORMATS = ('jsonl', 'geojson')
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+QUEST_FIELDS = ('description', 'location', 'latitude', 'longitude', 'is_active')
+
+
+def detect_format(file_name):
+    extension = (file_name or '').rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension in ('geojson', 'json'):
+        return 'geojson'
+    return None
+
+
+# --- экспорт ---
+
+def route_records(routes=None):
+    """Маршруты в виде словарей обмена; база читается пачками по EXPORT_CHUNK_SIZE"""
+    routes = (routes if routes is not None else Route.objects.all()).order_by('name').prefetch_related(
+        Prefetch('route_quests', queryset=RouteQuest.objects.select_related('quest').order_by('order'))
+    )
+    for route in routes.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'name': route.name,
+            'description': route.description,
+            'points': [
+                {
+                    'quest': {
+                        'name': point.quest.name,
+                        **{field: getattr(point.quest, field) for field in QUEST_FIELDS},
+                    },
+                    'hint_text': point.hint_text,
+                    'photo': point.photo.name or None,
+                    'audio': point.audio.name or None,
+                    'latitude': point.latitude,
+                    'longitude': point.longitude,
+                }
+                for point in route.route_quests.all()
+            ],
+        }
+
+
+def export_jsonl(routes=None):
+    for record in route_records(routes):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_geojson(routes=None):
+    yield '{"type": "FeatureCollection", "features": [\n'
+    separator = ''
+    for record in route_records(routes):
+        for order, point in enumerate(record['points'], start=1):
+            quest = point['quest']
+            latitude = point['latitude'] if point['latitude'] is not None else quest['latitude']
+            longitude = point['longitude'] if point['longitude'] is not None else quest['longitude']
+            feature = {
+                'type': 'Feature',
+                'geometry': (
+                    {'type': 'Point', 'coordinates': [longitude, latitude]}
+                    if latitude is not None and longitude is not None else None
+                ),
+                'properties': {
+                    'route': record['name'],
+                    'route_description': record['description'],
+                    'order': order,
+                    'quest': quest,
+                    'hint_text': point['hint_text'],
+                    'photo': point['photo'],
+                    'audio': point['audio'],
+                    'latitude': point['latitude'],
+                    'longitude': point['longitude'],
+                },
+            }
+            yield separator + json.dumps(feature, ensure_ascii=False)
+            separator = ',\n'
+    yield '\n]}\n'
+
+
+EXPORTERS = {
+    'jsonl': export_jsonl,
+    'geojson': export_geojson,
+}
+
+
+# --- чтение файлов ---
+
+def read_jsonl(stream):
+    for number, line in enumerate(codecs.iterdecode(stream, 'utf-8-sig'), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise RouteImportError([f'Строка {number}: не JSON ({e.msg})'])
+        yield validate_record(record, f'Строка {number}')
+
+
+def read_geojson(stream):
+    """Собирает маршруты из подряд идущих точек с одинаковым properties.route"""
+    record = None
+    finished = set()
+    for number, feature in enumerate(iter_geojson_features(stream), start=1):
+        properties = feature.get('properties') if isinstance(feature, dict) else None
+        if not isinstance(properties, dict) or not properties.get('route'):
+            raise RouteImportError([f'Точка {number}: нет properties.route'])
+        if record is None or record['name'] != properties['route']:
+            if record is not None:
+                finished.add(record['name'])
+                yield validate_record(record, f"Маршрут «{record['name']}»")
+            if properties['route'] in finished:
+                raise RouteImportError([f"Точка {number}: точки маршрута «{properties['route']}» идут не подряд"])
+            record = {
+                'name': properties['route'],
+                'description': properties.get('route_description', ''),
+                'points': [],
+            }
+        record['points'].append({key: properties.get(key) for key in (
+            'quest', 'hint_text', 'photo', 'audio', 'latitude', 'longitude',
+        )})
+    if record is not None:
+        yield validate_record(record, f"Маршрут «{record['name']}»")
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'geojson': read_geojson,
+}
+
+
+def _optional_float(value, where, errors):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    errors.append(f'{where}: координата должна быть числом')
+    return None
+
+
+def _flag(value, where, errors):
+    """Флаг из файла: true/false; если поля нет — True"""
+    if value is None:
+        return True
+    if isinstance(value, bool):
+        return value
+    errors.append(f'{where}: is_active должен быть true или false')
+    return True
+
+
+def validate_record(record, where):
+    """Проверяет маршрут из файла и приводит его к виду для import_routes"""
+    errors = []
+    if not isinstance(record, dict):
+        raise RouteImportError([f'{where}: ожидается объект маршрута'])
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip() or len(name) > Route._meta.get_field('name').max_length:
+        errors.append(f'{where}: неверное название маршрута')
+    points = record.get('points')
+    if not isinstance(points, list):
+        errors.append(f'{where}: нет списка points')
+        points = []
+
+    clean_points = []
+    seen = set()
+    for number, point in enumerate(points, start=1):
+        point_where = f'{where}, точка {number}'
+        quest = point.get('quest') if isinstance(point, dict) else None
+        quest_name = quest.get('name') if isinstance(quest, dict) else None
+        if not isinstance(quest_name, str) or not quest_name.strip():
+            errors.append(f'{point_where}: нет quest.name')
+            continue
+        if quest_name in seen:
+            errors.append(f'{point_where}: квест «{quest_name}» повторяется в маршруте')
+        seen.add(quest_name)
+        clean_points.append({
+            'quest': {
+                'name': quest_name,
+                'description': str(quest.get('description') or ''),
+                'location': str(quest.get('location') or ''),
+                'latitude': _optional_float(quest.get('latitude'), point_where, errors),
+                'longitude': _optional_float(quest.get('longitude'), point_where, errors),
+                'is_active': _flag(quest.get('is_active'), point_where, errors),
+            },
+            'hint_text': str(point.get('hint_text') or ''),
+            'photo': point.get('photo') or None,
+            'audio': point.get('audio') or None,
+            'latitude': _optional_float(point.get('latitude'), point_where, errors),
+            'longitude': _optional_float(point.get('longitude'), point_where, errors),
+        })
+
+    if errors:
+        raise RouteImportError(errors)
+    return {'name': name, 'description': str(record.get('description') or ''), 'points': clean_points}
+
+
+# --- импорт ---
+
+def import_routes(records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Upsert маршрутов из итератора проверенных записей одной транзакцией.
+    Возвращает Counter: routes_created, routes_updated, routes_unchanged,
+    quests_created, quests_updated и points — сколько точек записано.
+    """
+    stats = Counter()
+    with transaction.atomic():
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _import_batch(batch, stats)
+                batch = []
+        if batch:
+            _import_batch(batch, stats)
+    return stats
+
+
+def _upsert_quests(records, stats):
+    """Квесты пачки по названию: новые создаются, изменившиеся обновляются"""
+    wanted = {}
+    for record in records:
+        for point in record['points']:
+            wanted[point['quest']['name']] = point['quest']
+
+    quests = {}
+    ambiguous = []
+    for quest in Quest.objects.filter(name__in=wanted).order_by('created_at'):
+        if quest.name in quests:
+            ambiguous.append(quest.name)
+        quests.setdefault(quest.name, quest)
+    if ambiguous:
+        # Quest.name не уникален: какой из одноимённых квестов обновлять, по файлу не понять
+        raise RouteImportError([
+            f'Квест «{name}»: в базе несколько квестов с таким названием, переименуйте лишние'
+            for name in dict.fromkeys(ambiguous)
+        ])
+
+    created, changed = [], []
+    for name, fields in wanted.items():
+        quest = quests.get(name)
+        if quest is None:
+            quest = Quest(**fields)
+            created.append(quest)
+            quests[name] = quest
+        elif any(getattr(quest, field) != fields[field] for field in QUEST_FIELDS):
+            for field in QUEST_FIELDS:
+                setattr(quest, field, fields[field])
+            changed.append(quest)
+
+    Quest.objects.bulk_create(created)
+    # bulk-операции не шлют сигналы — счётчики промокодов, поиск и карточки квестов обновляем сами
+    PromoCodeStock.objects.bulk_create(PromoCodeStock(quest=quest) for quest in created)
+    # bulk_update строит CASE WHEN на каждую строку и на тысячах квестов тратит
+    # секунды на сборку SQL; квесты с одинаковыми новыми значениями (обычно
+    # их большинство) обновляются одним UPDATE ... WHERE id IN (...)
+    groups = {}
+    for quest in changed:
+        groups.setdefault(tuple(getattr(quest, field) for field in QUEST_FIELDS), []).append(quest.pk)
+    for values, ids in groups.items():
+        Quest.objects.filter(pk__in=ids).update(**dict(zip(QUEST_FIELDS, values)))
+    touched = created + changed
+    transaction.on_commit(lambda: [quest_index.update(quest) for quest in touched])
+    if touched:
+        quest_cache.invalidate()
+
+    stats['quests_created'] += len(created)
+    stats['quests_updated'] += len(changed)
+    return quests
+
+
+def _import_batch(records, stats):
+    # один и тот же маршрут дважды в пачке — побеждает последняя запись
+    records = list({record['name']: record for record in records}.values())
+    quests = _upsert_quests(records, stats)
+
+    routes = {route.name: route for route in Route.objects.filter(name__in=[r['name'] for r in records])}
+    current_points = {}
+    for route_id, *point in (
+        RouteQuest.objects
+        .filter(route__in=routes.values())
+        .order_by('route', 'order')
+        .values_list('route', 'quest', 'hint_text', 'photo', 'audio', 'latitude', 'longitude')
+    ):
+        current_points.setdefault(route_id, []).append(_point_key(*point))
+
+    created, described, replaced = [], [], []
+    for record in records:
+        route = routes.get(record['name'])
+        if route is None:
+            route = Route(name=record['name'], description=record['description'])
+            created.append(route)
+            routes[route.name] = route
+            continue
+        if route.description != record['description']:
+            route.description = record['description']
+            described.append(route)
+        wanted = [
+            _point_key(quests[point['quest']['name']].pk, point['hint_text'], point['photo'], point['audio'],
+                       point['latitude'], point['longitude'])
+            for point in record['points']
+        ]
+        if current_points.get(route.pk, []) != wanted:
+            replaced.append(route)
+
+    Route.objects.bulk_create(created)
+    Route.objects.bulk_update(described, ['description'])
+    # у изменившихся маршрутов точки заменяются целиком: порядок мог поменяться
+    RouteQuest.objects.filter(route__in=replaced).delete()
+    rewritten = {route.name for route in created + replaced}
+    points = [
+        RouteQuest(
+            route=routes[record['name']],
+            quest=quests[point['quest']['name']],
+            order=order,
+            hint_text=point['hint_text'],
+            photo=point['photo'],
+            audio=point['audio'],
+            latitude=point['latitude'],
+            longitude=point['longitude'],
+        )
+        for record in records if record['name'] in rewritten
+        for order, point in enumerate(record['points'], start=1)
+    ]
+    RouteQuest.objects.bulk_create(points)
+
+    updated = {route.name for route in described + replaced}
+    stats['routes_created'] += len(created)
+    stats['routes_updated'] += len(updated)
+    stats['routes_unchanged'] += len(records) - len(created) - len(updated)
+    stats['points'] += len(points)
+
+
+def _point_key(quest_id, hint_text, photo, audio, latitude, longitude):
+    """Точка в виде, пригодном для сравнения записи из файла с базой"""
+    return quest_id, hint_text, photo or None, audio or None, latitude, longitude
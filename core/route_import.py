@@ -0,0 +1,299 @@
+"""
+Сохранение маршрутов из конструктора и пакетный импорт точек из файлов.
+
+Точки маршрута — словари из FSM конструктора: либо quest_id существующего
+квеста, либо new_quest с полями нового квеста, плюс hint_text, photo_file,
+audio_file и координаты. Маршрут, новые квесты, их счётчики промокодов и
+RouteQuest пишутся в одной транзакции через bulk_create.
+
+Файлы с точками (CSV, GPX, GeoJSON) разбираются потоково: строки и элементы
+читаются по одному, так что в памяти одновременно лежит только список уже
+проверенных точек, а не весь документ.
+"""
+import codecs
+import csv
+import io
+import itertools
+import json
+import re
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import PromoCodeStock, Quest, Route, RouteQuest
+from .quest_cache import quest_cache
+from .search import quest_index
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 10
+
+
+class RouteImportError(ValueError):
+    """Файл не прошёл проверку; errors — сообщения с номерами строк/точек"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('\n'.join(errors))
+
+
+def save_route(name, description, points):
+    """Создаёт маршрут со всеми точками одной транзакцией, возвращает Route"""
+    with transaction.atomic():
+        route = Route.objects.create(name=name, description=description)
+
+        new_quests = [
+            Quest(**point['new_quest']) for point in points if point.get('new_quest')
+        ]
+        Quest.objects.bulk_create(new_quests)
+        # bulk_create не шлёт post_save — счётчики, поиск и карточки квестов обновляем сами
+        PromoCodeStock.objects.bulk_create(PromoCodeStock(quest=quest) for quest in new_quests)
+
+        created = iter(new_quests)
+        RouteQuest.objects.bulk_create(
+            RouteQuest(
+                route=route,
+                quest_id=next(created).id if point.get('new_quest') else point['quest_id'],
+                order=order,
+                hint_text=point.get('hint_text', ''),
+                photo=point.get('photo_file'),
+                audio=point.get('audio_file'),
+                latitude=point.get('latitude'),
+                longitude=point.get('longitude'),
+            )
+            for order, point in enumerate(points, start=1)
+        )
+        transaction.on_commit(lambda: [quest_index.update(quest) for quest in new_quests])
+        if new_quests:
+            quest_cache.invalidate()
+    return route
+
+
+def _text_stream(stream):
+    """Байтовый файл → текст с учётом BOM, который добавляет Excel"""
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def _first(mapping, *keys):
+    for key in keys:
+        value = mapping.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _raw_point(name, latitude, longitude, description=None, location=None, hint=None):
+    return {
+        'name': name,
+        'latitude': latitude,
+        'longitude': longitude,
+        'description': description,
+        'location': location,
+        'hint': hint,
+    }
+
+
+def iter_csv_points(stream):
+    """
+    CSV с заголовком: name, latitude (lat), longitude (lon, lng),
+    необязательные description, location (address), hint
+    """
+    lines = _text_stream(stream)
+    header = lines.readline()
+    # Excel в русской локали сохраняет CSV через точку с запятой
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    for row in csv.DictReader(itertools.chain([header], lines), delimiter=delimiter):
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        yield _raw_point(
+            row.get('name'),
+            _first(row, 'latitude', 'lat'),
+            _first(row, 'longitude', 'lon', 'lng'),
+            description=row.get('description'),
+            location=_first(row, 'location', 'address'),
+            hint=row.get('hint'),
+        )
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_gpx_points(stream):
+    """Точки GPX: путевые точки <wpt> и точки маршрута <rtept>"""
+    for _, element in iterparse(stream, events=('end',)):
+        if _local_name(element.tag) not in ('wpt', 'rtept'):
+            continue
+        children = {_local_name(child.tag): (child.text or '').strip() for child in element}
+        yield _raw_point(
+            children.get('name'),
+            element.get('lat'),
+            element.get('lon'),
+            description=children.get('desc'),
+            location=children.get('type'),
+            hint=children.get('cmt'),
+        )
+        # разобранная точка больше не нужна — не даём дереву расти
+        element.clear()
+
+
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+
+
+def iter_geojson_features(stream):
+    """
+    Элементы массива "features" по одному: буфер дочитывается кусками,
+    а каждый объект вынимается JSONDecoder.raw_decode, как только он целиком
+    оказался в буфере.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = stream.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer += text.decode(chunk, final=eof)
+
+    while True:
+        match = FEATURES_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if eof:
+            raise RouteImportError(['В GeoJSON нет массива "features"'])
+        # ключ может разорваться на границе куска — оставляем хвост
+        buffer = buffer[-32:]
+        read_more()
+
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                feature, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise RouteImportError(['GeoJSON оборван или повреждён'])
+            else:
+                yield feature
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise RouteImportError(['GeoJSON оборван или повреждён'])
+        read_more()
+
+
+def iter_geojson_points(stream):
+    """FeatureCollection с геометриями Point; свойства name, description, location, hint"""
+    for feature in iter_geojson_features(stream):
+        if not isinstance(feature, dict):
+            feature = {}
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        coordinates = geometry.get('coordinates') if geometry.get('type') == 'Point' else None
+        if isinstance(coordinates, list) and len(coordinates) >= 2:
+            longitude, latitude = coordinates[:2]
+        else:
+            longitude, latitude = None, None
+        yield _raw_point(
+            properties.get('name'),
+            latitude,
+            longitude,
+            description=properties.get('description'),
+            location=_first(properties, 'location', 'address'),
+            hint=properties.get('hint'),
+        )
+
+
+PARSERS = {
+    'csv': iter_csv_points,
+    'gpx': iter_gpx_points,
+    'geojson': iter_geojson_points,
+    'json': iter_geojson_points,
+}
+
+
+def detect_format(file_name):
+    extension = (file_name or '').rsplit('.', 1)[-1].lower()
+    return extension if extension in PARSERS else None
+
+
+def _coordinate(value, limit):
+    if isinstance(value, str):
+        value = value.replace(',', '.')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if -limit <= value <= limit else None
+
+
+def parse_points(stream, file_format, existing_quest_ids=(), max_points=None):
+    """
+    Проверяет точки из файла и превращает их в точки конструктора.
+    Квест с таким же названием, уже заведённый в базе, переиспользуется,
+    иначе точка создаёт новый квест. Все ошибки собираются разом и
+    поднимаются как RouteImportError.
+    """
+    max_points = max_points or settings.ROUTE_IMPORT_MAX_POINTS
+    name_field = Quest._meta.get_field('name').max_length
+    raw_points = []
+    errors = []
+    seen = set()
+    try:
+        for number, raw in enumerate(PARSERS[file_format](stream), start=1):
+            if number > max_points:
+                errors.append(f'В файле больше {max_points} точек')
+                break
+            name = str(raw['name'] or '').strip()
+            latitude = _coordinate(raw['latitude'], 90)
+            longitude = _coordinate(raw['longitude'], 180)
+            if not name:
+                errors.append(f'Точка {number}: нет названия')
+            elif len(name) > name_field:
+                errors.append(f'Точка {number}: название длиннее {name_field} символов')
+            elif name in seen:
+                errors.append(f'Точка {number}: квест «{name}» уже есть в маршруте')
+            if latitude is None or longitude is None:
+                errors.append(f'Точка {number}: неверные координаты')
+            seen.add(name)
+            raw.update(name=name, latitude=latitude, longitude=longitude)
+            raw_points.append(raw)
+    except (csv.Error, UnicodeDecodeError, SyntaxError) as e:
+        errors.append(f'Не удалось прочитать файл: {e}')
+    if not raw_points and not errors:
+        errors.append('В файле нет ни одной точки')
+
+    existing = {}
+    for quest_id, name in Quest.objects.filter(name__in=seen).values_list('id', 'name'):
+        existing.setdefault(name, str(quest_id))
+    existing_quest_ids = set(existing_quest_ids)
+    for number, raw in enumerate(raw_points, start=1):
+        if existing.get(raw['name']) in existing_quest_ids:
+            errors.append(f'Точка {number}: квест «{raw["name"]}» уже есть в маршруте')
+
+    if errors:
+        raise RouteImportError(errors[:MAX_REPORTED_ERRORS])
+
+    points = []
+    for raw in raw_points:
+        point = {
+            'hint_text': str(raw['hint'] or ''),
+            'latitude': raw['latitude'],
+            'longitude': raw['longitude'],
+        }
+        if raw['name'] in existing:
+            point['quest_id'] = existing[raw['name']]
+        else:
+            point['new_quest'] = {
+                'name': raw['name'],
+                'description': str(raw['description'] or ''),
+                'location': str(raw['location'] or f"{raw['latitude']:.5f}, {raw['longitude']:.5f}")[:255],
+                'latitude': raw['latitude'],
+                'longitude': raw['longitude'],
+            }
+        points.append(point)
+    return points
@@ -0,0 +1,36 @@
+"""
+Включение, выключение и расписание квестов пачкой.
+
+Квест доступен пользователям, пока он включён (is_active) и текущий момент
+попадает в окно [active_from, active_until) — это проверяет сам запрос
+доступности (Quest.objects.live), так что квесты открываются и закрываются
+по расписанию без фоновых задач.
+
+Пачка квестов меняется одним UPDATE по списку id. Такой UPDATE не шлёт
+сигналов, поэтому поиск и карточки квестов обновляются здесь, после коммита.
+"""
+from django.db import transaction
+
+from .models import Quest
+from .quest_cache import quest_cache
+from .search import quest_index
+
+SCHEDULE_FIELDS = ('is_active', 'active_from', 'active_until')
+
+
+def schedule_quests(ids, **fields):
+    """Выставляет квестам с данными id поля из SCHEDULE_FIELDS; возвращает число изменённых"""
+    unknown = set(fields) - set(SCHEDULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Нельзя менять пачкой: {', '.join(sorted(unknown))}")
+    ids = list(ids)
+    with transaction.atomic():
+        updated = Quest.objects.filter(pk__in=ids).update(**fields)
+        if updated and 'is_active' in fields:
+            # окно показа проверяется запросом доступности, а поиск и карточки знают только is_active
+            transaction.on_commit(lambda: [
+                quest_index.update(quest)
+                for quest in Quest.objects.filter(pk__in=ids).only('id', 'name', 'location', 'is_active')
+            ])
+            quest_cache.invalidate()
+    return updated
@@ -0,0 +1,221 @@
+"""
+Поиск квестов по названию и локации.
+
+Индекс держится в памяти процесса и строится одним запросом values_list:
+в боте — при старте (warm, рядом с карточками квестов), чтобы первый поиск
+не ждал сборку индекса, в остальных процессах (API) — при первом поиске.
+Дальше он обновляется точечно по сигналам сохранения
+и удаления Quest, а раз в QUEST_SEARCH_MAX_AGE секунд перестраивается
+в фоновом потоке, чтобы подхватить изменения из других процессов (API,
+админка); пока идёт перестройка, поиск отвечает по старому индексу.
+
+Виды совпадений, от сильного к слабому:
+  exact  — нормализованная строка совпала полностью;
+  prefix — строка или одно из её слов начинается с запроса (бинарный поиск
+           по отсортированному списку ключей);
+  fuzzy  — похожесть по триграммам (доля общих триграмм), ловит опечатки.
+Сравнение всегда без учёта регистра, «ё» приравнивается к «е».
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+from dataclasses import dataclass
+
+from django.conf import settings
+
+# Доля триграмм запроса, которая должна найтись в квесте (как word_similarity в pg_trgm)
+MIN_FUZZY_SIMILARITY = 0.5
+# Сколько элементов списков триграмм просматривать на запрос: редкие триграммы
+# идут первыми, самые частые отбрасываются — они почти ничего не говорят
+# о совпадении, а проход по ним съедает всё время (5000 — p95 нечёткого
+# поиска около 5 мс на 100 тыс. квестов, см. bench_search)
+FUZZY_POSTINGS_BUDGET = 5_000
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class SearchResult:
+    id: str
+    name: str
+    location: str
+    is_active: bool
+    score: float
+    match: str
+
+
+class QuestSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._reloading = False
+        self._clear()
+
+    def _clear(self):
+        self._quests = {}        # id -> (name, location, is_active)
+        self._keys = []          # отсортированные пары (ключ, id) для префиксного поиска
+        self._doc_keys = {}      # id -> ключи документа
+        self._trigrams = {}      # триграмма -> множество id
+        self._doc_trigrams = {}  # id -> триграммы документа
+
+    def load(self, rows):
+        """
+        Полная перестройка из (id, name, location, is_active). Новый индекс
+        собирается в отдельном объекте и подменяет текущий одним присваиванием.
+        """
+        fresh = QuestSearchIndex()
+        keys = []
+        for quest_id, name, location, is_active in rows:
+            quest_id = str(quest_id)
+            doc_keys = fresh._add_document(quest_id, name, location, is_active)
+            keys.extend((key, quest_id) for key in doc_keys)
+        keys.sort()
+        with self._lock:
+            self._quests = fresh._quests
+            self._keys = keys
+            self._doc_keys = fresh._doc_keys
+            self._trigrams = fresh._trigrams
+            self._doc_trigrams = fresh._doc_trigrams
+            self._loaded_at = time.monotonic()
+
+    def reload(self):
+        from .models import Quest
+        self.load(Quest.objects.values_list('id', 'name', 'location', 'is_active').iterator())
+
+    warm = reload
+
+    def _reload_in_background(self):
+        from django.db import connection
+
+        try:
+            self.reload()
+        finally:
+            self._reloading = False
+            connection.close()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            self.reload()
+        elif time.monotonic() - self._loaded_at > settings.QUEST_SEARCH_MAX_AGE and not self._reloading:
+            self._reloading = True
+            threading.Thread(target=self._reload_in_background, name='quest-search-reload', daemon=True).start()
+
+    def _add_document(self, quest_id, name, location, is_active):
+        self._quests[quest_id] = (name, location, is_active)
+        doc_keys = set()
+        doc_trigrams = set()
+        for field in (normalize(name), normalize(location)):
+            if not field:
+                continue
+            words = field.split(' ')
+            # ключ на каждую позицию слова: «найти памятник» ищется и по «пам»
+            for i in range(len(words)):
+                doc_keys.add(' '.join(words[i:]))
+            doc_trigrams |= trigrams(field)
+        for trigram in doc_trigrams:
+            self._trigrams.setdefault(trigram, set()).add(quest_id)
+        self._doc_keys[quest_id] = sorted(doc_keys)
+        self._doc_trigrams[quest_id] = doc_trigrams
+        return doc_keys
+
+    def _remove_document(self, quest_id):
+        if quest_id not in self._quests:
+            return
+        del self._quests[quest_id]
+        for key in self._doc_keys.pop(quest_id):
+            index = bisect_left(self._keys, (key, quest_id))
+            if index < len(self._keys) and self._keys[index] == (key, quest_id):
+                del self._keys[index]
+        for trigram in self._doc_trigrams.pop(quest_id):
+            postings = self._trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(quest_id)
+                if not postings:
+                    del self._trigrams[trigram]
+
+    def update(self, quest):
+        """Точечное обновление по сигналу; до первой загрузки ничего не делает"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            quest_id = str(quest.pk)
+            self._remove_document(quest_id)
+            for key in self._add_document(quest_id, quest.name, quest.location, quest.is_active):
+                insort(self._keys, (key, quest_id))
+
+    def remove(self, quest_id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove_document(str(quest_id))
+
+    def search(self, query, limit=10, active_only=False):
+        query = normalize(query)
+        if not query:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            scores = {}
+
+            # Точные и префиксные совпадения: бинарный поиск + короткий проход
+            index = bisect_left(self._keys, (query, ''))
+            while index < len(self._keys):
+                key, quest_id = self._keys[index]
+                if not key.startswith(query):
+                    break
+                candidate = (3.0, 'exact') if key == query else (2.0 + len(query) / len(key), 'prefix')
+                if candidate[0] > scores.get(quest_id, (0.0,))[0]:
+                    scores[quest_id] = candidate
+                index += 1
+                if len(scores) >= limit * 20:
+                    break
+
+            # Нечёткие совпадения по триграммам добираем, только если не хватило точных
+            if len(scores) < limit:
+                self._fuzzy(query, scores, limit)
+
+            results = []
+            for quest_id, (score, match) in scores.items():
+                name, location, is_active = self._quests[quest_id]
+                if active_only and not is_active:
+                    continue
+                results.append(SearchResult(quest_id, name, location, is_active, round(score, 3), match))
+        results.sort(key=lambda result: (-result.score, result.name))
+        return results[:limit]
+
+    def _fuzzy(self, query, scores, limit):
+        query_trigrams = trigrams(query)
+        postings = sorted(
+            (self._trigrams[trigram] for trigram in query_trigrams if trigram in self._trigrams),
+            key=len,
+        )
+        counts = Counter()
+        budget = FUZZY_POSTINGS_BUDGET
+        for ids in postings:
+            if budget <= 0:
+                break
+            counts.update(ids if len(ids) <= budget else islice(ids, budget))
+            budget -= len(ids)
+
+        for quest_id, _ in counts.most_common(limit * 20):
+            shared = len(query_trigrams & self._doc_trigrams[quest_id])
+            similarity = shared / len(query_trigrams)
+            if similarity < MIN_FUZZY_SIMILARITY:
+                continue
+            if similarity > scores.get(quest_id, (0.0,))[0]:
+                scores[quest_id] = (similarity, 'fuzzy')
+
+
+quest_index = QuestSearchIndex()
+
+
+def search_quests(query, limit=10, active_only=False):
+    return quest_index.search(query, limit=limit, active_only=active_only)
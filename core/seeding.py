@@ -0,0 +1,371 @@
+"""
+Синтетические данные производственного объёма для замеров (seed_load_data).
+
+Всё детерминировано: одни и те же seed и end дают те же id, имена и время.
+Распределения неравномерные, как в жизни:
+  - популярность квестов — закон Ципфа: несколько квестов собирают большую
+    часть выполнений, «хвост» почти не выполняют;
+  - активность пользователей — распределение Парето: большинство не сделали
+    ни одного квеста, немногие сделали десятки;
+  - время отправки тяготеет к недавнему, свежие отправки ещё на проверке,
+    после отклонения часть пользователей отправляет фото ещё раз;
+  - промокодов у популярных квестов больше, выданные помечены is_used,
+    остаток в PromoCodeStock совпадает с числом свободных кодов;
+  - квесты и точки маршрутов разбросаны вокруг центра Чебоксар;
+  - фото выполнений считаются уже скачанными: в photo путь по содержимому
+    (самих файлов нет), загрузчику фото делать нечего.
+
+Строки пишутся пачками через executemany (bulk_insert): ORM-шный bulk_create
+тратит на сборку SQL и pre_save каждой строки больше времени, чем сама вставка.
+Сигналы не шлются; журнал переходов и агрегаты не заполняются
+(агрегаты можно собрать командой backfill_rollups).
+"""
+import datetime
+import math
+import random
+import time
+import uuid
+from bisect import bisect
+from dataclasses import dataclass
+from itertools import accumulate, islice
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .fields import CompactUUIDField
+from .media import media_name
+from .models import PromoCode, PromoCodeStock, Quest, Route, RouteQuest, User, UserQuestProgress
+
+BATCH_SIZE = 10_000
+CHEBOKSARY = (56.1366, 47.2511)
+HISTORY_DAYS = 365
+MEAN_SUBMISSION_AGE_DAYS = 60
+MEAN_REVIEW_HOURS = 3
+APPROVE_SHARE = 0.75
+RETRY_SHARE = 0.5
+QUEST_POPULARITY_EXPONENT = 1.1
+USER_ACTIVITY_ALPHA = 1.3
+MAX_QUESTS_PER_USER = 200
+WORDS = (
+    'памятник', 'музей', 'парк', 'фонтан', 'собор', 'набережная', 'театр', 'мост', 'площадь', 'аллея',
+    'бульвар', 'галерея', 'башня', 'храм', 'сквер', 'залив', 'остров', 'вокзал', 'рынок', 'стадион',
+)
+# значения этих типов уходят в базу как есть, остальные приводятся полем модели
+PLAIN_TYPES = {
+    'CharField', 'TextField', 'BooleanField', 'FloatField',
+    'IntegerField', 'BigIntegerField', 'PositiveIntegerField', 'PositiveSmallIntegerField',
+}
+
+
+@dataclass
+class SeedVolumes:
+    users: int = 1_000_000
+    quests: int = 10_000
+    progress: int = 5_000_000
+    promo_codes: int = 10_000_000
+    routes: int = 1_000
+
+    def scaled(self, factor):
+        return SeedVolumes(**{
+            name: max(1, round(value * factor)) for name, value in self.__dict__.items()
+        })
+
+
+@dataclass
+class SeedStep:
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rate(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def bulk_insert(model, field_names, rows, using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE):
+    """
+    Вставляет кортежи значений (в порядке field_names) пачками по batch_size,
+    каждая пачка — отдельная транзакция. Возвращает число строк.
+    """
+    connection = connections[using]
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    converters = [_converter(field, connection) for field in fields]
+    count = 0
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch_size)):
+        params = [
+            tuple(
+                value if convert is None or value is None else convert(value)
+                for convert, value in zip(converters, row)
+            )
+            for row in chunk
+        ]
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+        count += len(chunk)
+    return count
+
+
+def _converter(field, connection):
+    """
+    Функция приведения значения к виду для базы; None — значение пишется как есть.
+    get_db_prep_save на миллионах строк съедал больше времени, чем executemany:
+    для ключей и дат зовём сразу то, до чего он в итоге доходит.
+    """
+    if field.many_to_one:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if internal_type in PLAIN_TYPES:
+        return None
+    if internal_type == 'DateTimeField':
+        return connection.ops.adapt_datetimefield_value
+    if isinstance(field, CompactUUIDField):
+        return lambda value: field.get_db_prep_value(value, connection)
+    return lambda value: field.get_db_prep_save(value, connection)
+
+
+def spread(total, weights, rng):
+    """Раскладывает total на целые части пропорционально весам; сумма частей ровно total"""
+    weight = sum(weights)
+    if not weight:
+        weights, weight = [1] * len(weights), len(weights)
+    parts = [math.floor(total * w / weight) for w in weights]
+    for index in rng.sample(range(len(parts)), total - sum(parts)):
+        parts[index] += 1
+    return parts
+
+
+class Seeder:
+    def __init__(self, volumes, seed=1, end=None, using=DEFAULT_DB_ALIAS):
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.using = using
+        end = end or timezone.localdate()
+        self.end = timezone.make_aware(datetime.datetime.combine(end, datetime.time()))
+        self._timings = {}
+
+    def new_id(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def ago(self, days):
+        return self.end - datetime.timedelta(days=days)
+
+    def run(self):
+        """Заполняет базу по шагам; после каждой таблицы отдаёт SeedStep"""
+        yield from self._measure('core_quest', self.seed_quests)
+        yield from self._measure('core_user', self.seed_users)
+        # выданные промокоды пишутся вперемешку с выполнениями, которые на них ссылаются
+        self._timings = {'core_promocode': [0, 0.0], 'core_userquestprogress': [0, 0.0]}
+        self.seed_progress()
+        for table in ('core_userquestprogress', 'core_promocode'):
+            rows, seconds = self._timings[table]
+            yield SeedStep(table + (' (выданные)' if table == 'core_promocode' else ''), rows, seconds)
+        yield from self._measure('core_promocode (свободные)', self.seed_free_codes)
+        yield from self._measure('core_promocodestock', self.seed_stock)
+        yield from self._measure('core_route', self.seed_routes)
+        yield from self._measure('core_routequest', self.seed_route_points)
+
+    def _measure(self, table, step):
+        started = time.perf_counter()
+        rows = step()
+        yield SeedStep(table, rows, time.perf_counter() - started)
+
+    def _insert(self, table, model, field_names, rows):
+        started = time.perf_counter()
+        count = bulk_insert(model, field_names, rows, self.using)
+        timing = self._timings[table]
+        timing[0] += count
+        timing[1] += time.perf_counter() - started
+
+    # --- квесты и пользователи ---
+
+    def seed_quests(self):
+        rng = self.rng
+        count = self.volumes.quests
+        self.quest_ids = [self.new_id() for _ in range(count)]
+        self.quest_points = [
+            (CHEBOKSARY[0] + rng.gauss(0, 0.02), CHEBOKSARY[1] + rng.gauss(0, 0.04)) for _ in range(count)
+        ]
+        # ранг популярности не связан с порядком создания
+        ranked = list(range(count))
+        rng.shuffle(ranked)
+        self.popularity = [0.0] * count
+        for rank, index in enumerate(ranked):
+            self.popularity[index] = 1 / (rank + 1) ** QUEST_POPULARITY_EXPONENT
+        self.popular_order = ranked
+        self.popularity_cdf = list(accumulate(self.popularity[index] for index in ranked))
+
+        def rows():
+            for i, (quest_id, (latitude, longitude)) in enumerate(zip(self.quest_ids, self.quest_points)):
+                first, second = rng.sample(WORDS, 2)
+                created_at = self.ago(HISTORY_DAYS + rng.uniform(0, HISTORY_DAYS))
+                yield (
+                    quest_id, f'{first.capitalize()} и {second} №{i + 1}',
+                    f'Найдите {first} рядом с местом «{second}» и сделайте фото',
+                    f'ул. {rng.choice(WORDS).capitalize()}, {rng.randint(1, 200)}',
+                    latitude, longitude, created_at, rng.random() < 0.9,
+                )
+
+        return bulk_insert(Quest, (
+            'id', 'name', 'description', 'location', 'latitude', 'longitude', 'created_at', 'is_active',
+        ), rows(), self.using)
+
+    def seed_users(self):
+        rng = self.rng
+        count = self.volumes.users
+        self.user_ids = [self.new_id() for _ in range(count)]
+        self.user_ages = [rng.uniform(0, 2 * HISTORY_DAYS) for _ in range(count)]
+
+        def rows():
+            for i, (user_id, age) in enumerate(zip(self.user_ids, self.user_ages)):
+                verified = rng.random() < 0.85
+                yield (
+                    user_id, 100_000_000 + i, f'Пользователь {i + 1}',
+                    f'+7900{i % 10_000_000:07d}' if verified else None,
+                    verified, self.ago(age), rng.random() < 0.005,
+                )
+
+        return bulk_insert(User, (
+            'id', 'telegram_id', 'name', 'phone_number', 'is_verified', 'created_at', 'is_route_builder',
+        ), rows(), self.using)
+
+    # --- выполнения и промокоды ---
+
+    def pick_quest(self):
+        point = self.rng.random() * self.popularity_cdf[-1]
+        return self.popular_order[min(bisect(self.popularity_cdf, point), len(self.popular_order) - 1)]
+
+    def seed_progress(self):
+        rng = self.rng
+        quotas = spread(
+            self.volumes.progress,
+            [rng.paretovariate(USER_ACTIVITY_ALPHA) - 1 for _ in self.user_ids],
+            rng,
+        )
+        self.used_codes = [0] * self.volumes.quests
+        self.code_serial = 0
+        # выборка различных квестов по Ципфу медленно добирает «хвост» — больше
+        # MAX_QUESTS_PER_USER на пользователя не даём, излишек переходит следующим
+        limit = max(1, min(MAX_QUESTS_PER_USER, self.volumes.quests // 2))
+        carry = 0
+        codes, progress = [], []
+        for user_index, quota in enumerate(quotas):
+            quota += carry
+            carry = max(0, quota - limit)
+            quota -= carry
+            made, seen = 0, set()
+            while made < quota:
+                quest_index = self.pick_quest()
+                if quest_index in seen:
+                    continue
+                seen.add(quest_index)
+                age = min(rng.expovariate(1 / MEAN_SUBMISSION_AGE_DAYS), self.user_ages[user_index], HISTORY_DAYS)
+                submitted = self.ago(age)
+                attempt = 1
+                while True:
+                    row, code = self.progress_row(user_index, quest_index, attempt, submitted)
+                    progress.append(row)
+                    if code is not None:
+                        codes.append(code)
+                    made += 1
+                    status, decided = row[5], row[11]
+                    if status != UserQuestProgress.Status.REJECTED or made >= quota or rng.random() > RETRY_SHARE:
+                        break
+                    submitted = decided + datetime.timedelta(hours=rng.expovariate(1 / 24))
+                    if submitted >= self.end:
+                        break
+                    attempt += 1
+            if len(progress) >= BATCH_SIZE:
+                self.flush_progress(codes, progress)
+                codes, progress = [], []
+        self.flush_progress(codes, progress)
+
+    def progress_row(self, user_index, quest_index, attempt, submitted):
+        rng = self.rng
+        decided = submitted + datetime.timedelta(hours=rng.expovariate(1 / MEAN_REVIEW_HOURS))
+        code = None
+        if decided >= self.end:
+            status, decided = UserQuestProgress.Status.PENDING, None
+        elif rng.random() < APPROVE_SHARE:
+            status = UserQuestProgress.Status.APPROVED
+            self.code_serial += 1
+            self.used_codes[quest_index] += 1
+            code = (self.new_id(), f'L{self.code_serial:010d}', self.quest_ids[quest_index], True, submitted)
+        else:
+            status = UserQuestProgress.Status.REJECTED
+        progress_id = self.new_id()
+        photo = f'{rng.getrandbits(64):016x}'
+        row = (
+            progress_id, self.user_ids[user_index], self.quest_ids[quest_index],
+            media_name(photo), f'seed-photo-{photo}', status, code[0] if code else None,
+            submitted, '', decided, 'seed' if decided else '', decided or submitted, attempt, 0,
+        )
+        return row, code
+
+    def flush_progress(self, codes, progress):
+        # коды раньше выполнений: в SQLite внешние ключи проверяются при коммите пачки
+        self._insert('core_promocode', PromoCode, ('id', 'code', 'quest', 'is_used', 'created_at'), codes)
+        self._insert('core_userquestprogress', UserQuestProgress, (
+            'id', 'user', 'quest', 'photo', 'telegram_file_id', 'status', 'promo_code',
+            'completed_at', 'admin_comment', 'reviewed_at', 'reviewer', 'status_changed_at', 'attempt',
+            'media_attempts',
+        ), progress)
+
+    def seed_free_codes(self):
+        rng = self.rng
+        free = max(0, self.volumes.promo_codes - self.code_serial)
+        self.free_codes = spread(free, self.popularity, rng)
+        created_at = self.ago(HISTORY_DAYS)
+
+        def rows():
+            for quest_index, count in enumerate(self.free_codes):
+                for _ in range(count):
+                    self.code_serial += 1
+                    yield self.new_id(), f'L{self.code_serial:010d}', self.quest_ids[quest_index], False, created_at
+
+        return bulk_insert(PromoCode, ('id', 'code', 'quest', 'is_used', 'created_at'), rows(), self.using)
+
+    def seed_stock(self):
+        return bulk_insert(PromoCodeStock, ('id', 'quest', 'available', 'updated_at'), (
+            (self.new_id(), quest_id, available, self.end)
+            for quest_id, available in zip(self.quest_ids, self.free_codes)
+        ), self.using)
+
+    # --- маршруты ---
+
+    def seed_routes(self):
+        rng = self.rng
+        self.route_ids = [self.new_id() for _ in range(self.volumes.routes)]
+        return bulk_insert(Route, ('id', 'name', 'description', 'created_at'), (
+            (route_id, f'Маршрут {i + 1}', f'Прогулка: {", ".join(rng.sample(WORDS, 3))}', self.ago(rng.uniform(0, HISTORY_DAYS)))
+            for i, route_id in enumerate(self.route_ids)
+        ), self.using)
+
+    def seed_route_points(self):
+        rng = self.rng
+
+        def rows():
+            for route_id in self.route_ids:
+                points = min(rng.randint(3, 12), self.volumes.quests)
+                chosen = []
+                while len(chosen) < points:
+                    quest_index = self.pick_quest()
+                    if quest_index not in chosen:
+                        chosen.append(quest_index)
+                for order, quest_index in enumerate(chosen, start=1):
+                    latitude, longitude = self.quest_points[quest_index]
+                    yield (
+                        self.new_id(), route_id, self.quest_ids[quest_index], order,
+                        f'Подсказка к точке {order}' if rng.random() < 0.7 else '',
+                        latitude + rng.gauss(0, 0.0005), longitude + rng.gauss(0, 0.0005),
+                    )
+
+        return bulk_insert(RouteQuest, (
+            'id', 'route', 'quest', 'order', 'hint_text', 'latitude', 'longitude',
+        ), rows(), self.using)
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Quest, PromoCode, PromoCodeStock, User, UserQuestProgress
+from . import inventory, moderation, promo_messages, replicas, rollups
+from .quest_cache import quest_cache
+from .search import quest_index
+
+
+@receiver(post_save, sender=Quest)
+def create_promo_stock(sender, instance, created, **kwargs):
+    """Заводит счётчик промокодов для нового квеста"""
+    if created:
+        PromoCodeStock.objects.get_or_create(quest=instance)
+
+
+@receiver(post_save, sender=Quest)
+def update_quest_search(sender, instance, **kwargs):
+    quest_index.update(instance)
+
+
+@receiver(post_delete, sender=Quest)
+def remove_from_quest_search(sender, instance, **kwargs):
+    quest_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Quest)
+@receiver(post_delete, sender=Quest)
+def invalidate_quest_cards(sender, instance, **kwargs):
+    quest_cache.invalidate()
+
+
+@receiver(pre_save, sender=UserQuestProgress)
+def stamp_status_change(sender, instance, **kwargs):
+    moderation.stamp_status_change(instance)
+
+
+@receiver(post_save, sender=UserQuestProgress)
+def track_status_change(sender, instance, created, **kwargs):
+    """Отправка фото или смена статуса — журнал переходов, агрегаты и список промокодов"""
+    previous_status = getattr(instance, '_loaded_status', None)
+    moderation.log_transition(instance, previous_status, created)
+    rollups.record_status_change(instance, previous_status, created)
+    promo_messages.record_status_change(instance, previous_status, created)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=UserQuestProgress)
+def stick_user_to_primary(sender, instance, **kwargs):
+    """Чьи данные изменились (например, админ подтвердил квест), тот пока читает из основной базы"""
+    if replicas.replica_enabled():
+        replicas.mark_written(replicas.bot_actor(instance.user.telegram_id))
+
+
+@receiver(post_save, sender=User)
+def stick_telegram_user_to_primary(sender, instance, **kwargs):
+    if replicas.replica_enabled():
+        replicas.mark_written(replicas.bot_actor(instance.telegram_id))
+
+
+@receiver(post_save, sender=PromoCode)
+@receiver(post_delete, sender=PromoCode)
+def recount_promo_stock(sender, instance, **kwargs):
+    """Промокод изменён поштучно (админка, API) — пересчитываем остаток его квеста"""
+    if kwargs['signal'] is post_delete and instance.is_used:
+        return  # выданные коды в остаток не входят; так их удаляет архивация
+    inventory.recount_stock(instance.quest_id)
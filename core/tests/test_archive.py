@@ -0,0 +1,76 @@
+"""
+Перенос завершённых выполнений в архив (core.archive).
+"""
+import datetime
+import types
+
+import pytest
+from django.db import transaction
+from django.utils import timezone
+
+from core import archive
+from core.models import ArchivedProgress, PromoCode, Quest, User, UserQuestProgress
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def quest():
+    return Quest.objects.create(name='Квест', description='Сфотографируйте', location='Чебоксары')
+
+
+def finished(quest, telegram_id, status, code=None, days=30):
+    """Выполнение с решением days дней назад и, если передан, выданным кодом"""
+    user = User.objects.create(telegram_id=telegram_id, name=f'Игрок {telegram_id}')
+    progress = UserQuestProgress.objects.create(
+        user=user, quest=quest, photo='quest_photos/1.jpg', telegram_file_id=f'file-{telegram_id}',
+    )
+    progress.status = status
+    if code is not None:
+        progress.promo_code = PromoCode.objects.create(code=code, quest=quest, is_used=True)
+    progress.save()
+    UserQuestProgress.objects.filter(pk=progress.pk).update(
+        status_changed_at=timezone.now() - datetime.timedelta(days=days),
+    )
+    return progress
+
+
+def test_batch_moves_old_finished_progress(quest):
+    approved = finished(quest, 1, UserQuestProgress.Status.APPROVED, code='CODE-1')
+    rejected = finished(quest, 2, UserQuestProgress.Status.REJECTED)
+    recent = finished(quest, 3, UserQuestProgress.Status.APPROVED, code='CODE-3', days=1)
+    pending = UserQuestProgress.objects.create(user=recent.user, quest=Quest.objects.create(
+        name='Другой', description='Сфотографируйте', location='Чебоксары',
+    ))
+
+    assert archive.archive_batch(archive.archive_cutoff(7), batch_size=10) == 2
+
+    assert set(UserQuestProgress.objects.values_list('pk', flat=True)) == {recent.pk, pending.pk}
+    assert set(PromoCode.objects.values_list('code', flat=True)) == {'CODE-3'}
+    copies = {row.pk: row for row in ArchivedProgress.objects.all()}
+    assert set(copies) == {approved.pk, rejected.pk}
+    assert (copies[approved.pk].status, copies[approved.pk].promo_code) == ('approved', 'CODE-1')
+    assert (copies[rejected.pk].status, copies[rejected.pk].promo_code) == ('rejected', '')
+    assert copies[approved.pk].photo.name == 'quest_photos/1.jpg'
+    assert copies[approved.pk].telegram_file_id == 'file-1'
+
+
+def test_status_change_after_select_keeps_row_live(quest, monkeypatch):
+    approved = finished(quest, 1, UserQuestProgress.Status.APPROVED, code='CODE-1')
+    regraded = finished(quest, 2, UserQuestProgress.Status.APPROVED, code='CODE-2')
+
+    def atomic():
+        # админ пересмотрел решение между выборкой кандидатов и началом транзакции
+        progress = UserQuestProgress.objects.get(pk=regraded.pk)
+        progress.status = UserQuestProgress.Status.REJECTED
+        progress.save()
+        return transaction.atomic()
+
+    monkeypatch.setattr(archive, 'transaction', types.SimpleNamespace(atomic=atomic))
+    assert archive.archive_batch(archive.archive_cutoff(7), batch_size=10) == 1
+
+    assert list(ArchivedProgress.objects.values_list('pk', flat=True)) == [approved.pk]
+    live = UserQuestProgress.objects.get(pk=regraded.pk)
+    assert live.status == UserQuestProgress.Status.REJECTED
+    assert live.promo_code.code == 'CODE-2'
+    assert set(PromoCode.objects.values_list('code', flat=True)) == {'CODE-2'}
@@ -0,0 +1,40 @@
+"""Миграции с переносом данных"""
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def migrate(target):
+    executor = MigrationExecutor(connection)
+    executor.migrate(target)
+    executor.loader.build_graph()
+    return executor.loader.project_state(target).apps
+
+
+def test_0014_moves_file_ids_out_of_photo():
+    leaves = MigrationExecutor(connection).loader.graph.leaf_nodes()
+    try:
+        apps = migrate([('core', '0013_compact_uuid')])
+        User = apps.get_model('core', 'User')
+        Quest = apps.get_model('core', 'Quest')
+        UserQuestProgress = apps.get_model('core', 'UserQuestProgress')
+        user = User.objects.create(telegram_id=1, name='User')
+        quests = [Quest.objects.create(name=f'Квест {i}', description='', location='') for i in range(2)]
+        # до загрузчика в photo лежал file_id, а загруженное вручную фото — путь
+        legacy = UserQuestProgress.objects.create(user=user, quest=quests[0], photo='AgACAgIAAxkBAAIC')
+        uploaded = UserQuestProgress.objects.create(user=user, quest=quests[1], photo='quest_photos/photo.jpg')
+
+        apps = migrate([('core', '0014_progress_media')])
+        UserQuestProgress = apps.get_model('core', 'UserQuestProgress')
+        legacy = UserQuestProgress.objects.get(pk=legacy.pk)
+        assert (legacy.photo.name, legacy.telegram_file_id) == ('', 'AgACAgIAAxkBAAIC')
+        uploaded = UserQuestProgress.objects.get(pk=uploaded.pk)
+        assert (uploaded.photo.name, uploaded.telegram_file_id) == ('quest_photos/photo.jpg', '')
+
+        apps = migrate([('core', '0013_compact_uuid')])
+        UserQuestProgress = apps.get_model('core', 'UserQuestProgress')
+        assert UserQuestProgress.objects.get(pk=legacy.pk).photo.name == 'AgACAgIAAxkBAAIC'
+    finally:
+        migrate(leaves)
@@ -0,0 +1,85 @@
+"""
+Попытки выполнения квестов и их проверка (core.moderation).
+"""
+import uuid
+
+import pytest
+from django.utils import timezone
+
+from core.inventory import add_promo_codes
+from core.models import ArchivedProgress, PromoCode, PromoCodeStock, Quest, User, UserQuestProgress
+from core.moderation import approve_attempt, submit_attempt
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def quest():
+    quest = Quest.objects.create(name='Квест', description='Сфотографируйте', location='Чебоксары')
+    add_promo_codes(quest.pk, ['CODE-1', 'CODE-2'])
+    return quest
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(telegram_id=1, name='Игрок')
+
+
+def stock(quest):
+    return PromoCodeStock.objects.get(quest=quest).available
+
+
+def test_approve_issues_code(quest, user):
+    progress = UserQuestProgress.objects.create(user=user, quest=quest, telegram_file_id='file')
+
+    promo_code, remaining = approve_attempt(progress, 'tg:1 @admin', comment='Отлично')
+
+    progress.refresh_from_db()
+    assert (progress.status, progress.promo_code, progress.admin_comment) == ('approved', promo_code, 'Отлично')
+    assert remaining == stock(quest) == 1
+
+
+def test_second_approval_of_stale_copy_returns_code(quest, user):
+    progress = UserQuestProgress.objects.create(user=user, quest=quest, telegram_file_id='file')
+    # второй админ прочитал запись, пока она была на проверке
+    stale = UserQuestProgress.objects.get(pk=progress.pk)
+    first, _ = approve_attempt(progress, 'tg:1 @first')
+
+    assert approve_attempt(stale, 'tg:2 @second') is None
+
+    progress.refresh_from_db()
+    assert (progress.promo_code, progress.reviewer) == (first, 'tg:1 @first')
+    assert stock(quest) == 1
+    assert list(PromoCode.objects.filter(is_used=False).values_list('code', flat=True)) == ['CODE-2']
+
+
+def test_retry_after_rejection_is_next_attempt(quest, user):
+    first = submit_attempt(user, quest, 'file-1')
+    first.status = UserQuestProgress.Status.REJECTED
+    first.save()
+
+    retry = submit_attempt(user, quest, 'file-2')
+
+    assert (first.attempt, retry.attempt) == (1, 2)
+    assert retry.status == UserQuestProgress.Status.PENDING
+
+
+def test_second_open_attempt_is_refused(quest, user):
+    first = submit_attempt(user, quest, 'file-1')
+
+    assert submit_attempt(user, quest, 'file-2') is None
+    first.status = UserQuestProgress.Status.APPROVED
+    first.save()
+    assert submit_attempt(user, quest, 'file-3') is None
+    assert UserQuestProgress.objects.filter(user=user, quest=quest).count() == 1
+
+
+def test_numbering_continues_from_archive(quest, user):
+    now = timezone.now()
+    for attempt in (1, 2):
+        ArchivedProgress.objects.create(
+            id=uuid.uuid4(), user=user, quest=quest, status=UserQuestProgress.Status.REJECTED,
+            attempt=attempt, completed_at=now, finished_at=now,
+        )
+
+    assert submit_attempt(user, quest, 'file').attempt == 3
@@ -0,0 +1,98 @@
+"""
+Кэш списка «Мои промокоды» (core.promo_messages).
+"""
+import pytest
+from django.core.cache import cache
+
+from core import promo_messages
+from core.inventory import add_promo_codes
+from core.models import Quest, User, UserQuestProgress
+from core.moderation import approve_attempt
+from core.promo_messages import (
+    CACHE_KEY, HEADER, MESSAGE_LIMIT, append_entry, bump_version, render_entry, text_length,
+)
+
+pytestmark = pytest.mark.django_db
+
+TELEGRAM_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(telegram_id=TELEGRAM_ID, name='Игрок')
+
+
+@pytest.fixture
+def approve(user, django_capture_on_commit_callbacks):
+    """Подтверждает новую попытку пользователя; кэш обновляется, как после коммита"""
+    def approve(quest_name):
+        quest = Quest.objects.create(name=quest_name, description='Сфотографируйте', location='Чебоксары')
+        add_promo_codes(quest.pk, [f'CODE-{quest_name}'])
+        progress = UserQuestProgress.objects.create(user=user, quest=quest, telegram_file_id='file')
+        with django_capture_on_commit_callbacks(execute=True):
+            approve_attempt(progress, 'tg:1 @admin')
+    return approve
+
+
+def cached():
+    entry = cache.get(CACHE_KEY.format(TELEGRAM_ID))
+    return None if entry is None else entry[1]
+
+
+def test_approve_appends_to_cached_list(approve, django_assert_num_queries):
+    approve('Первый')
+    messages = promo_messages.promo_messages(TELEGRAM_ID)
+    assert cached() == messages
+
+    approve('Второй')
+
+    expected = [HEADER + render_entry('Первый', 'CODE-Первый') + render_entry('Второй', 'CODE-Второй')]
+    assert cached() == expected
+    with django_assert_num_queries(0):
+        assert promo_messages.promo_messages(TELEGRAM_ID) == expected
+
+
+def test_version_mismatch_rebuilds_from_database(approve, django_assert_num_queries):
+    approve('Первый')
+    promo_messages.promo_messages(TELEGRAM_ID)
+    # параллельная выдача увеличила версию, но строку дописать не успела
+    bump_version(TELEGRAM_ID)
+
+    approve('Второй')
+
+    assert cached() == [HEADER + render_entry('Первый', 'CODE-Первый')]
+    with django_assert_num_queries(2):
+        messages = promo_messages.promo_messages(TELEGRAM_ID)
+    assert messages == [HEADER + render_entry('Первый', 'CODE-Первый') + render_entry('Второй', 'CODE-Второй')]
+    assert cached() == messages
+
+
+def test_empty_list_is_not_cached(user, approve):
+    assert promo_messages.promo_messages(TELEGRAM_ID) == []
+    assert cached() is None
+
+    approve('Первый')
+
+    assert promo_messages.promo_messages(TELEGRAM_ID) == [HEADER + render_entry('Первый', 'CODE-Первый')]
+
+
+def test_split_counts_emoji_as_two_utf16_units():
+    # по числу символов запись ровно дополняет заголовок до лимита,
+    # но два эмодзи в ней занимают по две единицы UTF-16
+    padding = MESSAGE_LIMIT - len(HEADER) - len(render_entry('', 'CODE'))
+    entry = render_entry('К' * padding, 'CODE')
+    assert len(HEADER) + len(entry) == MESSAGE_LIMIT
+
+    messages = append_entry([], entry)
+    messages = append_entry(messages, render_entry('Второй', 'CODE-2'))
+
+    assert messages == [HEADER, entry, render_entry('Второй', 'CODE-2')]
+    assert text_length(entry) == len(entry) + 2
+    assert all(text_length(message) <= MESSAGE_LIMIT for message in messages)
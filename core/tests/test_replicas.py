@@ -0,0 +1,93 @@
+"""
+Маршрутизация запросов между default и репликой (core.replicas).
+
+В тестах реплика — зеркало default (quest_bot.test_settings): данные общие,
+а куда ушёл запрос, видно по соединению, которое его выполнило.
+"""
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Quest
+from core.replicas import REPLICA, db_scope
+
+# реплика — отдельное соединение: она видит только закоммиченные данные
+pytestmark = pytest.mark.django_db(transaction=True, databases=['default', REPLICA])
+
+
+@pytest.fixture(autouse=True)
+def clear_sticky_marks():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def quest():
+    return Quest.objects.create(name='Квест', description='Сфотографируйте', location='Чебоксары')
+
+
+class QueryLog:
+    """Запросы, выполненные каждым из соединений внутри блока"""
+
+    def __enter__(self):
+        self.contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in ('default', REPLICA)}
+        for context in self.contexts.values():
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        for context in self.contexts.values():
+            context.__exit__(*exc)
+
+    def count(self, alias):
+        return len(self.contexts[alias].captured_queries)
+
+
+def read_quests():
+    return list(Quest.objects.values_list('name', flat=True))
+
+
+def test_read_only_scope_reads_from_replica(quest):
+    with QueryLog() as log, db_scope('tg:1', read_only=True):
+        assert read_quests() == ['Квест']
+    assert (log.count(REPLICA), log.count('default')) == (1, 0)
+
+
+def test_scope_without_read_only_reads_from_default(quest):
+    with QueryLog() as log, db_scope('tg:1'):
+        read_quests()
+    assert (log.count(REPLICA), log.count('default')) == (0, 1)
+
+
+def test_reads_and_writes_inside_atomic_stay_on_default(quest):
+    with QueryLog() as log, db_scope('tg:1', read_only=True):
+        with transaction.atomic():
+            read_quests()
+            Quest.objects.filter(pk=quest.pk).update(name='Переименованный')
+            assert read_quests() == ['Переименованный']
+        # после записи блок дочитывает из основной базы
+        assert read_quests() == ['Переименованный']
+    assert log.count(REPLICA) == 0
+
+
+def test_actor_sticks_to_default_after_write(quest, settings):
+    settings.DATABASE_REPLICA_STICKY_SECONDS = 1
+    with db_scope('tg:1', read_only=True):
+        Quest.objects.filter(pk=quest.pk).update(name='Переименованный')
+
+    with QueryLog() as log:
+        with db_scope('tg:1', read_only=True):
+            read_quests()
+        with db_scope('tg:2', read_only=True):
+            read_quests()
+    # автор записи читает из default, остальные — по-прежнему с реплики
+    assert (log.count('default'), log.count(REPLICA)) == (1, 1)
+
+    time.sleep(1.1)
+    with QueryLog() as log, db_scope('tg:1', read_only=True):
+        read_quests()
+    assert (log.count('default'), log.count(REPLICA)) == (0, 1)
@@ -0,0 +1,78 @@
+"""
+Перенос маршрутов между окружениями (core.route_exchange).
+"""
+import io
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Quest, Route, RouteQuest
+from core.route_exchange import EXPORTERS, READERS, import_routes
+from core.route_import import RouteImportError
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def routes():
+    quests = [
+        Quest.objects.create(
+            name=f'Квест {n}', description=f'Сфотографируйте {n}', location='Чебоксары',
+            latitude=56.1 + n / 100, longitude=47.2, is_active=n != 2,
+        )
+        for n in range(3)
+    ]
+    for name, points in (('Набережная', quests), ('Центр', quests[1::-1])):
+        route = Route.objects.create(name=name, description=f'Маршрут «{name}»')
+        for order, quest in enumerate(points, start=1):
+            RouteQuest.objects.create(route=route, quest=quest, order=order, hint_text=f'Подсказка {order}')
+    return quests
+
+
+def export(file_format):
+    return ''.join(EXPORTERS[file_format]())
+
+
+def load(file_format, text):
+    return import_routes(READERS[file_format](io.BytesIO(text.encode())))
+
+
+@pytest.mark.parametrize('file_format', ['jsonl', 'geojson'])
+def test_round_trip_restores_routes_and_is_idempotent(routes, file_format):
+    exported = export(file_format)
+    Route.objects.all().delete()
+    Quest.objects.all().delete()
+
+    stats = load(file_format, exported)
+    assert (stats['routes_created'], stats['quests_created'], stats['points']) == (2, 3, 5)
+    assert export(file_format) == exported
+
+    with CaptureQueriesContext(connection) as queries:
+        stats = load(file_format, exported)
+    assert stats['routes_unchanged'] == 2
+    assert stats['routes_created'] == stats['routes_updated'] == stats['quests_updated'] == 0
+    assert not [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+@pytest.mark.parametrize('value', ['false', '0', 0, 1])
+def test_is_active_must_be_boolean(value):
+    record = {'name': 'Маршрут', 'points': [{'quest': {'name': 'Квест', 'is_active': value}}]}
+
+    with pytest.raises(RouteImportError) as error:
+        load('jsonl', json.dumps(record, ensure_ascii=False))
+    assert error.value.errors == ['Строка 1, точка 1: is_active должен быть true или false']
+
+
+def test_ambiguous_quest_name_cancels_import(routes):
+    exported = export('jsonl')
+    Quest.objects.create(name='Квест 1', description='Другой', location='Чебоксары')
+
+    with pytest.raises(RouteImportError) as error:
+        load('jsonl', exported)
+    assert error.value.errors == ['Квест «Квест 1»: в базе несколько квестов с таким названием, переименуйте лишние']
+    assert Quest.objects.filter(name='Квест 1').count() == 2
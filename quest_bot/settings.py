@@ -20,9 +20,6 @@ load_dotenv(override=True)
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Выводим значение токена для отладки
-print(f"Loading token from env: {os.getenv('TELEGRAM_BOT_TOKEN')}")
-
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -59,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'quest_bot.urls'
@@ -92,6 +90,30 @@ DATABASES = {
     }
 }
 
+# Реплика только для чтения (см. core.replicas). Для SQLite — путь к копии файла базы
+DATABASE_REPLICA_NAME = os.getenv('DATABASE_REPLICA_NAME')
+if DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DATABASE_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает только из основной базы
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '10'))
+
+# Кэш: по умолчанию в памяти процесса; общий для бота, воркеров и API — Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -142,6 +164,86 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Telegram Bot settings
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ADMIN_GROUP_ID = os.getenv('ADMIN_GROUP_ID')
+# Свой Bot API сервер (telegram-bot-api или фейковый для замеров); пусто — api.telegram.org
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER', '')
+
+# Загрузка фото выполнений из Telegram (см. core.media и bot.media): включена ли в процессе бота,
+# сколько файлов качать одновременно, размер куска, пауза между проверками очереди в секундах,
+# сколько раз пробовать и файлы какого размера брать (Bot API отдаёт не больше 20 МБ)
+MEDIA_DOWNLOAD_ENABLED = os.getenv('MEDIA_DOWNLOAD_ENABLED', 'True') == 'True'
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv('MEDIA_DOWNLOAD_CONCURRENCY', '4'))
+MEDIA_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MEDIA_DOWNLOAD_INTERVAL = float(os.getenv('MEDIA_DOWNLOAD_INTERVAL', '5'))
+MEDIA_DOWNLOAD_MAX_ATTEMPTS = int(os.getenv('MEDIA_DOWNLOAD_MAX_ATTEMPTS', '5'))
+MEDIA_MAX_BYTES = 20 * 1024 * 1024
+
+# Порог остатка промокодов, при котором админы получают оповещение
+PROMO_LOW_STOCK_THRESHOLD = int(os.getenv('PROMO_LOW_STOCK_THRESHOLD', '5'))
+# Сколько секунд хранить готовый текст «Мои промокоды» (дописывается при выдаче кода);
+# без общего кэша процессы не видят выдачи друг друга, поэтому по умолчанию минута
+PROMO_MESSAGES_CACHE_TTL = int(os.getenv(
+    'PROMO_MESSAGES_CACHE_TTL', str(24 * 3600 if os.getenv('REDIS_URL') else 60),
+))
+
+# Метрики бота: порт для /metrics в формате Prometheus (0 — выключено)
+BOT_METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', '0'))
+
+# Защита от флуда: (маркеров в секунду, размер корзины) на пользователя по имени обработчика
+BOT_THROTTLE_ENABLED = os.getenv('BOT_THROTTLE_ENABLED', 'True') == 'True'
+BOT_THROTTLE_RATES = {
+    'default': (1.0, 5),
+    'handle_photo': (0.1, 2),
+    'handle_approve': (5.0, 20),
+    'handle_reject': (5.0, 20),
+    'browse_quests': (3.0, 10),
+}
+# Общий лимит апдейтов на весь бот — защита базы при наплыве
+BOT_THROTTLE_GLOBAL_RATE = (float(os.getenv('BOT_THROTTLE_GLOBAL_RATE', '100')), 200)
+BOT_THROTTLE_GLOBAL_MAX_WAIT = float(os.getenv('BOT_THROTTLE_GLOBAL_MAX_WAIT', '5'))
+# Через сколько секунд простоя корзина пользователя забывается и сколько корзин держать максимум
+BOT_THROTTLE_IDLE_TTL = 300.0
+BOT_THROTTLE_MAX_USERS = 100_000
+
+# Повторно доставленные апдейты: сколько секунд помнить update_id
+# и сколько ключей держать в памяти (принятые на проверку фото дополнительно пишутся в базу)
+BOT_IDEMPOTENCY_ENABLED = os.getenv('BOT_IDEMPOTENCY_ENABLED', 'True') == 'True'
+BOT_IDEMPOTENCY_TTL = int(os.getenv('BOT_IDEMPOTENCY_TTL', '3600'))
+BOT_IDEMPOTENCY_MAX_KEYS = 100_000
+
+# Процессы-обработчики (run_bot --workers): сколько по умолчанию и сколько секунд
+# при остановке ждать, пока воркеры доделают принятые апдейты
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+BOT_WORKER_DRAIN_TIMEOUT = float(os.getenv('BOT_WORKER_DRAIN_TIMEOUT', '30'))
+
+# Обработчики бота, которые только читают: при настроенной реплике читают с неё
+BOT_REPLICA_HANDLERS = {'get_quest', 'my_promocodes', 'browse_quests'}
+
+# SLA модерации: за сколько секунд админ должен проверить фото
+MODERATION_SLA_SECONDS = int(os.getenv('MODERATION_SLA_SECONDS', str(4 * 3600)))
+
+# Архивация завершённых выполнений (archive_progress): через сколько дней после решения
+# переносить запись в архив, по сколько записей за транзакцию и сколько секунд ждать между пачками
+PROGRESS_ARCHIVE_AFTER_DAYS = int(os.getenv('PROGRESS_ARCHIVE_AFTER_DAYS', '180'))
+PROGRESS_ARCHIVE_BATCH_SIZE = int(os.getenv('PROGRESS_ARCHIVE_BATCH_SIZE', '500'))
+PROGRESS_ARCHIVE_PAUSE = float(os.getenv('PROGRESS_ARCHIVE_PAUSE', '0.2'))
+
+# Каталог квестов в конструкторе маршрутов: квестов на странице
+QUEST_CATALOG_PAGE_SIZE = int(os.getenv('QUEST_CATALOG_PAGE_SIZE', '8'))
+
+# Загрузка точек маршрута файлом (CSV/GPX/GeoJSON)
+ROUTE_IMPORT_MAX_POINTS = int(os.getenv('ROUTE_IMPORT_MAX_POINTS', '1000'))
+ROUTE_IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024  # больше Bot API скачать не даст
+ROUTE_IMPORT_SPOOL_SIZE = 1024 * 1024  # файлы крупнее сбрасываются из памяти на диск
+
+# Поиск квестов: как часто (в секундах) перечитывать индекс из базы целиком
+QUEST_SEARCH_MAX_AGE = int(os.getenv('QUEST_SEARCH_MAX_AGE', '600'))
+# Карточки квестов для «Получить квест»: как часто (в секундах) перечитывать их из базы,
+# даже если метка версии в кэше не менялась (кэш не общий между процессами)
+QUEST_CACHE_MAX_AGE = int(os.getenv('QUEST_CACHE_MAX_AGE', '300'))
+
+# Sentry
+SENTRY_DSN = os.getenv('SENTRY_DSN')
+SENTRY_TRACES_SAMPLE_RATE = float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0.1'))
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -155,3 +257,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
+
+# Профилирование API: по заголовку X-Profile: 1 от админа или случайной выборке запросов
+API_PROFILING_ENABLED = os.getenv('API_PROFILING_ENABLED', 'False') == 'True'
+API_PROFILING_SAMPLE_RATE = float(os.getenv('API_PROFILING_SAMPLE_RATE', '0'))
+API_PROFILING_CPROFILE = os.getenv('API_PROFILING_CPROFILE', 'True') == 'True'
+# Сколько одинаковых по форме SQL-запросов за запрос считать признаком N+1
+API_PROFILING_N_PLUS_ONE_THRESHOLD = int(os.getenv('API_PROFILING_N_PLUS_ONE_THRESHOLD', '5'))
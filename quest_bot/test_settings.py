@@ -0,0 +1,16 @@
+"""
+Настройки для pytest (см. pytest.ini).
+
+К основной базе подключается реплика, чтобы тесты проходили через
+core.replicas.ReplicaRouter; в тестах она — зеркало тестовой default
+(TEST MIRROR), так что данные у них общие, а запросы видно по алиасу.
+"""
+import os
+
+os.environ.setdefault('DATABASE_REPLICA_NAME', 'replica.sqlite3')
+
+from .settings import *  # noqa: E402,F401,F403
+
+# тесты не должны ходить в настоящий Telegram
+TELEGRAM_BOT_TOKEN = ''
+TELEGRAM_API_SERVER = ''
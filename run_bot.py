@@ -6,7 +6,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quest_bot.settings')
 django.setup()
 
-from bot.bot import start_bot  # Импорт start_bot функции
+from bot.app import start_bot  # Импорт start_bot функции
 
 if __name__ == "__main__":
     asyncio.run(start_bot())
\ No newline at end of file